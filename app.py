@@ -1,47 +1,119 @@
+import io
 import os
 import re
 import sys
 import locale
 import random
 import time
-import openai
 import json
-import pdfplumber
-from dotenv import load_dotenv
-from flask import Flask, render_template, session, redirect, url_for, request, send_file, flash, jsonify
-from chatgpt import (decide_with_chatgpt, get_ai_suggestions, get_ai_errors_from_pdfs,
+import threading
+from flask import (Flask, render_template, session, redirect, url_for, request, send_file, flash, jsonify,
+                   Response, stream_with_context, current_app)
+from chatgpt import (decide_with_chatgpt, get_ai_suggestions, get_ai_errors_from_pdfs, get_template_suggestions,
                      get_fully_auto_result, get_ai_errors_cooperative, fix_invoice_with_chatgpt)
+from pipeline import run_analysis, fully_automated_entry
+from llm_cache import llm_cache
+from suggestions import suggestion_service
+from jobs import job_queue, public_view, FINISHED
+from kvstore import open_store
+from server_session import ServerSessionInterface
+from results_log import results_log
+from results_db import results_db
+from document_cache import document_cache
+from dataset_index import dataset_index
+from manifest import dataset_manifest
+import pair_sampler
+import page_images
+from extraction import file_digest
+from config import (INVOICE_FOLDER, PURCHASE_FOLDER, MODIFIED_INVOICE_FOLDER, ASSISTIVE_AI_SUGGESTIONS, SESSION_URL, SESSION_TTL,
+                    DOCUMENT_MAX_AGE, PAGE_IMAGES)
 
 # ---------------------------
 # INITIAL SETUP
 # ---------------------------
-# Load environment variables and set the OpenAI API key
-load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY")
-
-# Reconfigure standard input, output, and error to use UTF-8 encoding for proper text handling
-sys.stdin.reconfigure(encoding="utf-8")
-sys.stdout.reconfigure(encoding="utf-8")
-sys.stderr.reconfigure(encoding="utf-8")
-
-# Set locale for proper formatting (numbers, dates, ...)
-locale.setlocale(locale.LC_ALL, "en_US.UTF-8")
-if sys.platform.startswith("win"):
-    locale.setlocale(locale.LC_ALL, "deu_deu" if sys.version_info.major == 3 else "German_Germany.1252")
-else:
-    locale.setlocale(locale.LC_ALL, "de_DE.UTF-8")
-
-# Initialize Flask and configure JSON options
-app = Flask(__name__)
-app.secret_key = "my_random_secret_key_123"
-app.config["JSON_AS_ASCII"] = False
-app.config["JSONIFY_PRETTYPRINT_REGULAR"] = True
-
-# Define folders for invoices, purchase orders, modified invoices, and result storage
-INVOICE_FOLDER = "dataset/invoices"
-PURCHASE_FOLDER = "dataset/PurchaseOrders"
-MODIFIED_INVOICE_FOLDER = "dataset/invoices_modified"
-RESULTS_FOLDER = "results"
+# Routes are collected by the route decorator below and registered on the app by create_app, and the
+# module-level stores (LLM cache, job queue, results database, manifest) only open their files on first use,
+# so importing this module has no side effects. The endpoint names stay the function names.
+ROUTES = []
+
+_runtime_configured = False
+_runtime_lock = threading.Lock()
+_app = None
+
+
+def route(rule: str, **options):
+    """
+    Records a view function to be registered with the given rule and options (as in Flask's app.route).
+    """
+    def decorator(view):
+        ROUTES.append((rule, view, options))
+        return view
+    return decorator
+
+
+def configure_runtime():
+    """
+    Process-wide setup, done once however many apps are created:
+    - Loads environment variables from .env
+    - Reconfigures standard input, output, and error to use UTF-8 encoding for proper text handling
+    - Sets the locale for proper formatting (numbers, dates, ...)
+    """
+    global _runtime_configured
+    with _runtime_lock:
+        if _runtime_configured:
+            return
+        from dotenv import load_dotenv
+        load_dotenv()
+
+        for stream in (sys.stdin, sys.stdout, sys.stderr):
+            if hasattr(stream, "reconfigure"):
+                stream.reconfigure(encoding="utf-8")
+
+        if sys.platform.startswith("win"):
+            preferred = "deu_deu" if sys.version_info.major == 3 else "German_Germany.1252"
+        else:
+            preferred = "de_DE.UTF-8"
+        try:
+            locale.setlocale(locale.LC_ALL, preferred)
+        except locale.Error:
+            print(f"Locale {preferred} is not available, keeping {locale.setlocale(locale.LC_ALL)}")
+        _runtime_configured = True
+
+
+def create_app() -> Flask:
+    """
+    Creates and configures the Flask app and registers all routes.
+    Run it with e.g. "gunicorn 'app:create_app()'" or "flask --app app run".
+    """
+    configure_runtime()
+
+    # Initialize Flask and configure JSON options
+    app = Flask(__name__)
+    app.secret_key = "my_random_secret_key_123"
+    app.config["JSON_AS_ASCII"] = False
+    app.config["JSONIFY_PRETTYPRINT_REGULAR"] = True
+
+    # Keep the session data on the server; the cookie only carries the signed session id
+    if SESSION_URL:
+        app.session_interface = ServerSessionInterface(open_store(SESSION_URL, prefix="sessions:"), SESSION_TTL)
+
+    app.before_request(require_id)
+    app.context_processor(document_url_helpers)
+    for rule, view, options in ROUTES:
+        app.add_url_rule(rule, view_func=view, **options)
+    return app
+
+
+def __getattr__(name):
+    """
+    Keeps "app:app" (e.g. for gunicorn) working: the module attribute app is created on first access.
+    """
+    global _app
+    if name != "app":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    if _app is None:
+        _app = create_app()
+    return _app
 
 
 # ---------------------------
@@ -50,20 +122,23 @@ RESULTS_FOLDER = "results"
 def reset_level_specific_data(current_level: str):
     """
     Removes session keys specific to any previous level.
-    Persistent keys (e.g. used_invoice_numbers, user_id) remain.
+    Persistent keys (e.g. pair_sampler, user_id) remain.
     """
     keys_to_remove = [
         # Manual level keys
         "manual_start_time",
         # Assistive level keys
         "assistive_start_time", "assist_inv_data", "assist_po_data", "assist_errors", "assist_suggest",
+        "assist_expected",
         # Cooperative level keys
         "coop_inv_data", "coop_po_data", "coop_errors", "coop_duration", "coop_ai_response",
         "current_first_decision", "current_second_decision", "fix_result",
         # Supervisory Control level keys
         "sc_inv_data", "sc_po_data", "sc_errors", "sc_duration", "sc_decision",
         # Fully Automated level key
-        "automated_start_time"
+        "automated_start_time",
+        # Background analysis job of the current pair
+        "pending_job"
     ]
     for key in keys_to_remove:
         session.pop(key, None)
@@ -74,92 +149,206 @@ def get_matching_numbers():
     """
     Returns a list of invoice numbers that are present in both the invoices and purchase orders folders.
     """
-    invoice_files = os.listdir(INVOICE_FOLDER)
-    purchase_files = os.listdir(PURCHASE_FOLDER)
-    invoice_nums = set()
-    purchase_nums = set()
+    return list(dataset_index.matching())
 
-    for f in invoice_files:
-        if f.startswith("invoice_") and f.endswith(".pdf"):
-            num = f[len("invoice_"):-4]
-            invoice_nums.add(num)
 
-    for f in purchase_files:
-        if f.startswith("purchase_orders_") and f.endswith(".pdf"):
-            num = f[len("purchase_orders_"):-4]
-            purchase_nums.add(num)
-
-    return list(invoice_nums.intersection(purchase_nums))
+def get_modified_numbers():
+    """
+    Returns the numbers XXXX with a "modified_invoice_XXXX.pdf" in the "invoices_modified" folder
+    and a corresponding "purchase_orders_XXXX.pdf" in the purchase orders folder.
+    """
+    return list(dataset_index.modified())
 
 
-def get_modified_numbers():
+def choose_random_pair(sampler_state: dict):
     """
-    Searches the "invoices_modified" folder for files named "modified_invoice_XXXX.pdf"
-    and the purchase orders folder for corresponding "purchase_orders_XXXX.pdf".
+    Chooses a random invoice-purchase pair the participant has not seen yet, without drawing it
+    (see pair_sampler.py).
+
+    Returns:
+        tuple: (number, invoice filename, purchase filename, pool, position), or None if no pair is left.
     """
-    invoice_files = os.listdir(MODIFIED_INVOICE_FOLDER)
-    purchase_files = os.listdir(PURCHASE_FOLDER)
-    invoice_nums = set()
-    purchase_nums = set()
+    # Use modified invoices 2/3 of the time
+    use_modified = (random.random() < (2.0 / 3.0))
+    pool = "modified" if use_modified else "matching"
+    draw = pair_sampler.peek(sampler_state, pool)
+    if draw is None:
+        return None
 
-    for f in invoice_files:
-        if f.startswith("modified_invoice_") and f.endswith(".pdf"):
-            num = f[len("modified_invoice_"):-4]
-            invoice_nums.add(num)
+    chosen_num, position = draw
+    invoice_filename = f"modified_invoice_{chosen_num}.pdf" if use_modified else f"invoice_{chosen_num}.pdf"
+    purchase_filename = f"purchase_orders_{chosen_num}.pdf"
+    return chosen_num, invoice_filename, purchase_filename, pool, position
 
-    for f in purchase_files:
-        if f.startswith("purchase_orders_") and f.endswith(".pdf"):
-            num = f[len("purchase_orders_"):-4]
-            purchase_nums.add(num)
 
-    return list(invoice_nums.intersection(purchase_nums))
+def sampler_state() -> dict:
+    """
+    Returns the participant's pair sampler state, creating it on first use.
+    """
+    if "pair_sampler" not in session:
+        session["pair_sampler"] = pair_sampler.new_state()
+    return session["pair_sampler"]
 
 
 def pick_random_pair():
     """
     Selects a random invoice-purchase pair excluding already used invoices.
+    If a pair was prefetched for the current level (see prefetch_next_pair), that pair is used
+    and its background analysis becomes the pending job of the *_process route.
     Updates session variables for the current invoice and purchase order.
     """
-    if "used_invoice_numbers" not in session:
-        session["used_invoice_numbers"] = []
-
-    # Use modified invoices 2/3 of the time
-    use_modified = (random.random() < (2.0 / 3.0))
-    if use_modified:
-        modified_nums = get_modified_numbers()
-        available_nums = [num for num in modified_nums if num not in session["used_invoice_numbers"]]
+    state = sampler_state()
+    prefetched = session.pop("prefetched_pair", None)
+    if (prefetched and prefetched["level"] == session.get("level")
+            and not pair_sampler.is_used(state, prefetched["number"])):
+        chosen_num = prefetched["number"]
+        pool, position = prefetched["pool"], prefetched["position"]
+        invoice_filename = prefetched["job"]["invoice"]
+        purchase_filename = prefetched["job"]["purchase"]
+        session["pending_job"] = prefetched["job"]
     else:
-        original_nums = get_matching_numbers()
-        available_nums = [num for num in original_nums if num not in session["used_invoice_numbers"]]
-
-    if not available_nums:
-        return None
-
-    chosen_num = random.choice(available_nums)
-    session["used_invoice_numbers"].append(chosen_num)
-
-    invoice_filename = f"modified_invoice_{chosen_num}.pdf" if use_modified else f"invoice_{chosen_num}.pdf"
-    purchase_filename = f"purchase_orders_{chosen_num}.pdf"
+        pair = choose_random_pair(state)
+        if pair is None:
+            return None
+        chosen_num, invoice_filename, purchase_filename, pool, position = pair
 
+    pair_sampler.take(state, pool, position)
+    session["pair_sampler"] = state
     session["current_invoice"] = invoice_filename
     session["current_purchase"] = purchase_filename
     session["errors"] = []
     return True
 
 
-def pdf_to_text_plumber(pdf_path: str) -> str:
+def prefetch_next_pair(analyze):
     """
-    Extracts the text of a PDF using pdfplumber.
+    Chooses the user's next pair of the current level ahead of time and starts its analysis
+    in the background, while the user is still busy with the current pair.
+    Must be called from the level's *_process route; pick_random_pair later takes over the pair
+    together with its job, so the next *_process call usually finds the result ready.
     """
-    full_text = []
-    with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            text = page.extract_text()
-            if text:
-                full_text.append(text)
-    return "\n".join(full_text)
+    prefetched = session.get("prefetched_pair")
+    if prefetched and prefetched["level"] == session.get("level"):
+        return
+    user_id = session.get("user_id")
+    pair = choose_random_pair(sampler_state())
+    if not user_id or pair is None:
+        return
+    chosen_num, invoice_filename, purchase_filename, pool, position = pair
+    job = job_queue.submit(run_analysis, analyze, get_invoice_path(invoice_filename),
+                           get_purchase_path(purchase_filename), owner=str(user_id))
+    session["prefetched_pair"] = {
+        "level": session.get("level"),
+        "number": chosen_num,
+        "pool": pool,
+        "position": position,
+        "job": {"endpoint": request.endpoint, "id": job["id"],
+                "invoice": invoice_filename, "purchase": purchase_filename, "prefetched": True}
+    }
+
+
+def get_invoice_path(invoice_file: str) -> str:
+    """
+    Returns the path of an original or modified invoice file.
+    With a dataset manifest the path is looked up there, so the file may be in a shard.
+    """
+    if dataset_manifest is not None:
+        path = dataset_manifest.path_of(invoice_file)
+        if path:
+            return path
+    if invoice_file.startswith("modified_invoice_"):
+        return os.path.join(MODIFIED_INVOICE_FOLDER, invoice_file)
+    return os.path.join(INVOICE_FOLDER, invoice_file)
+
+
+def get_purchase_path(purchase_file: str) -> str:
+    """
+    Returns the path of a purchase order file, looked up in the dataset manifest if there is one.
+    """
+    if dataset_manifest is not None:
+        path = dataset_manifest.path_of(purchase_file)
+        if path:
+            return path
+    return os.path.join(PURCHASE_FOLDER, purchase_file)
+
+
+def job_urls(job: dict) -> dict:
+    """
+    Returns the public view of a job together with the URLs to follow its progress.
+    """
+    view = public_view(job)
+    view["status_url"] = url_for("job_status", job_id=job["id"])
+    view["events_url"] = url_for("job_events", job_id=job["id"])
+    return view
+
+
+def process_in_background(analyze, apply_result):
+    """
+    Runs the analysis of the current invoice-purchase pair as a background job (see jobs.py).
+    The *_process routes call this on every request, so calling them again is safe:
+    - The first call enqueues the job and returns its id and progress URLs (HTTP 202).
+      A job that was lost, e.g. because its worker process was restarted, is enqueued again.
+    - While the job is running, its current status is returned (HTTP 202).
+    - Once it is done, apply_result(result, finished_at) stores the result in the session and
+      returns the URL of the next page, which is sent back as redirect_url.
+
+    Parameters:
+        analyze: One of the chatgpt.py analysis functions, passed on to run_analysis.
+        apply_result: Callable taking the analysis result and the job's finish time (epoch seconds).
+    """
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "No user_id"}), 400
+    invoice_file = session.get("current_invoice")
+    purchase_file = session.get("current_purchase")
+    pending = session.get("pending_job") or {}
+
+    job = None
+    if (pending.get("endpoint") == request.endpoint and pending.get("invoice") == invoice_file
+            and pending.get("purchase") == purchase_file):
+        job = job_queue.get(pending.get("id"), str(user_id))
+    # No job yet, or it expired or was lost with the process running it (see JobQueue.is_lost): start it (again)
+    if job is None:
+        job = job_queue.submit(run_analysis, analyze, get_invoice_path(invoice_file),
+                               get_purchase_path(purchase_file), owner=str(user_id))
+        session["pending_job"] = {"endpoint": request.endpoint, "id": job["id"],
+                                  "invoice": invoice_file, "purchase": purchase_file}
+
+    if job["status"] == "failed":
+        session.pop("pending_job", None)
+        job_queue.delete(job["id"])
+        return jsonify(job_urls(job)), 500
+    if job["status"] != "done":
+        return jsonify(job_urls(job)), 202
+
+    session.pop("pending_job", None)
+    job_queue.delete(job["id"])
+    ai_result, timings = job["result"]
+    timings["wait_ms"] = round((time.time() - job["created"]) * 1000, 1)
+    timings["prefetched"] = bool(pending.get("prefetched")) and pending.get("id") == job["id"]
+    current_app.logger.info("%s timings: %s", request.endpoint, timings)
+    next_url = apply_result(ai_result, job["finished"])
+    return jsonify({"redirect_url": next_url, "timings": timings})
+
+
+def analysis_duration(start_key: str, finished_at: float) -> float:
+    """
+    Returns the seconds between the start of the level page (session[start_key]) and the end of its analysis.
+    A prefetched analysis (see prefetch_next_pair) can finish before the page is shown; that counts as 0.
+    """
+    start_time = session[start_key]
+    return round(max(finished_at, start_time) - start_time, 2)
+
+
+def save_result(user_id, level: str, data_entry: dict):
+    """
+    Appends a result entry to the participant's result log and, if enabled, to the results database.
+    """
+    seq = results_log.append(user_id, level, data_entry)
+    if results_db is not None:
+        results_db.add(user_id, level, seq, data_entry)
+
 
-@app.before_request
 def require_id():
     """
     Ensure that the user has provided an ID before accessing any route.
@@ -171,7 +360,7 @@ def require_id():
 # ---------------------------
 # MAIN / EXPLANATION / LOGOUT
 # ---------------------------
-@app.route("/enter_id", methods=["GET", "POST"])
+@route("/enter_id", methods=["GET", "POST"])
 def enter_id():
     """
     Route to enter the user ID.
@@ -187,7 +376,7 @@ def enter_id():
         return render_template("main.html")
 
 
-@app.route("/logout")
+@route("/logout")
 def logout():
     """
     Clears the session and redirects to the ID entry page.
@@ -196,10 +385,137 @@ def logout():
     return redirect(url_for("enter_id"))
 
 
+# ---------------------------
+# DIAGNOSTICS
+# ---------------------------
+@route("/llm_cache_stats")
+def llm_cache_stats():
+    """
+    Returns the hit/miss counters of this worker's LLM response cache.
+    """
+    return jsonify(llm_cache.stats())
+
+
+@route("/api/results/aggregates")
+def results_aggregates():
+    """
+    Returns per-level aggregates of all participants' results (e.g. mean duration, booking rate)
+    from the results database. An optional "level" query parameter restricts them to one level.
+    """
+    if results_db is None:
+        return jsonify({"error": "The results database is disabled (set RESULTS_DB_PATH)"}), 404
+    return jsonify(results_db.aggregates(request.args.get("level")))
+
+
+# ---------------------------
+# BACKGROUND JOBS
+# ---------------------------
+@route("/jobs/<job_id>")
+def job_status(job_id):
+    """
+    Returns the status and progress stage of one of the user's background jobs.
+    """
+    job = job_queue.get(job_id, str(session.get("user_id")))
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job_urls(job))
+
+
+@route("/jobs/<job_id>/events")
+def job_events(job_id):
+    """
+    Streams the progress of one of the user's background jobs as server-sent events.
+    Every stage change is sent as a "progress" event; the stream ends once the job has finished.
+    Each open stream occupies a worker, so the waiting pages poll job_status instead.
+    """
+    owner = str(session.get("user_id"))
+    job = job_queue.get(job_id, owner)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+
+    def generate():
+        current, stage = job, None
+        while current is not None:
+            if current["stage"] == stage:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"event: progress\ndata: {json.dumps(public_view(current))}\n\n"
+            if current["status"] in FINISHED:
+                return
+            stage = current["stage"]
+            current = job_queue.wait_for_change(job_id, owner, stage)
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 # ---------------------------
 # SHOW PDF
 # ---------------------------
-@app.route("/show_invoice")
+def document_version(path: str) -> str:
+    """
+    Returns a short content hash of a PDF, used as the "v" query parameter of its URL.
+    """
+    return file_digest(path)[:16]
+
+
+def send_document(path: str):
+    """
+    Sends a dataset PDF from the in-memory document cache.
+    - The content hash is sent as a strong ETag, so revalidations are answered with 304.
+    - Range requests are answered with 206 partial content.
+    - If the URL carries the document's content version (?v=, see pdf_url), the browser may keep
+      the response for DOCUMENT_MAX_AGE seconds, since that URL always denotes the same bytes.
+    """
+    data, digest = document_cache.get(path)
+    versioned = request.args.get("v") == digest[:16]
+    response = send_file(io.BytesIO(data), mimetype="application/pdf", as_attachment=False,
+                         download_name=os.path.basename(path), etag=digest, conditional=True,
+                         max_age=DOCUMENT_MAX_AGE if versioned else None)
+    if versioned:
+        response.cache_control.public = False
+        response.cache_control.private = True
+        response.cache_control.immutable = True
+    return response
+
+
+def current_document(kind: str):
+    """
+    Returns the path of the current invoice ("invoice") or purchase order ("purchase"), or None.
+    """
+    if kind == "invoice":
+        filename, get_path = session.get("current_invoice"), get_invoice_path
+    else:
+        filename, get_path = session.get("current_purchase"), get_purchase_path
+    return get_path(filename) if filename else None
+
+
+def document_url_helpers():
+    """
+    Template helpers:
+    - pdf_url("invoice") / pdf_url("purchase") return the versioned URL of the current invoice or purchase order.
+    - page_image_urls(kind) returns one (page image URL, thumbnail URL) pair per page of it.
+    - page_images tells whether the pages are shown as images (PAGE_IMAGES) instead of embedded PDFs.
+    """
+    def pdf_url(kind: str) -> str:
+        endpoint = "show_invoice" if kind == "invoice" else "show_purchase"
+        path = current_document(kind)
+        if not path:
+            return url_for(endpoint)
+        return url_for(endpoint, v=document_version(path))
+
+    def page_image_urls(kind: str) -> list:
+        path = current_document(kind)
+        if not path:
+            return []
+        version = document_version(path)
+        return [(url_for("page_image", kind=kind, page=number, v=version),
+                 url_for("page_thumbnail", kind=kind, page=number, v=version))
+                for number in range(1, page_images.page_count(path) + 1)]
+    return {"pdf_url": pdf_url, "page_image_urls": page_image_urls, "page_images": PAGE_IMAGES}
+
+
+@route("/show_invoice")
 def show_invoice():
     """
     Displays the current invoice.
@@ -207,14 +523,10 @@ def show_invoice():
     inv = session.get("current_invoice")
     if not inv:
         return "No invoice selected."
-    if inv.startswith("modified_invoice_"):
-        path = os.path.join(MODIFIED_INVOICE_FOLDER, inv)
-    else:
-        path = os.path.join(INVOICE_FOLDER, inv)
-    return send_file(path, as_attachment=False)
+    return send_document(get_invoice_path(inv))
 
 
-@app.route("/show_purchase")
+@route("/show_purchase")
 def show_purchase():
     """
     Displays the current purchase.
@@ -222,14 +534,51 @@ def show_purchase():
     pu = session.get("current_purchase")
     if not pu:
         return "No purchase order selected."
-    path = os.path.join(PURCHASE_FOLDER, pu)
-    return send_file(path, as_attachment=False)
+    return send_document(get_purchase_path(pu))
+
+
+def send_page_image(kind: str, page: int, thumbnail: bool):
+    """
+    Sends a pre-rendered page image or thumbnail of the current document, cached like send_document.
+    """
+    path = current_document(kind) if kind in ("invoice", "purchase") else None
+    if not path:
+        return "No document selected.", 404
+    data = page_images.get_page_image(path, page, thumbnail=thumbnail)
+    if data is None:
+        return "No such page.", 404
+    digest = file_digest(path)
+    versioned = request.args.get("v") == digest[:16]
+    response = send_file(io.BytesIO(data), mimetype=page_images.mimetype(),
+                         etag=f"{digest[:32]}-{'t' if thumbnail else 'p'}{page}-{page_images.RENDER_VERSION}",
+                         conditional=True, max_age=DOCUMENT_MAX_AGE if versioned else None)
+    if versioned:
+        response.cache_control.public = False
+        response.cache_control.private = True
+        response.cache_control.immutable = True
+    return response
+
+
+@route("/page_image/<kind>/<int:page>")
+def page_image(kind, page):
+    """
+    Displays one page of the current invoice or purchase order as an image.
+    """
+    return send_page_image(kind, page, thumbnail=False)
+
+
+@route("/page_thumbnail/<kind>/<int:page>")
+def page_thumbnail(kind, page):
+    """
+    Displays the thumbnail of one page of the current invoice or purchase order.
+    """
+    return send_page_image(kind, page, thumbnail=True)
 
 
 # ---------------------------
 # REPORT ISSUE
 # ---------------------------
-@app.route("/add_error", methods=["GET", "POST"])
+@route("/add_error", methods=["GET", "POST"])
 def add_error():
     """
     Allows the user to report an error.
@@ -253,14 +602,14 @@ def add_error():
 # ---------------------------
 # MANUAL LEVEL
 # ---------------------------
-@app.route("/manual_explain")
+@route("/manual_explain")
 def manual_explain():
     if "user_id" not in session:
         return redirect(url_for("enter_id"))
     return render_template("manual_explain.html")
 
 
-@app.route("/manual")
+@route("/manual")
 def manual():
     """
     Displays the manual level.
@@ -271,13 +620,8 @@ def manual():
         return redirect(url_for("enter_id"))
 
     reset_level_specific_data("manual")
-    user_folder = os.path.join(RESULTS_FOLDER, str(user_id))
-    json_path = os.path.join(user_folder, "manual.json")
-    if os.path.exists(json_path):
-        with open(json_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        if len(data) >= 3:
-            return redirect(url_for("manual_done"))
+    if results_log.count(user_id, "manual") >= 3:
+        return redirect(url_for("manual_done"))
     if "manual_count" not in session:
         session["manual_count"] = 0
     if session["manual_count"] >= 3:
@@ -289,7 +633,7 @@ def manual():
     return render_template("manual.html")
 
 
-@app.route("/manual_submit", methods=["POST"])
+@route("/manual_submit", methods=["POST"])
 def manual_submit():
     """
     Processes the manual review submission:
@@ -324,18 +668,8 @@ def manual_submit():
         "errors": all_errors,
         "booking": booking_decision
     }
-    # Save the manual level data as JSON
-    user_folder = os.path.join(RESULTS_FOLDER, str(user_id))
-    os.makedirs(user_folder, exist_ok=True)
-    json_path = os.path.join(user_folder, "manual.json")
-    if os.path.exists(json_path):
-        with open(json_path, "r", encoding="utf-8") as f:
-            old_data = json.load(f)
-    else:
-        old_data = []
-    old_data.append(data_entry)
-    with open(json_path, "w", encoding="utf-8") as f:
-        json.dump(old_data, f, indent=2, ensure_ascii=False)
+    # Append the manual level data to the result log
+    save_result(user_id, "manual", data_entry)
 
     session["manual_count"] = session.get("manual_count", 0) + 1
     if session["manual_count"] < 3:
@@ -344,7 +678,7 @@ def manual_submit():
         return redirect(url_for("manual_done"))
 
 
-@app.route("/manual_done")
+@route("/manual_done")
 def manual_done():
     """
     Renders the done page for the manual level.
@@ -356,14 +690,14 @@ def manual_done():
 # ASSISTIVE LEVEL
 # ---------------------------
 # This level uses AI suggestions to assist the user.
-@app.route("/assistive_explain")
+@route("/assistive_explain")
 def assistive_explain():
     if "user_id" not in session:
         return redirect(url_for("enter_id"))
     return render_template("assistive_explain.html")
 
 
-@app.route("/assistive")
+@route("/assistive")
 def assistive():
     """
     Displays the assistive level waiting page.
@@ -383,7 +717,7 @@ def assistive():
     return render_template("assistive_waiting.html")
 
 
-@app.route("/assistive_submit", methods=["POST"])
+@route("/assistive_submit", methods=["POST"])
 def assistive_submit():
     """
     Processes the assistive level submission.
@@ -421,17 +755,7 @@ def assistive_submit():
         "errors": all_errors,
         "booking": booking_decision
     }
-    user_folder = os.path.join(RESULTS_FOLDER, str(user_id))
-    os.makedirs(user_folder, exist_ok=True)
-    json_path = os.path.join(user_folder, "assistive.json")
-    if os.path.exists(json_path):
-        with open(json_path, "r", encoding="utf-8") as f:
-            old_data = json.load(f)
-    else:
-        old_data = []
-    old_data.append(data_entry)
-    with open(json_path, "w", encoding="utf-8") as f:
-        json.dump(old_data, f, indent=2, ensure_ascii=False)
+    save_result(user_id, "assistive", data_entry)
 
     session["assistive_count"] = session.get("assistive_count", 0) + 1
     if session["assistive_count"] < 3:
@@ -440,7 +764,7 @@ def assistive_submit():
         return redirect(url_for("assistive_done"))
 
 
-@app.route("/assistive_done")
+@route("/assistive_done")
 def assistive_done():
     """
     Renders the done page for the assistive level.
@@ -448,31 +772,21 @@ def assistive_done():
     return render_template("assistive_done.html")
 
 
-@app.route("/assistive_process", methods=["POST"])
+@route("/assistive_process", methods=["POST"])
 def assistive_process():
     """
     Processes the PDF extraction for the assistive level.
-    - Extracts text from the selected invoice and purchase order.
+    - Extracts text from the selected invoice and purchase order in a background job.
     - Calls the AI to extract errors and suggestions.
-    - Stores the AI results in session.
+    - Stores the AI results in session once the job is done.
     """
-    user_id = session.get("user_id")
-    if not user_id:
-        return jsonify({"error": "No user_id"}), 400
+    return process_in_background(get_ai_errors_from_pdfs, apply_assistive_result)
 
-    invoice_file = session.get("current_invoice")
-    purchase_file = session.get("current_purchase")
-    if invoice_file.startswith("modified_invoice_"):
-        invoice_path = os.path.join(MODIFIED_INVOICE_FOLDER, invoice_file)
-    else:
-        invoice_path = os.path.join(INVOICE_FOLDER, invoice_file)
-    purchase_path = os.path.join(PURCHASE_FOLDER, purchase_file)
-
-    invoice_text = pdf_to_text_plumber(invoice_path)
-    purchase_text = pdf_to_text_plumber(purchase_path)
 
-    # Call AI to extract invoice errors
-    ai_result = get_ai_errors_from_pdfs(invoice_text, purchase_text)
+def apply_assistive_result(ai_result: dict, finished_at: float) -> str:
+    """
+    Stores the assistive analysis in the session and returns the URL of the next page.
+    """
     inv_data = ai_result.get("invoice_extracted", {})
     po_data = ai_result.get("purchase_extracted", {})
     errors = ai_result.get("errors", [])
@@ -480,19 +794,25 @@ def assistive_process():
     session["assist_inv_data"] = inv_data
     session["assist_po_data"] = po_data
     session["assist_errors"] = errors
+    session["assist_expected"] = build_expected_values(inv_data, po_data)
 
+    # The initial suggestions only restate the error types, so they are built locally
+    # and the waiting page only waits for the analysis itself
     corrections = []
-    suggestions = get_ai_suggestions(inv_data, po_data, errors, corrections)
+    if ASSISTIVE_AI_SUGGESTIONS:
+        suggestions = get_ai_suggestions(inv_data, po_data, errors, corrections)
+    else:
+        suggestions = get_template_suggestions(errors, corrections)
     session["assist_suggest"] = suggestions
 
     if session.get("assistive_count", 0) >= 3:
-        next_url = url_for("assistive_done")
-    else:
-        next_url = url_for("assistive_display")
-    return jsonify({"redirect_url": next_url})
+        return url_for("assistive_done")
+    if session.get("assistive_count", 0) + 1 < 3:
+        prefetch_next_pair(get_ai_errors_from_pdfs)
+    return url_for("assistive_display")
 
 
-@app.route("/assistive_display")
+@route("/assistive_display")
 def assistive_display():
     """
     Renders the assistive level display page, showing extracted data, errors, and AI suggestions.
@@ -508,13 +828,43 @@ def assistive_display():
                            suggestions=suggestions)
 
 
-@app.route("/get_dynamic_suggestions", methods=["POST"])
+def build_expected_values(inv_data: dict, po_data: dict) -> dict:
+    """
+    Builds the expected value of every correctable field, keyed by error type
+    (and "<error type>:<product id>" for item fields), for validating user corrections.
+    """
+    # Define expected values for corrections
+    correct_values = {
+        "Contact Name": str(po_data.get("customer_name", "")).strip().lower(),
+        "Total Price": str(inv_data.get("total_price", "")).strip().lower(),
+        "Order ID": str(po_data.get("order_id", "")).strip().lower(),
+        "Unit Price": str(po_data.get("unit_price", "")).strip().lower(),
+        "Product Name": str(po_data.get("product_name", "")).strip().lower(),
+        "Product is missing": str(po_data.get("product_missing", "")).strip().lower(),
+        "Quantity": str(po_data.get("quantity", "")).strip().lower(),
+        "Order Date": str(po_data.get("order_date", "")).strip().lower(),
+        "Date": str(po_data.get("date", "")).strip().lower(),
+    }
+
+    if "items" in po_data and isinstance(po_data["items"], list):
+        for item in po_data["items"]:
+            pid = str(item.get("product_id", "")).strip().lower()
+            key_name = f"Product Name:{pid}"
+            correct_values[key_name] = item.get("product_name", "").strip().lower()
+            key_qty = f"Quantity:{pid}"
+            correct_values[key_qty] = str(item.get("quantity", "")).strip().lower()
+            key_unit = f"Unit Price:{pid}"
+            correct_values[key_unit] = str(item.get("unit_price", "")).strip().lower()
+    return correct_values
+
+
+@route("/get_dynamic_suggestions", methods=["POST"])
 def get_dynamic_suggestions():
     """
     Provides dynamic AI suggestions based on user corrections.
     - Processes manual corrections from the frontend.
     - Compares them with expected values.
-    - Calls the AI for updated suggestions.
+    - Returns memoized or template suggestions for the remaining errors (see suggestions.py).
     """
     try:
         data = request.get_json()
@@ -531,28 +881,10 @@ def get_dynamic_suggestions():
             if isinstance(e, dict) and "type" in e:
                 manual_errors.append({"type": e["type"]})
 
-        # Define expected values for corrections
-        correct_values = {
-            "Contact Name": str(po_data.get("customer_name", "")).strip().lower(),
-            "Total Price": str(inv_data.get("total_price", "")).strip().lower(),
-            "Order ID": str(po_data.get("order_id", "")).strip().lower(),
-            "Unit Price": str(po_data.get("unit_price", "")).strip().lower(),
-            "Product Name": str(po_data.get("product_name", "")).strip().lower(),
-            "Product is missing": str(po_data.get("product_missing", "")).strip().lower(),
-            "Quantity": str(po_data.get("quantity", "")).strip().lower(),
-            "Order Date": str(po_data.get("order_date", "")).strip().lower(),
-            "Date": str(po_data.get("date", "")).strip().lower(),
-        }
-
-        if "items" in po_data and isinstance(po_data["items"], list):
-            for item in po_data["items"]:
-                pid = item.get("product_id", "").strip().lower()
-                key_name = f"Product Name:{pid}"
-                correct_values[key_name] = item.get("product_name", "").strip().lower()
-                key_qty = f"Quantity:{pid}"
-                correct_values[key_qty] = str(item.get("quantity", "")).strip().lower()
-                key_unit = f"Unit Price:{pid}"
-                correct_values[key_unit] = str(item.get("unit_price", "")).strip().lower()
+        # Expected values are built once per invoice in assistive_process
+        correct_values = session.get("assist_expected")
+        if correct_values is None:
+            correct_values = build_expected_values(inv_data, po_data)
 
         validated_corrections = []
         for cor in data.get("corrections", []):
@@ -581,7 +913,8 @@ def get_dynamic_suggestions():
             })
 
         combined_errors = auto_errors + manual_errors
-        suggestions = get_ai_suggestions(inv_data, po_data, combined_errors, validated_corrections)
+        suggestions = suggestion_service.suggest(str(session.get("user_id")), combined_errors,
+                                                 validated_corrections)
         return jsonify({
             "suggestions": suggestions,
             "validatedCorrections": validated_corrections
@@ -596,14 +929,14 @@ def get_dynamic_suggestions():
 # COOPERATIVE LEVEL
 # ---------------------------
 # This level uses AI for the invoice verification process and the user can decide to accept, decline or request an AI fix.
-@app.route("/cooperative_explain")
+@route("/cooperative_explain")
 def cooperative_explain():
     if "user_id" not in session:
         return redirect(url_for("enter_id"))
     return render_template("cooperative_explain.html")
 
 
-@app.route("/cooperative")
+@route("/cooperative")
 def cooperative():
     """
     Displays the cooperative level waiting page.
@@ -623,41 +956,38 @@ def cooperative():
     return render_template("cooperative_waiting.html")
 
 
-@app.route("/cooperative_process", methods=["GET", "POST"])
+@route("/cooperative_process", methods=["GET", "POST"])
 def cooperative_process():
     """
-    Processes the cooperative level and saving results in the session.
+    Processes the cooperative level in a background job and saves the results in the session.
+    A plain GET (e.g. the redirect after "still_error") shows the waiting page, which drives the job.
+    """
+    if request.method == "GET":
+        return render_template("cooperative_waiting.html")
+    return process_in_background(get_ai_errors_cooperative, apply_cooperative_result)
+
+
+def apply_cooperative_result(ai_analysis: dict, finished_at: float) -> str:
+    """
+    Stores the cooperative analysis in the session and returns the URL of the next page.
     """
-    user_id = session.get("user_id")
-    if not user_id:
-        return jsonify({"error": "No user_id"}), 400
-    invoice_file = session.get("current_invoice")
-    purchase_file = session.get("current_purchase")
-    if invoice_file.startswith("modified_invoice_"):
-        invoice_path = os.path.join(MODIFIED_INVOICE_FOLDER, invoice_file)
-    else:
-        invoice_path = os.path.join(INVOICE_FOLDER, invoice_file)
-    purchase_path = os.path.join(PURCHASE_FOLDER, purchase_file)
-    invoice_text = pdf_to_text_plumber(invoice_path)
-    purchase_text = pdf_to_text_plumber(purchase_path)
-    ai_analysis = get_ai_errors_cooperative(invoice_text, purchase_text)
     session["coop_inv_data"] = ai_analysis.get("invoice_extracted", {})
     session["coop_po_data"] = ai_analysis.get("purchase_extracted", {})
     session["coop_errors"] = ai_analysis.get("errors", [])
-    session["coop_duration"] = round(time.time() - session["cooperative_start_time"], 2)
+    session["coop_duration"] = analysis_duration("cooperative_start_time", finished_at)
     session["coop_original_errors"] = session["coop_errors"][:]
     session.pop("current_first_decision", None)
     session.pop("current_second_decision", None)
     session.pop("coop_ai_response", None)
     session.pop("fix_result", None)
     if session.get("cooperative_count", 0) >= 3:
-        next_url = url_for("cooperative_done")
-    else:
-        next_url = url_for("cooperative_display")
-    return jsonify({"redirect_url": next_url})
+        return url_for("cooperative_done")
+    if session.get("cooperative_count", 0) + 1 < 3:
+        prefetch_next_pair(get_ai_errors_cooperative)
+    return url_for("cooperative_display")
 
 
-@app.route("/cooperative_display")
+@route("/cooperative_display")
 def cooperative_display():
     """
     Renders the cooperative level display page with AI analysis and options for further decisions.
@@ -672,7 +1002,7 @@ def cooperative_display():
                            ai_response=session.get("coop_ai_response", ""))
 
 
-@app.route("/cooperative_decision", methods=["POST"])
+@route("/cooperative_decision", methods=["POST"])
 def cooperative_decision():
     """
     Processes the user decision in the cooperative level.
@@ -779,7 +1109,7 @@ def do_ai_fix(instructions):
                            show_ai_instructions=False)
 
 
-@app.route("/cooperative_next_decision", methods=["POST"])
+@route("/cooperative_next_decision", methods=["POST"])
 def cooperative_next_decision():
     """
     Handles the decision after an AI fix.
@@ -817,31 +1147,19 @@ def finalize_cooperative():
         "errors_found": session.get("coop_errors", []),
         "booking": session.get("coop_booking", "unknown"),
     }
-    user_folder = os.path.join(RESULTS_FOLDER, str(user_id))
-    os.makedirs(user_folder, exist_ok=True)
-    json_path = os.path.join(user_folder, "cooperative.json")
-    if os.path.exists(json_path):
-        with open(json_path, "r", encoding="utf-8") as f:
-            old_data = json.load(f)
-    else:
-        old_data = []
-    old_data.append(data_entry)
-    with open(json_path, "w", encoding="utf-8") as f:
-        json.dump(old_data, f, indent=2, ensure_ascii=False)
+    save_result(user_id, "cooperative", data_entry)
     session["cooperative_count"] = session.get("cooperative_count", 0) + 1
     for key in ["coop_errors", "coop_inv_data", "coop_po_data", "current_invoice", "current_purchase",
                 "coop_ai_response", "fix_result", "coop_booking", "show_second_decision",
                 "show_ai_instructions", "current_first_decision", "current_second_decision"]:
         session.pop(key, None)
     if session["cooperative_count"] < 3:
-        if not pick_random_pair():
-            return "No more invoices available."
         return redirect(url_for("cooperative"))
     else:
         return redirect(url_for("cooperative_done"))
 
 
-@app.route("/reset_fix_state", methods=["POST"])
+@route("/reset_fix_state", methods=["POST"])
 def reset_fix_state():
     """
     Resets the AI fix state, clearing fix result and instruction flags.
@@ -851,7 +1169,7 @@ def reset_fix_state():
     return "", 204
 
 
-@app.route("/cooperative_done")
+@route("/cooperative_done")
 def cooperative_done():
     """
     Renders the done page for the cooperative level.
@@ -863,14 +1181,14 @@ def cooperative_done():
 # SUPERVISORY CONTROL LEVEL
 # ---------------------------
 # This level uses AI for invoice verification and only passes it on to the user in exceptional cases.
-@app.route("/supervisory_control_explain")
+@route("/supervisory_control_explain")
 def supervisory_control_explain():
     if "user_id" not in session:
         return redirect(url_for("enter_id"))
     return render_template("supervisory_control_explain.html")
 
 
-@app.route("/supervisory_control")
+@route("/supervisory_control")
 def supervisory_control():
     """
     Displays the assistive level loading page.
@@ -890,26 +1208,23 @@ def supervisory_control():
     return render_template("supervisory_control_waiting.html")
 
 
-@app.route("/supervisory_control_process", methods=["POST"])
+@route("/supervisory_control_process", methods=["POST"])
 def supervisory_control_process():
     """
     Processes the supervisory control level.
-    It calls the AI to decide on processing and saves the results.
+    It calls the AI to decide on processing in a background job and saves the results.
+    """
+    return process_in_background(decide_with_chatgpt, apply_supervisory_result)
+
+
+def apply_supervisory_result(ai_result: dict, finished_at: float) -> str:
+    """
+    Stores and saves the supervisory control decision and returns the URL of the next page.
     """
     user_id = session.get("user_id")
-    if not user_id:
-        return jsonify({"error": "No user_id"}), 400
     invoice_file = session.get("current_invoice")
     purchase_file = session.get("current_purchase")
-    if invoice_file.startswith("modified_invoice_"):
-        invoice_path = os.path.join(MODIFIED_INVOICE_FOLDER, invoice_file)
-    else:
-        invoice_path = os.path.join(INVOICE_FOLDER, invoice_file)
-    purchase_path = os.path.join(PURCHASE_FOLDER, purchase_file)
-    invoice_text = pdf_to_text_plumber(invoice_path)
-    purchase_text = pdf_to_text_plumber(purchase_path)
-    ai_result = decide_with_chatgpt(invoice_text, purchase_text)
-    duration = round(time.time() - session["supervisory_start_time"], 2)
+    duration = analysis_duration("supervisory_start_time", finished_at)
     decision = ai_result.get("decision", "auto")
     if decision == "auto":
         booking = ai_result.get("booking", "book")
@@ -931,26 +1246,19 @@ def supervisory_control_process():
         "decision": decision,
         "booking": booking
     }
-    user_folder = os.path.join(RESULTS_FOLDER, str(user_id))
-    os.makedirs(user_folder, exist_ok=True)
-    json_path = os.path.join(user_folder, "supervisory_control.json")
-    if os.path.exists(json_path):
-        with open(json_path, "r", encoding="utf-8") as f:
-            old_data = json.load(f)
-    else:
-        old_data = []
-    old_data.append(data_entry)
-    with open(json_path, "w", encoding="utf-8") as f:
-        json.dump(old_data, f, indent=2, ensure_ascii=False)
+    save_result(user_id, "supervisory_control", data_entry)
     if decision == "escalate":
-        next_url = url_for("supervisory_control_manual")
-    else:
-        session["supervisory_count"] += 1
-        next_url = url_for("supervisory_control") if session["supervisory_count"] < 3 else url_for("supervisory_control_done")
-    return jsonify({"redirect_url": next_url})
+        if session["supervisory_count"] + 1 < 3:
+            prefetch_next_pair(decide_with_chatgpt)
+        return url_for("supervisory_control_manual")
+    session["supervisory_count"] += 1
+    if session["supervisory_count"] < 3:
+        prefetch_next_pair(decide_with_chatgpt)
+        return url_for("supervisory_control")
+    return url_for("supervisory_control_done")
 
 
-@app.route("/supervisory_control_manual")
+@route("/supervisory_control_manual")
 def supervisory_control_manual():
     """
     Renders the supervisory control manual intervention page,
@@ -962,7 +1270,7 @@ def supervisory_control_manual():
                            po_data=session.get("sc_po_data", {}))
 
 
-@app.route("/supervisory_control_done")
+@route("/supervisory_control_done")
 def supervisory_control_done():
     """
     Renders the done page for the supervisory control level.
@@ -970,7 +1278,7 @@ def supervisory_control_done():
     return render_template("supervisory_control_done.html")
 
 
-@app.route("/supervisor_note", methods=["POST"])
+@route("/supervisor_note", methods=["POST"])
 def supervisor_note():
     """
     Processes the supervisor's note and booking decision.
@@ -995,21 +1303,9 @@ def supervisor_note():
         "decision": session.get("sc_decision", "auto"),
         "booking": booking_decision
     }
-    user_folder = os.path.join(RESULTS_FOLDER, str(user_id))
-    os.makedirs(user_folder, exist_ok=True)
-    json_path = os.path.join(user_folder, "supervisory_control.json")
-    if os.path.exists(json_path):
-        with open(json_path, "r", encoding="utf-8") as f:
-            old_data = json.load(f)
-    else:
-        old_data = []
-    old_data.append(data_entry)
-    with open(json_path, "w", encoding="utf-8") as f:
-        json.dump(old_data, f, indent=2, ensure_ascii=False)
+    save_result(user_id, "supervisory_control", data_entry)
     session["supervisory_count"] = session.get("supervisory_count", 0) + 1
     if session["supervisory_count"] < 3:
-        if not pick_random_pair():
-            return "No more invoices available."
         return redirect(url_for("supervisory_control"))
     else:
         return redirect(url_for("supervisory_control_done"))
@@ -1019,14 +1315,14 @@ def supervisor_note():
 # FULLY AUTOMATED LEVEL
 # ---------------------------
 # In this level the entire process is automated with AI
-@app.route("/fully_automated_explain")
+@route("/fully_automated_explain")
 def fully_automated_explain():
     if "user_id" not in session:
         return redirect(url_for("enter_id"))
     return render_template("fully_automated_explain.html")
 
 
-@app.route("/fully_automated")
+@route("/fully_automated")
 def fully_automated():
     """
     Displays the fully automated level.
@@ -1048,60 +1344,33 @@ def fully_automated():
                            purchase_file=session.get("current_purchase"))
 
 
-@app.route("/fully_automated_process", methods=["POST"])
+@route("/fully_automated_process", methods=["POST"])
 def fully_automated_process():
     """
     Processes the fully automated level:
-    - Calls the AI to analyze and decide on the invoice
+    - Calls the AI to analyze and decide on the invoice in a background job
     - Saves the result as JSON
     """
+    return process_in_background(get_fully_auto_result, apply_fully_automated_result)
+
+
+def apply_fully_automated_result(ai_result: dict, finished_at: float) -> str:
+    """
+    Saves the fully automated result and returns the URL of the next page.
+    """
     user_id = session.get("user_id")
-    if not user_id:
-        return jsonify({"error": "No user_id"}), 400
-    invoice_file = session.get("current_invoice")
-    purchase_file = session.get("current_purchase")
-    if invoice_file.startswith("modified_invoice_"):
-        invoice_path = os.path.join(MODIFIED_INVOICE_FOLDER, invoice_file)
-    else:
-        invoice_path = os.path.join(INVOICE_FOLDER, invoice_file)
-    purchase_path = os.path.join(PURCHASE_FOLDER, purchase_file)
-    invoice_text = pdf_to_text_plumber(invoice_path)
-    purchase_text = pdf_to_text_plumber(purchase_path)
-    ai_result = get_fully_auto_result(invoice_text, purchase_text)
-    inv_data = ai_result.get("invoice_extracted", {})
-    po_data = ai_result.get("purchase_extracted", {})
-    errors = ai_result.get("errors", [])
-    corrected_invoice = ai_result.get("invoice_corrected", {})
-    booking = ai_result.get("booking", "decline")
-    duration = round(time.time() - session["automated_start_time"], 2)
-    data_entry = {
-        "invoice_file": invoice_file,
-        "purchase_file": purchase_file,
-        "duration_seconds": duration,
-        "invoice_extracted": inv_data,
-        "purchase_extracted": po_data,
-        "errors": errors,
-        "booking": booking
-    }
-    if corrected_invoice:
-        data_entry["invoice_corrected"] = corrected_invoice
-    user_folder = os.path.join(RESULTS_FOLDER, str(user_id))
-    os.makedirs(user_folder, exist_ok=True)
-    json_path = os.path.join(user_folder, "fully_automated.json")
-    if os.path.exists(json_path):
-        with open(json_path, "r", encoding="utf-8") as f:
-            old_data = json.load(f)
-    else:
-        old_data = []
-    old_data.append(data_entry)
-    with open(json_path, "w", encoding="utf-8") as f:
-        json.dump(old_data, f, indent=2, ensure_ascii=False)
+    duration = analysis_duration("automated_start_time", finished_at)
+    data_entry = fully_automated_entry(ai_result, session.get("current_invoice"), session.get("current_purchase"),
+                                       duration)
+    save_result(user_id, "fully_automated", data_entry)
     session["auto_count"] += 1
-    next_url = url_for("fully_automated") if session["auto_count"] < 3 else url_for("fully_automated_done")
-    return jsonify({"redirect_url": next_url})
+    if session["auto_count"] < 3:
+        prefetch_next_pair(get_fully_auto_result)
+        return url_for("fully_automated")
+    return url_for("fully_automated_done")
 
 
-@app.route("/fully_automated_done")
+@route("/fully_automated_done")
 def fully_automated_done():
     """
     Renders the done page for the fully automated level.
@@ -1110,4 +1379,4 @@ def fully_automated_done():
 
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    create_app().run(debug=True)
@@ -0,0 +1,54 @@
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+# ---------------------------
+# IMPORT TIME BENCHMARK
+# ---------------------------
+# Measures in fresh interpreters how long "import app" and create_app() take,
+# i.e. what every gunicorn worker pays when it boots or restarts.
+PROBE = """
+import json, time
+start = time.perf_counter()
+import {module} as module
+imported = time.perf_counter()
+module.create_app()
+created = time.perf_counter()
+print(json.dumps({{"import_ms": (imported - start) * 1000, "create_app_ms": (created - imported) * 1000}}))
+"""
+
+
+def measure(module: str, runs: int) -> dict:
+    """
+    Imports module and calls its create_app() in runs fresh interpreters.
+    Returns the median and minimum of both durations in milliseconds.
+    """
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", PROBE.format(module=module)], check=True,
+                                capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        samples.append(json.loads(output.stdout.strip().splitlines()[-1]))
+    result = {}
+    for key in ("import_ms", "create_app_ms"):
+        values = [sample[key] for sample in samples]
+        result[key] = {"median": round(statistics.median(values), 1), "min": round(min(values), 1)}
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measures the import and app creation time of the web app.")
+    parser.add_argument("--module", default="app", help="module providing create_app()")
+    parser.add_argument("--runs", type=int, default=10, help="number of fresh interpreters")
+    args = parser.parse_args(argv)
+
+    result = measure(args.module, args.runs)
+    print(f"import {args.module}: median {result['import_ms']['median']} ms, min {result['import_ms']['min']} ms")
+    print(f"create_app(): median {result['create_app_ms']['median']} ms, min {result['create_app_ms']['min']} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+if __name__ == "__main__":
+    # Settings from .env, like the app (see configure_runtime in app.py); loaded before config.py reads them
+    from dotenv import load_dotenv
+    load_dotenv()
+
+from config import RESULTS_FSYNC_INTERVAL
+from dataset_index import dataset_index
+from pipeline import run_analysis, run_analyses_batched, fully_automated_entry
+from results_log import ResultLog
+
+# ---------------------------
+# HEADLESS BULK RUNNER
+# ---------------------------
+# Runs the fully automated analysis over every invoice-purchase pair of the dataset, without the web app.
+# Pairs are processed in chunks across worker processes (CPU-bound extraction), each of which analyzes
+# its chunk with a thread pool (I/O-bound LLM calls).
+# Results are appended to a result log (see results_log.py) as data_entry dicts, exactly like the fully
+# automated level saves them, under the user ID of the run. The log doubles as the checkpoint:
+# a run that is started again skips every pair already in it, so an interrupted run resumes where it stopped.
+# Failed pairs are not logged and are retried by the next run.
+# With --batch-size N, the pairs that need the AI are sent N at a time in one request (see get_fully_auto_results).
+
+
+def dataset_pairs(pools) -> list:
+    """
+    Returns (invoice file, invoice path, purchase file, purchase path) of every pair in the given pools
+    ("modified" and/or "matching").
+    """
+    from app import get_invoice_path, get_purchase_path
+    pairs = []
+    for pool in pools:
+        numbers = dataset_index.modified() if pool == "modified" else dataset_index.matching()
+        for number in numbers:
+            invoice_file = f"modified_invoice_{number}.pdf" if pool == "modified" else f"invoice_{number}.pdf"
+            purchase_file = f"purchase_orders_{number}.pdf"
+            pairs.append((invoice_file, get_invoice_path(invoice_file), purchase_file, get_purchase_path(purchase_file)))
+    return pairs
+
+
+def analyze_pair(pair: tuple):
+    """
+    Runs the fully automated analysis of one pair.
+
+    Returns:
+        tuple: (data_entry, None) or (None, error message)
+    """
+    from chatgpt import get_fully_auto_result
+    invoice_file, invoice_path, purchase_file, purchase_path = pair
+    start = time.time()
+    try:
+        result, _timings = run_analysis(get_fully_auto_result, invoice_path, purchase_path)
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+    return fully_automated_entry(result, invoice_file, purchase_file, round(time.time() - start, 2)), None
+
+
+def analyze_batch(pairs: list, batch_size: int) -> list:
+    """
+    Analyzes pairs with batched AI requests.
+
+    Returns:
+        list: One (data_entry, error) tuple per pair.
+    """
+    from chatgpt import get_fully_auto_results
+    start = time.time()
+    try:
+        outcomes = run_analyses_batched(get_fully_auto_results, [(pair[1], pair[3]) for pair in pairs], batch_size)
+    except Exception as e:
+        return [(None, f"{type(e).__name__}: {e}")] * len(pairs)
+    duration = round((time.time() - start) / len(pairs), 2)
+    return [(fully_automated_entry(result, pair[0], pair[2], duration), None)
+            for pair, (result, _timings) in zip(pairs, outcomes)]
+
+
+def analyze_chunk(pairs: list, threads: int, batch_size: int = 1) -> list:
+    """
+    Runs in a worker process: analyzes a chunk of pairs with a thread pool, one pair or one batch per task.
+    Returns one (pair, data_entry, error) tuple per pair.
+    """
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        if batch_size <= 1:
+            outcomes = list(pool.map(analyze_pair, pairs))
+        else:
+            batches = [pairs[i:i + batch_size] for i in range(0, len(pairs), batch_size)]
+            outcomes = [outcome for batch in pool.map(analyze_batch, batches, [batch_size] * len(batches))
+                        for outcome in batch]
+    return [(pair,) + outcome for pair, outcome in zip(pairs, outcomes)]
+
+
+class BulkRun:
+    """
+    One resumable run over a list of pairs; results go to the result log of run_id.
+    """
+
+    def __init__(self, results_folder: str, run_id: str, level: str = "fully_automated"):
+        self.log = ResultLog(results_folder, RESULTS_FSYNC_INTERVAL)
+        self.run_id = run_id
+        self.level = level
+        self.done = 0
+        self.failed = 0
+
+    def completed(self) -> set:
+        """
+        Returns the invoice files that already have a result in the run's log.
+        """
+        return {entry.get("invoice_file") for entry in self.log.read(self.run_id, self.level)}
+
+    def save(self, outcomes: list):
+        for pair, entry, error in outcomes:
+            if entry is None:
+                self.failed += 1
+                print(f"{pair[0]}: {error}")
+            else:
+                self.log.append(self.run_id, self.level, entry)
+                self.done += 1
+
+    def run(self, pairs: list, processes: int, threads: int, chunk_size: int, batch_size: int = 1,
+            progress_every: float = 10.0):
+        """
+        Analyzes all pairs that are not in the log yet.
+        At most 2 chunks per process are in flight, so memory use does not grow with the dataset.
+        """
+        completed = self.completed()
+        todo = [pair for pair in pairs if pair[0] not in completed]
+        chunks = [todo[i:i + chunk_size] for i in range(0, len(todo), chunk_size)]
+        print(f"{len(pairs)} pairs, {len(pairs) - len(todo)} already done, {len(todo)} to analyze")
+        start = last_report = time.time()
+        try:
+            if processes <= 0:
+                for chunk in chunks:
+                    self.save(analyze_chunk(chunk, threads, batch_size))
+                    last_report = self._report(len(todo), start, last_report, progress_every)
+            else:
+                with ProcessPoolExecutor(max_workers=processes) as pool:
+                    pending = set()
+                    for chunk in chunks:
+                        if len(pending) >= 2 * processes:
+                            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                            for future in finished:
+                                self.save(future.result())
+                            last_report = self._report(len(todo), start, last_report, progress_every)
+                        pending.add(pool.submit(analyze_chunk, chunk, threads, batch_size))
+                    for future in pending:
+                        self.save(future.result())
+        finally:
+            self.log.flush()
+        self._report(len(todo), start, 0, 0)
+
+    def _report(self, total: int, start: float, last_report: float, every: float) -> float:
+        now = time.time()
+        if now - last_report < every:
+            return last_report
+        elapsed = now - start
+        rate = self.done / elapsed if elapsed else 0.0
+        print(f"{self.done + self.failed}/{total} analyzed ({self.failed} failed) in {elapsed:.1f}s, "
+              f"{rate:.1f} pairs/s")
+        return now
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Runs the fully automated analysis over all dataset pairs.")
+    parser.add_argument("--results", default="bulk_results", help="result folder (default: bulk_results)")
+    parser.add_argument("--run-id", default="bulk", help="user ID the results are saved under; also the checkpoint")
+    parser.add_argument("--pool", choices=["all", "modified", "matching"], default="all",
+                        help="pairs with modified invoices, original invoices or both")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1,
+                        help="worker processes; 0 runs everything in this process (default: CPU count)")
+    parser.add_argument("--threads", type=int, default=4, help="analysis threads per process")
+    parser.add_argument("--chunk-size", type=int, default=16, help="pairs per chunk")
+    parser.add_argument("--batch-size", type=int, default=1, help="pairs per AI request (default: 1, no batching)")
+    parser.add_argument("--limit", type=int, default=None, help="only analyze the first N pairs")
+    args = parser.parse_args(argv)
+
+    pools = ["modified", "matching"] if args.pool == "all" else [args.pool]
+    pairs = dataset_pairs(pools)[:args.limit]
+    run = BulkRun(args.results, args.run_id)
+    try:
+        run.run(pairs, args.processes, args.threads, args.chunk_size, args.batch_size)
+    except KeyboardInterrupt:
+        print(f"Interrupted after {run.done} results; run again to resume")
+        return 1
+    return 0 if not run.failed else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
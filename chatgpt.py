@@ -1,23 +1,86 @@
-import openai
 import json
-import sys
-import locale
+from llm_cache import llm_cache
 
-# Reconfigure stdout and stderr to support UTF-8 encoding
-sys.stdout.reconfigure(encoding='utf-8')
-sys.stderr.reconfigure(encoding='utf-8')
-
-# Set locale to ensure proper formatting for numbers, dates, etc.
-locale.setlocale(locale.LC_ALL, 'en_US.UTF-8')
+# UTF-8 stdio and the locale are set up once by the app (see configure_runtime in app.py)
 
 # Encode the input string to UTF-8, replacing invalid characters, and then decode it back to a UTF-8 string
 def handle_encoding(s):
   return s.encode('utf-8', 'replace').decode('utf-8')
 
+def is_json_object(content):
+  """
+  Returns True if content parses as a JSON object. Only such responses are cached.
+  """
+  try:
+    return isinstance(json.loads(content), dict)
+  except json.JSONDecodeError:
+    return False
+
+def chat_completion(model, messages, validate=is_json_object, **params):
+  """
+  Sends a chat completion request through the shared client and returns the stripped response text.
+  Deterministic requests (temperature 0) are answered from the LLM response cache when possible.
+  
+  Parameters:
+    model (str): Model name.
+    messages (list): Chat messages.
+    validate (callable): Only responses for which validate(content) is true are cached.
+    **params: Further request parameters (temperature, max_tokens, ...).
+  
+  Returns:
+    str: The response text.
+  """
+  key = None
+  if params.get("temperature") == 0.0:
+    key = llm_cache.make_key({"model": model, "messages": messages, **params})
+    cached = llm_cache.get(key)
+    if cached is not None:
+      return cached
+
+  # The OpenAI SDK is only imported when the first request is actually sent
+  from llm_client import create_chat_completion
+  response = create_chat_completion(model=model, messages=messages, **params)
+  content = response.choices[0].message.content.strip()
+  if key is not None and (validate is None or validate(content)):
+    llm_cache.set(key, content)
+  return content
+
+# Appended to a system prompt when the fields were already extracted from the PDF layout (see layout_extractor.py)
+PREEXTRACTED_NOTE = """
+### Pre-extracted fields
+Instead of the PDF texts you receive "invoice_extracted" and "purchase_extracted", which were already extracted from the PDFs.
+Skip the extraction step, compare these fields directly and return them unchanged.
+"""
+
+def preextracted_prompts(system_prompt, extracted):
+  """
+  Builds the system and user prompt for already extracted fields.
+  
+  Parameters:
+    system_prompt (str): The function's regular system prompt.
+    extracted (tuple): (invoice_extracted, purchase_extracted) dicts.
+  
+  Returns:
+    tuple: (system prompt, user prompt)
+  """
+  user_prompt = json.dumps({
+    "invoice_extracted": extracted[0],
+    "purchase_extracted": extracted[1]
+  }, ensure_ascii=False)
+  return system_prompt + PREEXTRACTED_NOTE, user_prompt
+
+def keep_extracted(parsed, extracted):
+  """
+  Replaces the fields echoed by the AI with the pre-extracted ones, which are authoritative.
+  """
+  if extracted and isinstance(parsed, dict):
+    parsed["invoice_extracted"], parsed["purchase_extracted"] = extracted
+  return parsed
+
 # ---------------------------
 # AI for Assistive
 # ---------------------------
-def get_ai_errors_from_pdfs(invoice_pdf_text, purchase_pdf_text):
+def get_ai_errors_from_pdfs(invoice_pdf_text, purchase_pdf_text, extracted=None):
   """
   Calls the AI to extract invoice and purchase order data from given PDF texts.
   It also detects any errors based on discrepancies between the invoice and purchase order.
@@ -25,6 +88,7 @@ def get_ai_errors_from_pdfs(invoice_pdf_text, purchase_pdf_text):
   Parameters:
     invoice_pdf_text (str): Text content of the invoice PDF.
     purchase_pdf_text (str): Text content of the purchase order PDF.
+    extracted (tuple): Optional (invoice_extracted, purchase_extracted) dicts used instead of the PDF texts.
   
   Returns:
     dict: JSON object containing extracted invoice data, purchase order data, and a list of errors.
@@ -83,9 +147,11 @@ Only return a JSON object in the following format, without any additional explan
   "invoice_pdf_text": "{invoice_pdf_text}",
   "purchase_pdf_text": "{purchase_pdf_text}"
 }}"""
+  if extracted:
+    system_prompt, user_prompt = preextracted_prompts(system_prompt, extracted)
 
   # Request the AI's completion using the specified model and prompts
-  response = openai.chat.completions.create(
+  raw_content = chat_completion(
     model="gpt-4o-mini",
     messages=[
       {"role": "system", "content": system_prompt},
@@ -94,9 +160,6 @@ Only return a JSON object in the following format, without any additional explan
     temperature=0.0
   )
 
-  # Extract and clean the AI's response
-  raw_content = response.choices[0].message.content.strip()
-
   try:
     parsed_json = json.loads(raw_content)
     # Verify that the parsed JSON is a dictionary and contains an "errors" key
@@ -111,20 +174,31 @@ Only return a JSON object in the following format, without any additional explan
       "purchase_extracted": {},
       "errors": []
     }
-  return parsed_json
+  return keep_extracted(parsed_json, extracted)
+
+# Suggestion per error type, used instead of an AI call for the initial assistive suggestions
+SUGGESTION_TEMPLATES = {
+  "Order ID": "Maybe the Order ID is wrong.",
+  "Date": "Maybe the order date is wrong.",
+  "Contact Name": "Maybe the contact name is wrong.",
+  "Product ID": "Maybe a Product ID is wrong.",
+  "Product Name": "Maybe a product name is wrong.",
+  "Quantity": "Maybe a quantity is wrong.",
+  "Unit Price": "Maybe a unit price is wrong.",
+  "Total Price": "Maybe the total price is wrong.",
+  "Product is missing": "Maybe a product is missing."
+}
 
-def get_ai_suggestions(inv_data, po_data, errors, corrections):
+def get_remaining_error_types(errors, corrections):
   """
-  Generates concise markdown bullet point suggestions based on error types detected.
+  Returns the unique error types that have not been addressed by a valid correction, in order of appearance.
   
   Parameters:
-    inv_data (dict): Extracted invoice data.
-    po_data (dict): Extracted purchase order data.
     errors (list): List of error objects detected.
     corrections (list): List of correction objects with validation flags.
   
   Returns:
-    str: Markdown bullet points with error suggestions.
+    list: Error type names.
   """
   # Determine valid corrections from the corrections list
   valid_corrections = [c["type"] for c in corrections if c.get("is_valid")]
@@ -139,7 +213,37 @@ def get_ai_suggestions(inv_data, po_data, errors, corrections):
           remaining_errors.append({"type": error_str})
 
   # Get unique error types
-  unique_fields = list(dict.fromkeys(e["type"] for e in remaining_errors))
+  return list(dict.fromkeys(e["type"] for e in remaining_errors))
+
+def get_template_suggestions(errors, corrections):
+  """
+  Generates the same kind of markdown bullet points as get_ai_suggestions from fixed templates,
+  without an AI call.
+  
+  Parameters:
+    errors (list): List of error objects detected.
+    corrections (list): List of correction objects with validation flags.
+  
+  Returns:
+    str: Markdown bullet points with error suggestions.
+  """
+  unique_fields = get_remaining_error_types(errors, corrections)
+  return "\n".join(f"- {SUGGESTION_TEMPLATES.get(err, f'Maybe {err} is wrong.')}" for err in unique_fields)
+
+def get_ai_suggestions(inv_data, po_data, errors, corrections):
+  """
+  Generates concise markdown bullet point suggestions based on error types detected.
+  
+  Parameters:
+    inv_data (dict): Extracted invoice data.
+    po_data (dict): Extracted purchase order data.
+    errors (list): List of error objects detected.
+    corrections (list): List of correction objects with validation flags.
+  
+  Returns:
+    str: Markdown bullet points with error suggestions.
+  """
+  unique_fields = get_remaining_error_types(errors, corrections)
   if not unique_fields:
     return ""
 
@@ -162,7 +266,7 @@ Error types:
 """.strip()
 
   try:
-    response = openai.chat.completions.create(
+    raw_content = chat_completion(
       model="gpt-4o-mini",
       messages=[
         {"role": "system", "content": system_prompt},
@@ -171,14 +275,14 @@ Error types:
       temperature=0.6,
       max_tokens=150
     )
-    return response.choices[0].message.content.strip()
+    return raw_content
   except Exception as e:
     return f"AI Error: {str(e)}"
 
 # ---------------------------
 # AI for Cooperative
 # ---------------------------
-def get_ai_errors_cooperative(invoice_pdf_text, purchase_pdf_text):
+def get_ai_errors_cooperative(invoice_pdf_text, purchase_pdf_text, extracted=None):
   """
   The AI performs a analysis on invoice and purchase order PDFs.
   Extracts relevant fields, identifies errors, and suggests corrections.
@@ -186,6 +290,7 @@ def get_ai_errors_cooperative(invoice_pdf_text, purchase_pdf_text):
   Parameters:
     invoice_pdf_text (str): Invoice PDF content.
     purchase_pdf_text (str): Purchase order PDF content.
+    extracted (tuple): Optional (invoice_extracted, purchase_extracted) dicts used instead of the PDF texts.
   
   Returns:
     dict: JSON object containing extracted data, errors, and corrected invoice data.
@@ -245,9 +350,11 @@ Only return a JSON object in the following format, without any additional explan
     "invoice_pdf_text": invoice_pdf_text,
     "purchase_pdf_text": purchase_pdf_text
   }, ensure_ascii=False)
+  if extracted:
+    system_prompt, user_prompt = preextracted_prompts(system_prompt, extracted)
 
   try:
-    response = openai.chat.completions.create(
+    raw_content = chat_completion(
       model="gpt-4o-mini",
       messages=[
         {"role": "system", "content": system_prompt},
@@ -255,7 +362,6 @@ Only return a JSON object in the following format, without any additional explan
       ],
       temperature=0.0
     )
-    raw_content = response.choices[0].message.content.strip()
     result_json = json.loads(raw_content)
   except Exception as e:
     print("Error in get_ai_errors_cooperative:", e)
@@ -264,7 +370,7 @@ Only return a JSON object in the following format, without any additional explan
       "purchase_extracted": {},
       "errors": []
     }
-  return result_json
+  return keep_extracted(result_json, extracted)
 
 def fix_invoice_with_chatgpt(inv_data, purchase_data, instructions):
   """
@@ -340,7 +446,7 @@ Return only a JSON object in the following format, without any additional explan
   }
 
   try:
-    response = openai.chat.completions.create(
+    raw_content = chat_completion(
       model="gpt-4o-mini",
       messages=[
         {"role": "system", "content": system_prompt},
@@ -348,7 +454,6 @@ Return only a JSON object in the following format, without any additional explan
       ],
       temperature=0.0
     )
-    raw_content = response.choices[0].message.content.strip()
     result_json = json.loads(raw_content)
 
     result_json["ai_response"] = raw_content
@@ -367,13 +472,14 @@ Return only a JSON object in the following format, without any additional explan
 # ---------------------------
 # AI for Supervisory
 # ---------------------------
-def decide_with_chatgpt(invoice_pdf_text, purchase_pdf_text):
+def decide_with_chatgpt(invoice_pdf_text, purchase_pdf_text, extracted=None):
   """
   Uses the AI to decide whether an invoice should be processed automatically or escalated.
   
   Parameters:
     invoice_pdf_text (str): Invoice PDF content.
     purchase_pdf_text (str): Purchase order PDF content.
+    extracted (tuple): Optional (invoice_extracted, purchase_extracted) dicts used instead of the PDF texts.
   
   Returns:
     dict: JSON object containing extracted data, errors, decision ("auto" or "escalate"),
@@ -442,9 +548,11 @@ Only return a JSON object in the following format, without additional explanatio
   "invoice_pdf_text": "{invoice_pdf_text}",
   "purchase_pdf_text": "{purchase_pdf_text}"
 }}"""
+  if extracted:
+    system_prompt, user_prompt = preextracted_prompts(system_prompt, extracted)
 
   try:
-    response = openai.chat.completions.create(
+    raw_content = chat_completion(
       model="gpt-4o-mini",
       messages=[
         {"role": "system", "content": system_prompt},
@@ -452,7 +560,6 @@ Only return a JSON object in the following format, without additional explanatio
       ],
       temperature=0.0
     )
-    raw_content = response.choices[0].message.content.strip()
 
     parsed = {}
     try:
@@ -466,7 +573,7 @@ Only return a JSON object in the following format, without additional explanatio
         "decision": "auto",
         "booking": "decline"
       }
-    return parsed
+    return keep_extracted(parsed, extracted)
 
   except Exception as e:
 
@@ -481,19 +588,7 @@ Only return a JSON object in the following format, without additional explanatio
 # ---------------------------
 # AI for Fully Automated
 # ---------------------------
-def get_fully_auto_result(invoice_pdf_text, purchase_pdf_text):
-  """
-  Processes invoice and purchase order PDFs to extract data, detect errors, and
-  decide on corrections and booking status in a fully automated manner.
-  
-  Parameters:
-    invoice_pdf_text (str): Invoice PDF content.
-    purchase_pdf_text (str): Purchase order PDF content.
-  
-  Returns:
-    dict: JSON object containing extracted data, errors, corrected invoice data, and booking status.
-  """
-  system_prompt = """\
+FULLY_AUTO_SYSTEM_PROMPT = """\
 You are an AI assistant and receive two PDF texts:
 1) invoice_pdf_text (invoice)
 2) purchase_pdf_text (purchase order)
@@ -549,12 +644,29 @@ Only return a JSON object in the following format, without any additional explan
 - If a product is missing or there are more than two minor errors, or any serious error (e.g. missing contact/customer name, Order ID or Order Date), set "booking" to "decline".
 """
 
+def get_fully_auto_result(invoice_pdf_text, purchase_pdf_text, extracted=None):
+  """
+  Processes invoice and purchase order PDFs to extract data, detect errors, and
+  decide on corrections and booking status in a fully automated manner.
+  
+  Parameters:
+    invoice_pdf_text (str): Invoice PDF content.
+    purchase_pdf_text (str): Purchase order PDF content.
+    extracted (tuple): Optional (invoice_extracted, purchase_extracted) dicts used instead of the PDF texts.
+  
+  Returns:
+    dict: JSON object containing extracted data, errors, corrected invoice data, and booking status.
+  """
+  system_prompt = FULLY_AUTO_SYSTEM_PROMPT
+
   user_prompt = f"""{{
   "invoice_pdf_text": "{invoice_pdf_text}",
   "purchase_pdf_text": "{purchase_pdf_text}"
 }}"""
+  if extracted:
+    system_prompt, user_prompt = preextracted_prompts(system_prompt, extracted)
 
-  response = openai.chat.completions.create(
+  raw_content = chat_completion(
     model="gpt-4o-mini",
     messages=[
       {"role": "system", "content": system_prompt},
@@ -563,7 +675,6 @@ Only return a JSON object in the following format, without any additional explan
     temperature=0.0
   )
 
-  raw_content = response.choices[0].message.content.strip()
   try:
     parsed = json.loads(raw_content)
   except json.JSONDecodeError:
@@ -575,4 +686,84 @@ Only return a JSON object in the following format, without any additional explan
       "invoice_corrected": {},
       "booking": "decline"
     }
-  return parsed
+  return keep_extracted(parsed, extracted)
+
+# ---------------------------
+# Batched AI for Fully Automated
+# ---------------------------
+# Appended to FULLY_AUTO_SYSTEM_PROMPT when several pairs are sent in one request, so the long
+# system prompt is sent (and paid for) once per batch instead of once per pair
+BATCH_NOTE = """
+### Several pairs per request
+You receive a JSON object {"pairs": [...]} with several independent pairs instead of a single one. Each pair has a "pair_id" and either
+"invoice_pdf_text" and "purchase_pdf_text", or "invoice_extracted" and "purchase_extracted", which were already extracted from the PDFs
+(then skip the extraction step, compare these fields directly and return them unchanged).
+Apply all rules above to each pair on its own and return only a JSON object in the following format:
+{"results": [{"pair_id": "...", "invoice_extracted": {...}, "purchase_extracted": {...}, "errors": [...], "invoice_corrected": {...}, "booking": "book" or "decline"}, ...]}
+Return exactly one result per pair, with the pair's "pair_id".
+"""
+
+def fully_auto_batch_messages(pairs):
+  """
+  Builds the chat messages for a batch of pairs.
+  
+  Parameters:
+    pairs (list): (pair_id, invoice_pdf_text, purchase_pdf_text, extracted) tuples; extracted is None or
+      (invoice_extracted, purchase_extracted) as for get_fully_auto_result.
+  
+  Returns:
+    list: The system and user message.
+  """
+  entries = []
+  for pair_id, invoice_pdf_text, purchase_pdf_text, extracted in pairs:
+    if extracted:
+      entries.append({"pair_id": pair_id, "invoice_extracted": extracted[0], "purchase_extracted": extracted[1]})
+    else:
+      entries.append({"pair_id": pair_id, "invoice_pdf_text": invoice_pdf_text, "purchase_pdf_text": purchase_pdf_text})
+  return [
+    {"role": "system", "content": FULLY_AUTO_SYSTEM_PROMPT + BATCH_NOTE},
+    {"role": "user", "content": json.dumps({"pairs": entries}, ensure_ascii=False)}
+  ]
+
+def parse_fully_auto_batch(raw_content, pairs):
+  """
+  Splits a batch response into the results of its pairs.
+  
+  Returns:
+    dict: pair_id -> result for every pair with a usable result; pairs the response left out are missing.
+  """
+  try:
+    parsed = json.loads(raw_content)
+  except json.JSONDecodeError:
+    return {}
+  results = parsed.get("results") if isinstance(parsed, dict) else None
+  by_id = {}
+  for result in results if isinstance(results, list) else []:
+    if isinstance(result, dict) and "pair_id" in result:
+      by_id[str(result.pop("pair_id"))] = result
+  return {pair_id: keep_extracted(by_id[pair_id], extracted)
+          for pair_id, _invoice, _purchase, extracted in pairs if pair_id in by_id}
+
+def get_fully_auto_results(pairs):
+  """
+  Batched get_fully_auto_result: sends all pairs in one request and demultiplexes the results.
+  Pairs missing from the response are analyzed again one by one.
+  
+  Parameters:
+    pairs (list): (pair_id, invoice_pdf_text, purchase_pdf_text, extracted) tuples, see fully_auto_batch_messages.
+  
+  Returns:
+    list: One result per pair, in the order of pairs.
+  """
+  # Only complete responses are cached
+  validate = lambda content: len(parse_fully_auto_batch(content, pairs)) == len(pairs)
+  raw_content = chat_completion(
+    model="gpt-4o-mini",
+    messages=fully_auto_batch_messages(pairs),
+    validate=validate,
+    temperature=0.0
+  )
+  results = parse_fully_auto_batch(raw_content, pairs)
+  return [results[pair_id] if pair_id in results
+          else get_fully_auto_result(invoice_pdf_text, purchase_pdf_text, extracted=extracted)
+          for pair_id, invoice_pdf_text, purchase_pdf_text, extracted in pairs]
@@ -0,0 +1,106 @@
+import os
+
+# ---------------------------
+# DATASET AND STORAGE FOLDERS
+# ---------------------------
+# Define folders for invoices, purchase orders, modified invoices, and result storage
+INVOICE_FOLDER = "dataset/invoices"
+PURCHASE_FOLDER = "dataset/PurchaseOrders"
+MODIFIED_INVOICE_FOLDER = "dataset/invoices_modified"
+RESULTS_FOLDER = "results"
+
+# The in-memory dataset index (see dataset_index.py) checks the folders for changes at most this many seconds apart
+DATASET_REFRESH_INTERVAL = float(os.getenv("DATASET_REFRESH_INTERVAL", "2"))
+
+# Optional manifest of all dataset documents (see manifest.py), required for sharded dataset folders; empty to disable
+DATASET_MANIFEST = os.getenv("DATASET_MANIFEST", "")
+
+# Inverted index for matching invoices to purchase orders by content (see matching_index.py);
+# keys shared by more than MATCHING_MAX_POSTINGS purchase orders are ignored when matching
+MATCHING_INDEX_PATH = os.getenv("MATCHING_INDEX_PATH", os.path.join("cache", "matching.sqlite3"))
+MATCHING_MAX_POSTINGS = int(os.getenv("MATCHING_MAX_POSTINGS", "1000"))
+
+# Ingestion service (see ingest.py): watched inbox, archive of ingested documents and state database
+INGEST_INBOX = os.getenv("INGEST_INBOX", os.path.join("ingest", "inbox"))
+INGEST_ARCHIVE = os.getenv("INGEST_ARCHIVE", os.path.join("ingest", "archive"))
+INGEST_DB_PATH = os.getenv("INGEST_DB_PATH", os.path.join("ingest", "ingest.sqlite3"))
+INGEST_POLL_INTERVAL = float(os.getenv("INGEST_POLL_INTERVAL", "2"))
+# Files are only picked up once they were not modified for this many seconds, so partial uploads are skipped
+INGEST_SETTLE_SECONDS = float(os.getenv("INGEST_SETTLE_SECONDS", "2"))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "64"))
+INGEST_EXTRACT_WORKERS = int(os.getenv("INGEST_EXTRACT_WORKERS", "4"))
+INGEST_ANALYSIS_WORKERS = int(os.getenv("INGEST_ANALYSIS_WORKERS", "4"))
+# Minimum share of an invoice's matching keys (see matching_index.py) its best purchase order must match
+# for the pair to be analyzed
+INGEST_MIN_MATCH_COVERAGE = float(os.getenv("INGEST_MIN_MATCH_COVERAGE", "0.5"))
+
+# Result logs (see results_log.py) are fsynced in batches at most this many seconds apart; 0 fsyncs every entry
+RESULTS_FSYNC_INTERVAL = float(os.getenv("RESULTS_FSYNC_INTERVAL", "1"))
+
+# Optional SQLite copy of all results for queries across participants (see results_db.py); empty to disable
+RESULTS_DB_PATH = os.getenv("RESULTS_DB_PATH", "")
+
+# In-memory cache of served PDFs, and how long browsers may keep a PDF requested by its content version
+DOCUMENT_CACHE_MAX_BYTES = int(os.getenv("DOCUMENT_CACHE_MAX_MB", "64")) * 1024 * 1024
+DOCUMENT_MAX_AGE = int(os.getenv("DOCUMENT_MAX_AGE", str(365 * 24 * 3600)))
+
+# Show pre-rendered page images instead of embedded PDFs (see page_images.py); format is webp or png
+PAGE_IMAGES = os.getenv("PAGE_IMAGES", "0") == "1"
+PAGE_IMAGE_FORMAT = os.getenv("PAGE_IMAGE_FORMAT", "webp").lower()
+PAGE_IMAGE_RESOLUTION = int(os.getenv("PAGE_IMAGE_RESOLUTION", "110"))
+THUMBNAIL_WIDTH = int(os.getenv("THUMBNAIL_WIDTH", "200"))
+PAGE_IMAGE_CACHE_FOLDER = os.getenv("PAGE_IMAGE_CACHE_FOLDER", os.path.join("cache", "pages"))
+PAGE_IMAGE_CACHE_MAX_BYTES = int(os.getenv("PAGE_IMAGE_CACHE_MAX_MB", "512")) * 1024 * 1024
+
+# Prebuilt text corpus of the dataset (see corpus.py)
+CORPUS_PATH = os.getenv("CORPUS_PATH", os.path.join("cache", "corpus.bin"))
+
+# Threads per worker process that extract the documents of a pair in parallel (see pipeline.py)
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", "4"))
+
+# On-disk cache of extracted PDF texts (see extraction.py)
+TEXT_CACHE_FOLDER = os.getenv("TEXT_CACHE_FOLDER", os.path.join("cache", "text"))
+TEXT_CACHE_MAX_BYTES = int(os.getenv("TEXT_CACHE_MAX_MB", "256")) * 1024 * 1024
+
+# On-disk cache of template-extracted invoice/purchase order fields (see layout_extractor.py)
+FIELDS_CACHE_FOLDER = os.getenv("FIELDS_CACHE_FOLDER", os.path.join("cache", "fields"))
+FIELDS_CACHE_MAX_BYTES = int(os.getenv("FIELDS_CACHE_MAX_MB", "64")) * 1024 * 1024
+
+# Compute errors, decision and booking with rules_engine.py and only ask the LLM about ambiguous pairs
+LOCAL_ANALYSIS = os.getenv("LOCAL_ANALYSIS", "1") == "1"
+
+# LLM response cache (see llm_cache.py): memory://, sqlite:///path or redis://host:port/db; empty for in-process only
+LLM_CACHE_URL = os.getenv("LLM_CACHE_URL", "sqlite:///" + os.path.join("cache", "llm.sqlite3"))
+LLM_CACHE_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "512"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL_HOURS", "168")) * 3600
+
+# Shared OpenAI client (see llm_client.py); all durations in seconds
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "60"))
+LLM_DEADLINE = float(os.getenv("LLM_DEADLINE", "90"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "8"))
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "16"))
+LLM_HEDGE = os.getenv("LLM_HEDGE", "1") == "1"
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "2"))
+
+# Ask the AI for the initial assistive suggestions instead of building them from templates (one extra round trip)
+ASSISTIVE_AI_SUGGESTIONS = os.getenv("ASSISTIVE_AI_SUGGESTIONS", "0") == "1"
+
+# Live assistive suggestions (see suggestions.py): refine the template text with the AI in the background
+SUGGESTION_AI_REFINE = os.getenv("SUGGESTION_AI_REFINE", "0") == "1"
+SUGGESTION_MEMO_ENTRIES = int(os.getenv("SUGGESTION_MEMO_ENTRIES", "1024"))
+
+# Background analysis jobs (see jobs.py): job state lives in a store shared by all worker processes
+JOBS_URL = os.getenv("JOBS_URL", "sqlite:///" + os.path.join("cache", "jobs.sqlite3"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "8"))
+JOB_TTL = float(os.getenv("JOB_TTL_MINUTES", "30")) * 60
+# A queued or running job whose record was not refreshed for this long is treated as lost (e.g. its worker
+# process was restarted) and started again; the process running a job refreshes it a few times per interval
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "60"))
+
+# Server-side sessions (see server_session.py): memory://, sqlite:///path or redis://host:port/db;
+# empty to keep the session data in Flask's signed cookie
+SESSION_URL = os.getenv("SESSION_URL", "sqlite:///" + os.path.join("cache", "sessions.sqlite3"))
+SESSION_TTL = float(os.getenv("SESSION_TTL_HOURS", "24")) * 3600
@@ -0,0 +1,155 @@
+import os
+import sys
+import mmap
+import struct
+import time
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from config import INVOICE_FOLDER, MODIFIED_INVOICE_FOLDER, PURCHASE_FOLDER, CORPUS_PATH
+from extraction import EXTRACTOR_VERSION, file_digest, pdf_to_text_plumber
+
+# ---------------------------
+# CORPUS FILE FORMAT
+# ---------------------------
+# header | utf-8 texts, back to back | index
+# The index holds one fixed-size record per document, sorted by content digest,
+# so a lookup is a binary search directly on the memory-mapped file.
+MAGIC = b"IACORP01"
+HEADER = struct.Struct("<8s16sQI")      # magic, extractor version, index offset, document count
+INDEX_ENTRY = struct.Struct("<32sQI")   # sha256 digest, text offset, text length
+
+
+class TextCorpus:
+    """
+    Read-only view of a corpus file built by build_corpus().
+    Texts are read straight from the memory-mapped file; no PDF is parsed.
+    """
+
+    def __init__(self, path: str):
+        """
+        Opens a corpus file. Raises ValueError if it is not a complete corpus file.
+        """
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = None
+        try:
+            size = os.fstat(self._file.fileno()).st_size
+            if size < HEADER.size:
+                raise ValueError(f"{path} is too short for a text corpus")
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, self._index_offset, self.count = HEADER.unpack_from(self._mm, 0)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a text corpus")
+            if self._index_offset + self.count * INDEX_ENTRY.size > size:
+                raise ValueError(f"{path} is truncated")
+            self.extractor_version = version.rstrip(b"\0").decode("ascii")
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+        self._file.close()
+
+    def _entry(self, i: int):
+        return INDEX_ENTRY.unpack_from(self._mm, self._index_offset + i * INDEX_ENTRY.size)
+
+    def get(self, digest_hex: str):
+        """
+        Returns the text of the document with the given content digest or None.
+        """
+        digest = bytes.fromhex(digest_hex)
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            entry_digest, offset, length = self._entry(mid)
+            if entry_digest == digest:
+                return self._mm[offset:offset + length].decode("utf-8")
+            if entry_digest < digest:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+
+
+def write_corpus(path: str, documents: dict):
+    """
+    Writes {digest_hex: text} to a corpus file.
+    The file is written next to its destination and atomically renamed into place,
+    so running web workers keep reading the previous corpus until it is replaced.
+    """
+    folder = os.path.dirname(path) or "."
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=".corpus-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(b"\0" * HEADER.size)
+            entries = []
+            for digest_hex in sorted(documents):
+                data = documents[digest_hex].encode("utf-8")
+                entries.append((bytes.fromhex(digest_hex), f.tell(), len(data)))
+                f.write(data)
+            index_offset = f.tell()
+            for entry in entries:
+                f.write(INDEX_ENTRY.pack(*entry))
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, EXTRACTOR_VERSION.encode("ascii"), index_offset, len(entries)))
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+# ---------------------------
+# BUILD
+# ---------------------------
+def collect_pdfs(folders):
+    """
+    Returns {digest_hex: path} for every PDF in the given folders. Identical files are only kept once.
+    """
+    pdfs = {}
+    for folder in folders:
+        # Walks into subfolders too, for sharded dataset folders (see manifest.py)
+        for root, dirs, files in os.walk(folder):
+            dirs.sort()
+            for name in sorted(files):
+                if name.endswith(".pdf"):
+                    path = os.path.join(root, name)
+                    pdfs.setdefault(file_digest(path), path)
+    return pdfs
+
+
+def build_corpus(output: str, folders, workers=None, chunksize: int = 16) -> int:
+    """
+    Extracts the text of every PDF in folders across a process pool and writes the corpus file.
+    Returns the number of documents written.
+    """
+    pdfs = collect_pdfs(folders)
+    digests = list(pdfs)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        texts = pool.map(pdf_to_text_plumber, [pdfs[d] for d in digests], chunksize=chunksize)
+        documents = dict(zip(digests, texts))
+    write_corpus(output, documents)
+    return len(documents)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-extract the text of all dataset PDFs into a corpus file.")
+    parser.add_argument("--output", default=CORPUS_PATH, help=f"corpus file to write (default: {CORPUS_PATH})")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: CPU count)")
+    parser.add_argument("folders", nargs="*", default=[INVOICE_FOLDER, MODIFIED_INVOICE_FOLDER, PURCHASE_FOLDER],
+                        help="folders to scan (default: the dataset folders)")
+    args = parser.parse_args(argv)
+
+    start = time.time()
+    count = build_corpus(args.output, args.folders, workers=args.workers)
+    print(f"Wrote {count} documents to {args.output} in {time.time() - start:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+import os
+import time
+import threading
+
+from config import INVOICE_FOLDER, PURCHASE_FOLDER, MODIFIED_INVOICE_FOLDER, DATASET_REFRESH_INTERVAL
+from manifest import dataset_manifest
+
+# ---------------------------
+# DATASET INDEX
+# ---------------------------
+# Keeps the invoice numbers of the dataset folders in memory, so picking a pair no longer lists the
+# folders on every request. A folder is only scanned again when its mtime changes, i.e. when files
+# were added, removed or renamed in it, and the mtimes are checked at most every refresh_interval seconds.
+# With a dataset manifest (see manifest.py) the pairs are read from the manifest instead, and only
+# read again when the manifest was rebuilt.
+
+
+def scan_numbers(folder: str, prefix: str) -> frozenset:
+    """
+    Returns the numbers XXXX of all files named "<prefix>XXXX.pdf" in folder.
+    """
+    numbers = set()
+    try:
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                name = entry.name
+                if name.startswith(prefix) and name.endswith(".pdf"):
+                    numbers.add(name[len(prefix):-4])
+    except FileNotFoundError:
+        pass
+    return frozenset(numbers)
+
+
+def folder_mtime(folder: str):
+    try:
+        return os.stat(folder).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+class DatasetIndex:
+    """
+    In-memory index of the invoice-purchase pairs of the dataset.
+    - matching(): numbers with an original invoice and a purchase order
+    - modified(): numbers with a modified invoice and a purchase order
+    Both are sorted tuples, so positions in them are stable until the dataset changes;
+    pool(name) also returns a map from each number of the pool to its position.
+    """
+
+    def __init__(self, invoice_folder: str, modified_folder: str, purchase_folder: str,
+                 refresh_interval: float = 2.0, manifest=None):
+        self.folders = {
+            "invoice": (invoice_folder, "invoice_"),
+            "modified": (modified_folder, "modified_invoice_"),
+            "purchase": (purchase_folder, "purchase_orders_")
+        }
+        self.refresh_interval = refresh_interval
+        self.manifest = manifest
+        self._generation = None
+        self._mtimes = {}
+        self._numbers = {}
+        self._pairs = {"matching": (), "modified": ()}
+        self._positions = {"matching": {}, "modified": {}}
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def refresh(self, force: bool = False):
+        """
+        Rescans the folders whose mtime changed since the last scan, or re-reads a rebuilt manifest.
+        """
+        now = time.monotonic()
+        if not force and now - self._checked < self.refresh_interval:
+            return
+        with self._lock:
+            if not force and now - self._checked < self.refresh_interval:
+                return
+            if self.manifest is not None:
+                self._refresh_from_manifest()
+                self._checked = now
+                return
+            changed = False
+            for name, (folder, prefix) in self.folders.items():
+                mtime = folder_mtime(folder)
+                if force or name not in self._numbers or mtime != self._mtimes.get(name):
+                    # Record the mtime before scanning, so a change during the scan triggers another one
+                    self._mtimes[name] = mtime
+                    self._numbers[name] = scan_numbers(folder, prefix)
+                    changed = True
+            if changed:
+                purchases = self._numbers["purchase"]
+                self._set_pairs(tuple(sorted(self._numbers["invoice"] & purchases)),
+                                tuple(sorted(self._numbers["modified"] & purchases)))
+            self._checked = now
+
+    def _refresh_from_manifest(self):
+        generation = self.manifest.generation()
+        if generation != self._generation:
+            self._generation = generation
+            self._set_pairs(self.manifest.pairs("invoice"), self.manifest.pairs("modified"))
+
+    def _set_pairs(self, matching: tuple, modified: tuple):
+        self._pairs = {"matching": matching, "modified": modified}
+        self._positions = {pool: {number: position for position, number in enumerate(numbers)}
+                           for pool, numbers in self._pairs.items()}
+
+    def matching(self) -> tuple:
+        self.refresh()
+        return self._pairs["matching"]
+
+    def modified(self) -> tuple:
+        self.refresh()
+        return self._pairs["modified"]
+
+    def pool(self, name: str):
+        """
+        Returns (numbers, positions) of the "matching" or "modified" pool, both from the same scan.
+        """
+        self.refresh()
+        with self._lock:
+            return self._pairs[name], self._positions[name]
+
+
+dataset_index = DatasetIndex(INVOICE_FOLDER, MODIFIED_INVOICE_FOLDER, PURCHASE_FOLDER, DATASET_REFRESH_INTERVAL,
+                             dataset_manifest)
@@ -0,0 +1,52 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+from config import DOCUMENT_CACHE_MAX_BYTES
+
+# ---------------------------
+# IN-MEMORY DOCUMENT CACHE
+# ---------------------------
+
+
+class DocumentCache:
+    """
+    Keeps the bytes and SHA-256 digest of recently served PDFs in memory, up to max_bytes.
+    Entries are keyed on path, size and mtime, so a changed file is read again.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, path: str):
+        """
+        Returns (content bytes, hex digest) of the file at path.
+        """
+        st = os.stat(path)
+        key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+
+        with open(path, "rb") as f:
+            data = f.read()
+        entry = (data, hashlib.sha256(data).hexdigest())
+        if len(data) > self.max_bytes:
+            return entry
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = entry
+                self._bytes += len(data)
+            while self._bytes > self.max_bytes:
+                _, (old_data, _) = self._entries.popitem(last=False)
+                self._bytes -= len(old_data)
+        return entry
+
+
+document_cache = DocumentCache(DOCUMENT_CACHE_MAX_BYTES)
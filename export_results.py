@@ -0,0 +1,227 @@
+import os
+import sys
+import json
+import argparse
+
+from config import RESULTS_FOLDER
+from results_log import ResultLog
+
+# ---------------------------
+# COLUMNAR EXPORT OF ALL RESULTS
+# ---------------------------
+# Streams every participant's results into three tables:
+# - results: one row per saved result with its scalar fields and the main extracted fields
+# - errors:  one row per entry of "errors" / "errors_found"
+# - items:   one row per product line of the extracted (and corrected) invoice and purchase order
+# Rows are written in chunks, so memory use does not grow with the number of participants.
+# Requires pyarrow (listed in requirements.txt).
+LEVELS = ["manual", "assistive", "cooperative", "supervisory_control", "fully_automated"]
+
+RESULT_COLUMNS = {
+    "result_id": "string", "user_id": "string", "level": "string", "seq": "int64",
+    "invoice_file": "string", "purchase_file": "string", "duration_seconds": "float64",
+    "decision": "string", "booking": "string", "supervisor_note": "string", "error_count": "int64",
+    "invoice_order_id": "string", "invoice_order_date": "string", "invoice_contact_name": "string",
+    "invoice_total_price": "float64", "purchase_order_id": "string", "purchase_order_date": "string",
+    "purchase_customer_name": "string", "corrected": "bool", "extra": "string"
+}
+ERROR_COLUMNS = {
+    "result_id": "string", "list": "string", "position": "int64", "error_type": "string",
+    "description": "string", "correction": "string", "free_text": "string", "details": "string"
+}
+ITEM_COLUMNS = {
+    "result_id": "string", "document": "string", "position": "int64", "product_id": "string",
+    "product_name": "string", "quantity": "float64", "unit_price": "float64", "details": "string"
+}
+KNOWN_KEYS = {"invoice_file", "purchase_file", "duration_seconds", "decision", "booking", "supervisor_note",
+              "errors", "errors_found", "invoice_extracted", "purchase_extracted", "invoice_corrected"}
+ITEM_DOCUMENTS = {"invoice_extracted": "invoice", "purchase_extracted": "purchase",
+                  "invoice_corrected": "invoice_corrected"}
+
+
+def to_str(value):
+    if value is None:
+        return None
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+def to_float(value):
+    """
+    Converts numbers and numeric strings (also with a decimal comma) to float; returns None otherwise.
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        text = value.strip().replace(" ", "")
+        if text.rfind(",") > text.rfind("."):
+            # Decimal comma, e.g. "1.234,50"
+            text = text.replace(".", "").replace(",", ".")
+        try:
+            return float(text.replace(",", ""))
+        except ValueError:
+            return None
+    return None
+
+
+def flatten_result(user_id: str, level: str, seq: int, entry: dict):
+    """
+    Splits one result entry into its results row, error rows and item rows.
+    """
+    result_id = f"{user_id}/{level}/{seq}"
+    invoice = entry.get("invoice_extracted") or {}
+    purchase = entry.get("purchase_extracted") or {}
+    errors = entry.get("errors") or []
+    extra = {key: value for key, value in entry.items() if key not in KNOWN_KEYS}
+    result = {
+        "result_id": result_id,
+        "user_id": user_id,
+        "level": level,
+        "seq": seq,
+        "invoice_file": to_str(entry.get("invoice_file")),
+        "purchase_file": to_str(entry.get("purchase_file")),
+        "duration_seconds": to_float(entry.get("duration_seconds")),
+        "decision": to_str(entry.get("decision")),
+        "booking": to_str(entry.get("booking")),
+        "supervisor_note": to_str(entry.get("supervisor_note")),
+        "error_count": len(errors) + len(entry.get("errors_found") or []),
+        "invoice_order_id": to_str(invoice.get("order_id")),
+        "invoice_order_date": to_str(invoice.get("order_date")),
+        "invoice_contact_name": to_str(invoice.get("contact_name")),
+        "invoice_total_price": to_float(invoice.get("total_price")),
+        "purchase_order_id": to_str(purchase.get("order_id")),
+        "purchase_order_date": to_str(purchase.get("order_date")),
+        "purchase_customer_name": to_str(purchase.get("customer_name")),
+        "corrected": bool(entry.get("invoice_corrected")),
+        "extra": json.dumps(extra, ensure_ascii=False) if extra else None
+    }
+
+    error_rows = []
+    for list_name in ("errors", "errors_found"):
+        for position, error in enumerate(entry.get(list_name) or []):
+            error = error if isinstance(error, dict) else {"description": error}
+            error_rows.append({
+                "result_id": result_id,
+                "list": list_name,
+                "position": position,
+                "error_type": to_str(error.get("error_type", error.get("type"))),
+                "description": to_str(error.get("description")),
+                "correction": to_str(error.get("correction")),
+                "free_text": to_str(error.get("free_text")),
+                "details": json.dumps(error, ensure_ascii=False)
+            })
+
+    item_rows = []
+    for key, document in ITEM_DOCUMENTS.items():
+        extracted = entry.get(key)
+        if not isinstance(extracted, dict):
+            continue
+        for position, item in enumerate(extracted.get("items") or []):
+            if not isinstance(item, dict):
+                continue
+            item_rows.append({
+                "result_id": result_id,
+                "document": document,
+                "position": position,
+                "product_id": to_str(item.get("product_id")),
+                "product_name": to_str(item.get("product_name")),
+                "quantity": to_float(item.get("quantity")),
+                "unit_price": to_float(item.get("unit_price")),
+                "details": json.dumps(item, ensure_ascii=False)
+            })
+    return result, error_rows, item_rows
+
+
+class ChunkedTableWriter:
+    """
+    Collects rows of one table and writes them as record batches of chunk_size rows
+    to a Parquet or Arrow IPC file.
+    """
+
+    def __init__(self, path: str, columns: dict, file_format: str, chunk_size: int):
+        import pyarrow as pa
+        self._pa = pa
+        self.path = path
+        self.columns = columns
+        self.chunk_size = chunk_size
+        self.schema = pa.schema([(name, pa.type_for_alias(dtype)) for name, dtype in columns.items()])
+        if file_format == "parquet":
+            import pyarrow.parquet as pq
+            self._writer = pq.ParquetWriter(path, self.schema, compression="zstd")
+        else:
+            self._writer = pa.ipc.new_file(path, self.schema)
+        self._rows = []
+        self.rows_written = 0
+
+    def add(self, rows: list):
+        self._rows.extend(rows)
+        if len(self._rows) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self._rows:
+            return
+        batch = self._pa.RecordBatch.from_pylist(self._rows, schema=self.schema)
+        self._writer.write_batch(batch)
+        self.rows_written += len(self._rows)
+        self._rows = []
+
+    def close(self):
+        self.flush()
+        self._writer.close()
+
+
+def export_results(results_folder: str, output_folder: str, file_format: str = "parquet",
+                   chunk_size: int = 10000, levels: list = None) -> dict:
+    """
+    Exports all results into results, errors and items files in output_folder.
+
+    Returns:
+        dict: Number of rows written per table.
+    """
+    os.makedirs(output_folder, exist_ok=True)
+    suffix = ".parquet" if file_format == "parquet" else ".arrow"
+    writers = {
+        name: ChunkedTableWriter(os.path.join(output_folder, name + suffix), columns, file_format, chunk_size)
+        for name, columns in (("results", RESULT_COLUMNS), ("errors", ERROR_COLUMNS), ("items", ITEM_COLUMNS))
+    }
+    log = ResultLog(results_folder)
+    try:
+        for user_id, level in log.iter_logs():
+            if levels and level not in levels:
+                continue
+            for seq, entry in enumerate(log.read(user_id, level), start=1):
+                result, error_rows, item_rows = flatten_result(user_id, level, seq, entry)
+                writers["results"].add([result])
+                writers["errors"].add(error_rows)
+                writers["items"].add(item_rows)
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return {name: writer.rows_written for name, writer in writers.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exports all saved results to Parquet or Arrow files.")
+    parser.add_argument("output", help="output folder")
+    parser.add_argument("--results", default=RESULTS_FOLDER, help="results folder to read")
+    parser.add_argument("--format", choices=["parquet", "arrow"], default="parquet")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="rows per written chunk")
+    parser.add_argument("--level", action="append", choices=LEVELS, help="only export this level (repeatable)")
+    args = parser.parse_args(argv)
+
+    try:
+        import pyarrow
+    except ImportError:
+        print("The export requires pyarrow: pip install pyarrow")
+        return 1
+    counts = export_results(args.results, args.output, args.format, args.chunk_size, args.level)
+    print(", ".join(f"{count} {name}" for name, count in counts.items()) + f" written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+import os
+import struct
+import hashlib
+import tempfile
+from functools import lru_cache
+from config import TEXT_CACHE_FOLDER, TEXT_CACHE_MAX_BYTES, CORPUS_PATH
+
+try:
+    import fcntl
+except ImportError:  # Windows: atomic renames still keep entries consistent
+    fcntl = None
+
+# ---------------------------
+# CONFIGURATION
+# ---------------------------
+# Bump whenever pdf_to_text_plumber changes its output so old cache entries are ignored
+EXTRACTOR_VERSION = "plumber-1"
+
+
+# ---------------------------
+# PDF TEXT EXTRACTION
+# ---------------------------
+def pdf_to_text_plumber(pdf_path: str) -> str:
+    """
+    Extracts the text of a PDF using pdfplumber.
+    """
+    import pdfplumber  # imported on first use, it is slow to import
+    full_text = []
+    with pdfplumber.open(pdf_path) as pdf:
+        for page in pdf.pages:
+            text = page.extract_text()
+            if text:
+                full_text.append(text)
+    return "\n".join(full_text)
+
+
+@lru_cache(maxsize=8192)
+def _digest_for(path: str, size: int, mtime_ns: int) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def file_digest(path: str) -> str:
+    """
+    Returns the SHA-256 hex digest of a file's content.
+    The digest is memoized per (path, size, mtime) so unchanged files are hashed only once per process.
+    """
+    st = os.stat(path)
+    return _digest_for(os.path.abspath(path), st.st_size, st.st_mtime_ns)
+
+
+# ---------------------------
+# DISK CACHE
+# ---------------------------
+class DiskCache:
+    """
+    Content-addressed, size-bounded on-disk cache shared by all worker processes.
+    - Entries are written to a temporary file and atomically renamed into place,
+      so readers never observe partial writes.
+    - Reads bump the entry's mtime, which serves as the LRU clock.
+    - Eviction runs under an exclusive lock file and removes the least recently used
+      entries until the cache is back below 90% of max_bytes.
+    """
+
+    def __init__(self, folder: str, max_bytes: int, suffix: str = ""):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self._approx_bytes = None
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.folder, key[:2], key + self.suffix)
+
+    def get(self, key: str):
+        """
+        Returns the cached bytes for key or None.
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return data
+
+    def set(self, key: str, data: bytes):
+        """
+        Stores data under key, evicting old entries if the cache grows beyond max_bytes.
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        if self._approx_bytes is None:
+            self._approx_bytes = self._total_size()
+        else:
+            self._approx_bytes += len(data)
+        if self._approx_bytes > self.max_bytes:
+            self.evict()
+
+    def _entries(self):
+        for root, _dirs, files in os.walk(self.folder):
+            for name in files:
+                if name.startswith(".") or not name.endswith(self.suffix):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield path, st.st_size, st.st_mtime
+
+    def _total_size(self) -> int:
+        return sum(size for _path, size, _mtime in self._entries())
+
+    def evict(self):
+        """
+        Removes least recently used entries until the cache uses at most 90% of max_bytes.
+        """
+        os.makedirs(self.folder, exist_ok=True)
+        with open(os.path.join(self.folder, ".lock"), "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                entries = sorted(self._entries(), key=lambda e: e[2])
+                total = sum(size for _path, size, _mtime in entries)
+                target = int(self.max_bytes * 0.9)
+                for path, size, _mtime in entries:
+                    if total <= target:
+                        break
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        continue
+                    total -= size
+                self._approx_bytes = total
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+text_cache = DiskCache(TEXT_CACHE_FOLDER, TEXT_CACHE_MAX_BYTES, suffix=".txt")
+
+
+def text_cache_key(pdf_path: str) -> str:
+    """
+    Returns the cache key of a PDF: its content hash combined with the extractor version.
+    """
+    return hashlib.sha256(f"{file_digest(pdf_path)}:{EXTRACTOR_VERSION}".encode("ascii")).hexdigest()
+
+
+_corpus = None
+_corpus_mtime = None
+# mtime of a corpus file that could not be used (unreadable or built by another extractor version)
+_rejected_corpus_mtime = None
+
+
+def get_corpus():
+    """
+    Returns the prebuilt text corpus (see corpus.py) or None if none has been built.
+    The corpus is reopened when the file is replaced by a new build; a file that cannot be used
+    is not opened again until it is replaced.
+    """
+    global _corpus, _corpus_mtime, _rejected_corpus_mtime
+    try:
+        mtime = os.stat(CORPUS_PATH).st_mtime_ns
+    except OSError:
+        return None
+    if mtime == _rejected_corpus_mtime:
+        return None
+    if _corpus is None or mtime != _corpus_mtime:
+        from corpus import TextCorpus
+        if _corpus is not None:
+            # Replaced by a new build; a thread still reading the old one gets a miss (see get_pdf_text)
+            _corpus.close()
+            _corpus, _corpus_mtime = None, None
+        try:
+            corpus = TextCorpus(CORPUS_PATH)
+        except (OSError, ValueError, struct.error) as e:
+            print(f"Could not open text corpus {CORPUS_PATH}: {e}")
+            _rejected_corpus_mtime = mtime
+            return None
+        if corpus.extractor_version != EXTRACTOR_VERSION:
+            print(f"Ignoring text corpus {CORPUS_PATH}: built by extractor version {corpus.extractor_version}, "
+                  f"not {EXTRACTOR_VERSION}; rebuild it with corpus.py")
+            corpus.close()
+            _rejected_corpus_mtime = mtime
+            return None
+        _corpus, _corpus_mtime = corpus, mtime
+    return _corpus
+
+
+def get_pdf_text(pdf_path: str) -> str:
+    """
+    Returns the text of a PDF.
+    Looks in the prebuilt corpus first, then in the on-disk text cache, and only parses the PDF on a miss.
+    """
+    corpus = get_corpus()
+    if corpus is not None:
+        try:
+            text = corpus.get(file_digest(pdf_path))
+        except ValueError:
+            # The corpus was closed by another thread because a rebuild replaced it
+            text = None
+        if text is not None:
+            return text
+
+    key = text_cache_key(pdf_path)
+    cached = text_cache.get(key)
+    if cached is not None:
+        return cached.decode("utf-8")
+    text = pdf_to_text_plumber(pdf_path)
+    try:
+        text_cache.set(key, text.encode("utf-8"))
+    except OSError as e:
+        print(f"Text cache write failed for {pdf_path}: {e}")
+    return text
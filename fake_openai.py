@@ -0,0 +1,142 @@
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# ---------------------------
+# LOCAL STAND-IN FOR THE OPENAI API
+# ---------------------------
+# Serves /v1/chat/completions with canned answers in the shapes chatgpt.py expects,
+# with configurable latency, slow outliers and failures. Point the app at it with
+#   OPENAI_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=fake
+# Besides the random --slow-rate and --error-rate, --slow-first and --fail-first make the first N requests
+# slow or fail, for reproducible tests of the client (see tests/test_llm_client.py).
+
+
+def fake_content(messages: list) -> str:
+    """
+    Builds a plausible response for the given chat messages.
+    """
+    system_prompt = messages[0].get("content", "") if messages else ""
+    user_prompt = messages[-1].get("content", "") if messages else ""
+    if "rewrites error messages" in system_prompt:
+        return "- Maybe a field is wrong."
+
+    try:
+        user_data = json.loads(user_prompt)
+    except json.JSONDecodeError:
+        user_data = {}
+    if not isinstance(user_data, dict):
+        user_data = {}
+    if isinstance(user_data.get("pairs"), list):
+        # Batched request (see get_fully_auto_results): one result per pair
+        return json.dumps({"results": [
+            dict(json.loads(fake_content([messages[0], {"content": json.dumps(pair)}])), pair_id=pair.get("pair_id"))
+            for pair in user_data["pairs"]
+        ]})
+    result = {
+        "invoice_extracted": user_data.get("invoice_extracted", {}),
+        "purchase_extracted": user_data.get("purchase_extracted", {}),
+        "errors": []
+    }
+    if '"decision"' in system_prompt:
+        result["decision"] = "auto"
+    if '"booking"' in system_prompt:
+        result["booking"] = "book"
+    if '"invoice_corrected"' in system_prompt:
+        result["invoice_corrected"] = {}
+    if '"ai_answer"' in system_prompt:
+        result["ai_answer"] = "No changes."
+    return json.dumps(result)
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    options = None
+    # Number of chat completion requests received so far
+    requests = 0
+    _count_lock = threading.Lock()
+
+    @classmethod
+    def _count_request(cls) -> int:
+        with cls._count_lock:
+            cls.requests += 1
+            return cls.requests
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        number = self._count_request()
+        options = self.options
+        delay = options.latency + random.uniform(0, options.jitter)
+        if number <= options.slow_first or random.random() < options.slow_rate:
+            delay = options.slow_latency
+        time.sleep(delay)
+        if number <= options.fail_first or random.random() < options.error_rate:
+            self._send_json(options.error_status, {"error": {"message": "Injected failure", "type": "server_error"}})
+            return
+
+        content = fake_content(request.get("messages", []))
+        self._send_json(200, {
+            "id": f"chatcmpl-fake-{random.getrandbits(32):08x}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        })
+
+    def log_message(self, format, *args):
+        if not self.options.quiet:
+            super().log_message(format, *args)
+
+
+def parse_options(argv=None):
+    parser = argparse.ArgumentParser(description="Local stand-in for the OpenAI chat completions API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.2, help="base latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.1, help="random extra latency in seconds")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="share of requests that are slow outliers")
+    parser.add_argument("--slow-latency", type=float, default=10.0, help="latency of slow outliers in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with an error")
+    parser.add_argument("--slow-first", type=int, default=0, help="make the first N requests slow outliers")
+    parser.add_argument("--fail-first", type=int, default=0, help="answer the first N requests with an error")
+    parser.add_argument("--error-status", type=int, default=503, help="HTTP status of injected errors (default: 503)")
+    parser.add_argument("--quiet", action="store_true", help="do not log requests")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_options(argv)
+    FakeOpenAIHandler.options = args
+    server = ThreadingHTTPServer((args.host, args.port), FakeOpenAIHandler)
+    print(f"Fake OpenAI server listening on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
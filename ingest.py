@@ -0,0 +1,407 @@
+import os
+import sys
+import json
+import time
+import queue
+import shutil
+import sqlite3
+import argparse
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+if __name__ == "__main__":
+    # Settings from .env, like the app (see configure_runtime in app.py); loaded before config.py reads them
+    from dotenv import load_dotenv
+    load_dotenv()
+
+from config import (INGEST_INBOX, INGEST_ARCHIVE, INGEST_DB_PATH, INGEST_POLL_INTERVAL, INGEST_SETTLE_SECONDS,
+                    INGEST_QUEUE_SIZE, INGEST_EXTRACT_WORKERS, INGEST_ANALYSIS_WORKERS, INGEST_MIN_MATCH_COVERAGE)
+from extraction import file_digest, get_pdf_text
+from layout_extractor import extract_fields
+from matching_index import matching_index
+from pipeline import run_analysis, fully_automated_entry
+
+# ---------------------------
+# INGESTION SERVICE
+# ---------------------------
+# Processes invoices and purchase orders dropped into an inbox folder without anybody opening them:
+#   watch -> extract -> index / match -> analyze
+# - watch:   polls the inbox and queues PDFs that were not modified for INGEST_SETTLE_SECONDS
+# - extract: dedupes by content hash, moves the file into the archive and extracts its text and fields
+#            in a process pool (filling the text and fields caches the analysis reads from)
+# - index:   adds purchase orders to the matching index (see matching_index.py) and matches invoices;
+#            invoices without a good enough match are retried once per scan, after the scanned documents
+#            went through extract and index, if new purchase orders were indexed
+# - analyze: runs the fully automated analysis (see pipeline.py) of each matched pair
+# The stages are connected by queues of INGEST_QUEUE_SIZE entries. A full queue blocks the stage in front
+# of it, so a slow analysis stage throttles extraction and the watcher instead of piling up work in memory.
+# Start with "python ingest.py", or "python ingest.py --once" to process the current inbox and exit.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    sha256 TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    kind TEXT,
+    path TEXT NOT NULL,
+    status TEXT NOT NULL,
+    received REAL NOT NULL,
+    fields TEXT,
+    detail TEXT
+);
+CREATE INDEX IF NOT EXISTS documents_status ON documents (status);
+CREATE TABLE IF NOT EXISTS results (
+    invoice_sha256 TEXT PRIMARY KEY,
+    purchase_name TEXT NOT NULL,
+    score REAL,
+    entry TEXT NOT NULL,
+    timings TEXT,
+    analyzed REAL NOT NULL
+);
+"""
+
+
+def classify(text: str):
+    """
+    Returns "invoice" or "purchase" from the title line of a document text, or None.
+    """
+    for line in text.splitlines():
+        line = line.strip()
+        if line:
+            if line.startswith("Invoice"):
+                return "invoice"
+            if line.startswith("Purchase Order"):
+                return "purchase"
+            return None
+    return None
+
+
+def extract_document(path: str):
+    """
+    Runs in the process pool: extracts (and caches) the text and the fields of a document.
+
+    Returns:
+        tuple: (kind, fields dict, confidence)
+    """
+    kind = classify(get_pdf_text(path))
+    if kind is None:
+        return None, {}, 0.0
+    fields, confidence = extract_fields(path, kind)
+    return kind, fields, confidence
+
+
+class IngestDB:
+    """
+    State of the ingestion service: every received document by content hash and the analysis results.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def add(self, sha256: str, name: str, path: str) -> bool:
+        """
+        Records a received document. Returns False if a document with the same content was received before.
+        """
+        with self._conn() as conn:
+            cursor = conn.execute("INSERT OR IGNORE INTO documents (sha256, name, path, status, received) "
+                                  "VALUES (?, ?, ?, 'received', ?)", (sha256, name, path, time.time()))
+        return cursor.rowcount == 1
+
+    def update(self, sha256: str, status: str, kind: str = None, fields: dict = None, detail: str = None):
+        with self._conn() as conn:
+            conn.execute("UPDATE documents SET status = ?, kind = COALESCE(?, kind), "
+                         "fields = COALESCE(?, fields), detail = ? WHERE sha256 = ?",
+                         (status, kind, json.dumps(fields, ensure_ascii=False) if fields is not None else None,
+                          detail, sha256))
+
+    def unmatched(self) -> list:
+        """
+        Returns (sha256, name, path, fields) of all invoices still waiting for their purchase order.
+        """
+        rows = self._conn().execute("SELECT sha256, name, path, fields FROM documents WHERE status = 'unmatched'")
+        return [(sha256, name, path, json.loads(fields)) for sha256, name, path, fields in rows]
+
+    def interrupted(self) -> list:
+        """
+        Returns (sha256, name, path) of the archived documents whose extraction did not finish.
+        """
+        return self._conn().execute("SELECT sha256, name, path FROM documents "
+                                    "WHERE status IN ('received', 'extracted')").fetchall()
+
+    def pending_analyses(self) -> list:
+        """
+        Returns the matched pairs whose analysis did not finish, e.g. because the service was stopped.
+        """
+        rows = self._conn().execute("SELECT sha256, name, path, detail FROM documents WHERE status = 'matched'")
+        return [(sha256, name, path, json.loads(detail)) for sha256, name, path, detail in rows]
+
+    def add_result(self, invoice_sha256: str, purchase_name: str, score: float, entry: dict, timings: dict):
+        with self._conn() as conn:
+            conn.execute("INSERT OR REPLACE INTO results (invoice_sha256, purchase_name, score, entry, timings, "
+                         "analyzed) VALUES (?, ?, ?, ?, ?, ?)",
+                         (invoice_sha256, purchase_name, score, json.dumps(entry, ensure_ascii=False),
+                          json.dumps(timings), time.time()))
+
+    def counts(self) -> dict:
+        return dict(self._conn().execute("SELECT status, COUNT(*) FROM documents GROUP BY status"))
+
+
+class IngestService:
+    """
+    The four pipeline stages, each running in its own thread(s).
+    """
+
+    def __init__(self, inbox: str, archive: str, db: IngestDB, index=matching_index,
+                 queue_size: int = INGEST_QUEUE_SIZE, extract_workers: int = INGEST_EXTRACT_WORKERS,
+                 analysis_workers: int = INGEST_ANALYSIS_WORKERS, min_coverage: float = INGEST_MIN_MATCH_COVERAGE):
+        self.inbox = inbox
+        self.archive = archive
+        self.db = db
+        self.index = index
+        self.extract_workers = extract_workers
+        self.analysis_workers = analysis_workers
+        self.min_coverage = min_coverage
+        self.files = queue.Queue(maxsize=queue_size)
+        self.documents = queue.Queue(maxsize=queue_size)
+        self.pairs = queue.Queue(maxsize=queue_size)
+        self.stop = threading.Event()
+        self._new_purchase_orders = threading.Event()
+        self._in_flight = set()
+        self._in_flight_lock = threading.Lock()
+        # Worker processes are spawned rather than forked, as forking a process with running threads can deadlock
+        self._pool = ProcessPoolExecutor(max_workers=extract_workers, mp_context=multiprocessing.get_context("spawn"))
+        self._threads = []
+        os.makedirs(inbox, exist_ok=True)
+        os.makedirs(archive, exist_ok=True)
+
+    # --- watch ---
+    def scan(self) -> int:
+        """
+        Queues all settled PDFs of the inbox that are not queued yet. Returns the number of queued files.
+        Blocks while the extract queue is full.
+        """
+        now = time.time()
+        queued = 0
+        with os.scandir(self.inbox) as entries:
+            ready = sorted(entry.path for entry in entries
+                           if entry.is_file() and entry.name.lower().endswith(".pdf")
+                           and now - entry.stat().st_mtime >= INGEST_SETTLE_SECONDS)
+        for path in ready:
+            with self._in_flight_lock:
+                if path in self._in_flight:
+                    continue
+                self._in_flight.add(path)
+            self._put(self.files, path)
+            queued += 1
+        return queued
+
+    def _watch(self):
+        while not self.stop.is_set():
+            self.scan()
+            self.files.join()
+            self.documents.join()
+            self.retry_unmatched()
+            self.stop.wait(INGEST_POLL_INTERVAL)
+
+    def _put(self, target: queue.Queue, item):
+        """
+        Puts item into a bounded queue, waiting while it is full (backpressure) unless the service stops.
+        """
+        while not self.stop.is_set():
+            try:
+                target.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    # --- extract ---
+    def _extract(self):
+        while True:
+            item = self.files.get()
+            try:
+                if isinstance(item, tuple):
+                    self._extract_archived(*item)
+                else:
+                    self._extract_one(item)
+            except Exception as e:
+                print(f"Ingestion of {item} failed: {e}")
+                if not isinstance(item, tuple):
+                    self._move_failed(item)
+            finally:
+                with self._in_flight_lock:
+                    self._in_flight.discard(item)
+                self.files.task_done()
+
+    def _extract_one(self, path: str):
+        sha256 = file_digest(path)
+        name = f"{sha256[:16]}_{os.path.basename(path)}"
+        archived = os.path.join(self.archive, sha256[:2], name)
+        if not self.db.add(sha256, name, archived):
+            print(f"Skipping {os.path.basename(path)}: duplicate of an ingested document")
+            os.remove(path)
+            return
+        os.makedirs(os.path.dirname(archived), exist_ok=True)
+        shutil.move(path, archived)
+        self._extract_archived(sha256, name, archived)
+
+    def _extract_archived(self, sha256: str, name: str, archived: str):
+        try:
+            kind, fields, confidence = self._pool.submit(extract_document, archived).result()
+        except Exception as e:
+            if not self.stop.is_set():
+                self.db.update(sha256, "failed", detail=str(e))
+            raise
+        if kind is None:
+            self.db.update(sha256, "failed", detail="Neither an invoice nor a purchase order")
+            return
+        self.db.update(sha256, "extracted", kind=kind, fields=fields, detail=f"confidence {confidence}")
+        self._put(self.documents, (sha256, kind, name, archived, fields))
+
+    def _move_failed(self, path: str):
+        if os.path.exists(path):
+            failed = os.path.join(self.archive, "failed")
+            os.makedirs(failed, exist_ok=True)
+            shutil.move(path, os.path.join(failed, os.path.basename(path)))
+
+    # --- index / match ---
+    def _index(self):
+        while True:
+            sha256, kind, name, path, fields = self.documents.get()
+            try:
+                if kind == "purchase":
+                    self.index.add_purchase_orders([(name, path, sha256, fields)])
+                    self.db.update(sha256, "indexed")
+                    self._new_purchase_orders.set()
+                else:
+                    self.match(sha256, name, path, fields)
+            except Exception as e:
+                print(f"Indexing of {name} failed: {e}")
+                self.db.update(sha256, "failed", detail=str(e))
+            finally:
+                self.documents.task_done()
+
+    def match(self, sha256: str, name: str, path: str, fields: dict) -> bool:
+        """
+        Matches an invoice and queues the pair for analysis if the best candidate covers at least min_coverage
+        of the invoice's keys.
+        """
+        candidates = self.index.match(fields, limit=1)
+        if not candidates or candidates[0]["coverage"] < self.min_coverage:
+            self.db.update(sha256, "unmatched")
+            return False
+        best = candidates[0]
+        pair = {"purchase_name": best["name"], "purchase_path": best["path"], "score": best["score"],
+                "coverage": best["coverage"]}
+        self.db.update(sha256, "matched", detail=json.dumps(pair))
+        self._put(self.pairs, (sha256, name, path, pair))
+        return True
+
+    def retry_unmatched(self) -> int:
+        """
+        Matches the unmatched invoices again if purchase orders were indexed since the last retry.
+        Called once per scan, when the index stage is idle. Returns the number of retried invoices.
+        """
+        if not self._new_purchase_orders.is_set():
+            return 0
+        self._new_purchase_orders.clear()
+        unmatched = self.db.unmatched()
+        for sha256, name, path, fields in unmatched:
+            self.match(sha256, name, path, fields)
+        return len(unmatched)
+
+    # --- analyze ---
+    def _analyze(self):
+        from chatgpt import get_fully_auto_result
+        while True:
+            sha256, name, path, pair = self.pairs.get()
+            try:
+                start = time.time()
+                result, timings = run_analysis(get_fully_auto_result, path, pair["purchase_path"])
+                entry = fully_automated_entry(result, name, pair["purchase_name"], round(time.time() - start, 2))
+                self.db.add_result(sha256, pair["purchase_name"], pair["score"], entry, timings)
+                self.db.update(sha256, "analyzed", detail=json.dumps(pair))
+            except Exception as e:
+                print(f"Analysis of {name} failed: {e}")
+                self.db.update(sha256, "failed", detail=str(e))
+            finally:
+                self.pairs.task_done()
+
+    # --- control ---
+    def start(self, watch: bool = True):
+        workers = [(self._extract, self.extract_workers), (self._index, 1), (self._analyze, self.analysis_workers)]
+        if watch:
+            workers.append((self._watch, 1))
+        for target, count in workers:
+            for i in range(count):
+                thread = threading.Thread(target=target, name=f"ingest{target.__name__}-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        # Documents and pairs left over from the last shutdown are processed again
+        for sha256, name, path in self.db.interrupted():
+            self._put(self.files, (sha256, name, path))
+        for sha256, name, path, pair in self.db.pending_analyses():
+            self._put(self.pairs, (sha256, name, path, pair))
+
+    def drain(self):
+        """
+        Waits until every queued document went through all stages.
+        """
+        self.files.join()
+        self.documents.join()
+        self.retry_unmatched()
+        self.pairs.join()
+
+    def shutdown(self):
+        self.stop.set()
+        self._pool.shutdown(cancel_futures=True)
+
+    def status(self) -> str:
+        counts = ", ".join(f"{count} {status}" for status, count in sorted(self.db.counts().items()))
+        return (f"{counts or 'no documents'} | queued: {self.files.qsize()} files, "
+                f"{self.documents.qsize()} documents, {self.pairs.qsize()} pairs")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingests invoices and purchase orders dropped into an inbox folder.")
+    parser.add_argument("--inbox", default=INGEST_INBOX, help=f"folder to watch (default: {INGEST_INBOX})")
+    parser.add_argument("--archive", default=INGEST_ARCHIVE, help="folder for ingested documents")
+    parser.add_argument("--db", default=INGEST_DB_PATH, help="state database")
+    parser.add_argument("--once", action="store_true", help="process the current inbox, then exit")
+    parser.add_argument("--status-interval", type=float, default=30, help="seconds between status lines")
+    args = parser.parse_args(argv)
+
+    service = IngestService(args.inbox, args.archive, IngestDB(args.db))
+    try:
+        if args.once:
+            service.start(watch=False)
+            service.scan()
+            service.drain()
+        else:
+            service.start()
+            print(f"Watching {args.inbox} (Ctrl+C to stop)")
+            while True:
+                time.sleep(args.status_interval)
+                print(service.status())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.shutdown()
+    print(service.status())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+import json
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from config import JOBS_URL, JOB_WORKERS, JOB_TTL, JOB_STALE_SECONDS
+from kvstore import MemoryStore, open_store
+
+# ---------------------------
+# BACKGROUND JOBS
+# ---------------------------
+# The *_process routes run their analysis here instead of holding the request open.
+# Jobs run on a thread pool in the process that accepted them; their state is kept in a
+# store (see kvstore.py) so that status requests can be answered by any worker process.
+# The process running a job refreshes its record regularly; a job whose record has not been refreshed
+# for stale_after seconds was lost with its process (e.g. a restarted worker) and is reported as unknown,
+# so that process_in_background in app.py submits it again.
+FINISHED = ("done", "failed")
+
+
+class JobQueue:
+    """
+    Runs functions in the background and tracks their status and progress.
+    A job record is a dict with:
+    - id, owner: job id and the user id allowed to see it
+    - status: "queued", "running", "done" or "failed"
+    - stage: the last progress stage reported by the function
+    - created, updated, finished: timestamps; updated is refreshed on every save and by the heartbeat
+    - result or error once finished
+    """
+
+    def __init__(self, store=None, workers: int = 8, ttl: float = 1800, stale_after: float = 60):
+        self.store = store if store is not None else MemoryStore()
+        self.ttl = ttl
+        self.stale_after = stale_after
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        # Unfinished jobs of this process by id; the lock keeps heartbeat saves from overwriting a final save
+        self._active = {}
+        self._lock = threading.Lock()
+        self._heartbeat = None
+
+    def _save(self, job: dict):
+        job["updated"] = time.time()
+        self.store.set("job:" + job["id"], json.dumps(job, ensure_ascii=False).encode("utf-8"), self.ttl)
+
+    def _beat(self):
+        while True:
+            time.sleep(self.stale_after / 4)
+            with self._lock:
+                for job in list(self._active.values()):
+                    self._save(job)
+
+    def _start_heartbeat(self):
+        with self._lock:
+            if self._heartbeat is None:
+                self._heartbeat = threading.Thread(target=self._beat, name="job-heartbeat", daemon=True)
+                self._heartbeat.start()
+
+    def submit(self, func, *args, owner: str = "", **kwargs) -> dict:
+        """
+        Enqueues func(*args, progress=callback, **kwargs) and returns the new job record.
+        The function reports its stage by calling progress(stage); its return value must be JSON serializable.
+        """
+        job = {
+            "id": uuid.uuid4().hex,
+            "owner": owner,
+            "status": "queued",
+            "stage": "queued",
+            "created": time.time(),
+            "updated": None,
+            "finished": None,
+            "result": None,
+            "error": None
+        }
+        self._start_heartbeat()
+        running = dict(job)
+        with self._lock:
+            self._save(running)
+            self._active[job["id"]] = running
+        job["updated"] = running["updated"]
+        self._executor.submit(self._run, running, func, args, kwargs)
+        return job
+
+    def _run(self, job: dict, func, args: tuple, kwargs: dict):
+        def progress(stage: str):
+            with self._lock:
+                job["stage"] = stage
+                self._save(job)
+
+        job["status"] = "running"
+        try:
+            result = func(*args, progress=progress, **kwargs)
+            status, error = "done", None
+        except Exception as e:
+            print(f"Job {job['id']} failed: {e}")
+            result, status, error = None, "failed", str(e)
+        with self._lock:
+            self._active.pop(job["id"], None)
+            job["result"], job["error"] = result, error
+            job["status"] = job["stage"] = status
+            job["finished"] = time.time()
+            self._save(job)
+
+    def get(self, job_id: str, owner: str = None):
+        """
+        Returns the job record, or None if it does not exist, has expired, was lost or belongs to another owner.
+        """
+        value = self.store.get("job:" + job_id) if job_id else None
+        if value is None:
+            return None
+        job = json.loads(value)
+        if owner is not None and job["owner"] != owner:
+            return None
+        if self.is_lost(job):
+            print(f"Job {job_id} was lost while {job['status']} (not refreshed since {job['updated']:.0f})")
+            self.delete(job_id)
+            return None
+        return job
+
+    def is_lost(self, job: dict) -> bool:
+        """
+        Returns whether an unfinished job has not been refreshed for stale_after seconds,
+        i.e. the process running it is gone.
+        """
+        updated = job.get("updated") or job["created"]
+        return job["status"] not in FINISHED and time.time() - updated > self.stale_after
+
+    def delete(self, job_id: str):
+        self.store.delete("job:" + job_id)
+
+    def wait_for_change(self, job_id: str, owner: str, stage: str, timeout: float = 15, interval: float = 0.2):
+        """
+        Waits until the job's stage differs from stage, or timeout seconds have passed.
+        Returns the current job record (None if it disappeared).
+        """
+        end = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id, owner)
+            if job is None or job["stage"] != stage or time.monotonic() >= end:
+                return job
+            time.sleep(interval)
+
+
+def public_view(job: dict) -> dict:
+    """
+    Returns the part of a job record that is sent to the browser.
+    """
+    return {"job_id": job["id"], "status": job["status"], "stage": job["stage"], "error": job["error"]}
+
+
+job_queue = JobQueue(open_store(JOBS_URL, prefix="jobs:"), JOB_WORKERS, JOB_TTL, JOB_STALE_SECONDS)
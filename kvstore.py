@@ -0,0 +1,196 @@
+import os
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# ---------------------------
+# KEY-VALUE STORES
+# ---------------------------
+# Small byte-oriented stores with expiry, used for caches and server-side state.
+# All stores share the same interface: get(key), set(key, value, ttl=None), delete(key).
+
+
+class MemoryStore:
+    """
+    In-process LRU store. Entries expire after their TTL and the least recently used
+    entries are dropped once max_entries is reached.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: float = None):
+        expires = time.time() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class SQLiteStore:
+    """
+    Persistent store in a SQLite file, shared by all worker processes on a host.
+    Uses WAL mode so readers never block the writer, and evicts the least recently
+    used entries once max_entries is exceeded.
+    Reads do not write: their access times are collected in memory and written in one transaction
+    every access_flush_interval seconds or access_flush_entries reads, and before evicting.
+    """
+
+    def __init__(self, path: str, max_entries: int = 100000, access_flush_interval: float = 5.0,
+                 access_flush_entries: int = 256):
+        self.path = path
+        self.max_entries = max_entries
+        self.access_flush_interval = access_flush_interval
+        self.access_flush_entries = access_flush_entries
+        self._local = threading.local()
+        self._writes = 0
+        self._accessed = {}
+        self._accessed_lock = threading.Lock()
+        self._accessed_flushed = time.monotonic()
+        self._setup_lock = threading.Lock()
+        self._ready = False
+
+    def _conn(self):
+        """
+        Returns this thread's connection. The file and its table are created on first use,
+        so creating a store (e.g. at import time) does not touch the disk.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            with self._setup_lock:
+                folder = os.path.dirname(self.path)
+                if not self._ready and folder:
+                    os.makedirs(folder, exist_ok=True)
+                conn = sqlite3.connect(self.path, timeout=10)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                if not self._ready:
+                    conn.execute("""CREATE TABLE IF NOT EXISTS kv (
+                                        key TEXT PRIMARY KEY,
+                                        value BLOB NOT NULL,
+                                        expires REAL,
+                                        accessed REAL NOT NULL)""")
+                    conn.execute("CREATE INDEX IF NOT EXISTS kv_accessed ON kv (accessed)")
+                    conn.commit()
+                    self._ready = True
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str):
+        conn = self._conn()
+        row = conn.execute("SELECT value, expires FROM kv WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, expires = row
+        now = time.time()
+        if expires is not None and expires < now:
+            self.delete(key)
+            return None
+        with self._accessed_lock:
+            self._accessed[key] = now
+            due = (len(self._accessed) >= self.access_flush_entries
+                   or time.monotonic() - self._accessed_flushed >= self.access_flush_interval)
+        if due:
+            self.flush_access_times()
+        return bytes(value)
+
+    def flush_access_times(self):
+        """
+        Writes the collected access times of read entries in one transaction.
+        """
+        with self._accessed_lock:
+            accessed, self._accessed = self._accessed, {}
+            self._accessed_flushed = time.monotonic()
+        if not accessed:
+            return
+        conn = self._conn()
+        conn.executemany("UPDATE kv SET accessed = MAX(accessed, ?) WHERE key = ?",
+                         [(when, key) for key, when in accessed.items()])
+        conn.commit()
+
+    def set(self, key: str, value: bytes, ttl: float = None):
+        now = time.time()
+        conn = self._conn()
+        conn.execute("INSERT OR REPLACE INTO kv (key, value, expires, accessed) VALUES (?, ?, ?, ?)",
+                     (key, sqlite3.Binary(value), now + ttl if ttl else None, now))
+        conn.commit()
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self.evict()
+
+    def delete(self, key: str):
+        conn = self._conn()
+        conn.execute("DELETE FROM kv WHERE key = ?", (key,))
+        conn.commit()
+
+    def evict(self):
+        """
+        Drops expired entries and the least recently used entries above max_entries.
+        """
+        self.flush_access_times()
+        conn = self._conn()
+        conn.execute("DELETE FROM kv WHERE expires IS NOT NULL AND expires < ?", (time.time(),))
+        conn.execute("""DELETE FROM kv WHERE key IN (
+                            SELECT key FROM kv ORDER BY accessed DESC LIMIT -1 OFFSET ?)""",
+                     (self.max_entries,))
+        conn.commit()
+
+
+class RedisStore:
+    """
+    Store backed by Redis or any server speaking its protocol. Requires the redis package.
+    Eviction is left to the server's maxmemory policy.
+    """
+
+    def __init__(self, url: str, prefix: str = ""):
+        import redis
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key: str):
+        return self._client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes, ttl: float = None):
+        self._client.set(self.prefix + key, value, ex=int(ttl) if ttl else None)
+
+    def delete(self, key: str):
+        self._client.delete(self.prefix + key)
+
+
+def open_store(url: str, max_entries: int = 100000, prefix: str = ""):
+    """
+    Opens a store from a URL:
+    - "memory://" for an in-process store
+    - "sqlite:///path/to/file.sqlite3" for a SQLite file
+    - "redis://host:port/db" for Redis
+    Returns None for an empty URL.
+    """
+    if not url:
+        return None
+    if url.startswith("memory://"):
+        return MemoryStore(max_entries)
+    if url.startswith("sqlite:///"):
+        return SQLiteStore(url[len("sqlite:///"):], max_entries)
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisStore(url, prefix)
+    raise ValueError(f"Unsupported store URL: {url}")
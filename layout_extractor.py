@@ -0,0 +1,175 @@
+import re
+import json
+
+from config import FIELDS_CACHE_FOLDER, FIELDS_CACHE_MAX_BYTES
+from extraction import DiskCache, file_digest
+
+# ---------------------------
+# CONFIGURATION
+# ---------------------------
+# Bump whenever the extracted fields change so old cache entries are ignored
+LAYOUT_VERSION = "layout-1"
+
+# Minimum confidence for the extracted fields to be used instead of the LLM extraction
+CONFIDENCE_THRESHOLD = 0.9
+
+fields_cache = DiskCache(FIELDS_CACHE_FOLDER, FIELDS_CACHE_MAX_BYTES, suffix=".json")
+
+_NUMBER_RE = re.compile(r"^-?\d+(\.\d+)?$")
+
+
+# ---------------------------
+# HELPERS
+# ---------------------------
+def _cell(value) -> str:
+    return (value or "").strip()
+
+
+def _number(text: str):
+    """
+    Parses "12" as 12 and "14.0" as 14.0, so the value prints the way it appears in the PDF.
+    Returns None if text is not a number.
+    """
+    text = text.replace(",", "")
+    if not _NUMBER_RE.match(text):
+        return None
+    return float(text) if "." in text else int(text)
+
+
+def _label_value(lines, label: str):
+    """
+    Returns the value after "<label>:" on its own line, "" if the label has no value
+    and None if the label does not appear at all.
+    """
+    prefix = label + ":"
+    for line in lines:
+        if line.startswith(prefix):
+            return line[len(prefix):].strip()
+    return None
+
+
+def _parse_items(rows, checks: list):
+    """
+    Parses product rows into item dicts. Blank rows are skipped; the "TotalPrice" row is returned separately.
+    """
+    items = []
+    total_price = None
+    for row in rows:
+        cells = [_cell(c) for c in row] + [""] * (4 - len(row))
+        if not any(cells):
+            continue
+        if cells[2].replace(" ", "").lower() == "totalprice":
+            total_price = _number(cells[3])
+            checks.append(total_price is not None or cells[3] == "")
+            continue
+        quantity = _number(cells[2])
+        unit_price = _number(cells[3])
+        checks.append((quantity is not None or cells[2] == "") and (unit_price is not None or cells[3] == ""))
+        items.append({
+            "product_id": cells[0],
+            "product_name": cells[1],
+            "quantity": quantity if quantity is not None else cells[2],
+            "unit_price": unit_price if unit_price is not None else cells[3]
+        })
+    return items, total_price
+
+
+def _product_rows(tables, header: str):
+    """
+    Returns the rows of the product table below its header row, including the rows of
+    continuation tables on following pages, or None if the table is not found.
+    """
+    for i, table in enumerate(tables):
+        if table and _cell(table[0][0]) == header:
+            rows = list(table[1:])
+            for continuation in tables[i + 1:]:
+                if not all(len(row) == 4 for row in continuation):
+                    break
+                rows.extend(continuation)
+            return rows
+    return None
+
+
+def _read_pdf(pdf_path: str):
+    import pdfplumber  # imported on first use, it is slow to import
+    lines, tables = [], []
+    with pdfplumber.open(pdf_path) as pdf:
+        for page in pdf.pages:
+            lines.extend(line.strip() for line in (page.extract_text() or "").splitlines())
+            tables.extend(page.extract_tables())
+    return lines, tables
+
+
+# ---------------------------
+# TEMPLATES
+# ---------------------------
+def _extract_invoice(pdf_path: str):
+    lines, tables = _read_pdf(pdf_path)
+    checks = [bool(lines) and lines[0] == "Invoice"]
+    fields = {}
+    for key, label in (("order_id", "Order ID"), ("order_date", "Order Date"), ("contact_name", "Contact Name")):
+        value = _label_value(lines, label)
+        checks.append(value is not None)
+        fields[key] = value or ""
+
+    product_rows = _product_rows(tables, "Product ID")
+    checks.append(product_rows is not None)
+    items, total_price = _parse_items(product_rows or [], checks)
+    checks.append(total_price is not None)
+    fields["items"] = items
+    fields["total_price"] = total_price if total_price is not None else ""
+    return fields, checks
+
+
+def _extract_purchase(pdf_path: str):
+    lines, tables = _read_pdf(pdf_path)
+    checks = [bool(lines) and lines[0] == "Purchase Orders"]
+    fields = {"order_id": "", "order_date": "", "customer_name": ""}
+
+    header_table = next((t for t in tables if t and _cell(t[0][0]) == "Order ID"), None)
+    checks.append(header_table is not None and len(header_table) >= 2)
+    if header_table and len(header_table) >= 2:
+        row = [_cell(c) for c in header_table[1]] + [""] * 3
+        fields["order_id"], fields["order_date"], fields["customer_name"] = row[:3]
+
+    product_rows = _product_rows(tables, "Product ID:")
+    checks.append(product_rows is not None)
+    fields["items"], _total = _parse_items(product_rows or [], checks)
+    return fields, checks
+
+
+def extract_fields(pdf_path: str, kind: str):
+    """
+    Extracts the fields the LLM prompts ask for from an invoice or purchase order PDF
+    using the fixed templates of the dataset.
+
+    Parameters:
+        pdf_path (str): Path of the PDF.
+        kind (str): "invoice" or "purchase".
+
+    Returns:
+        tuple: (fields dict shaped like invoice_extracted / purchase_extracted,
+                confidence between 0.0 and 1.0)
+    """
+    key = f"{file_digest(pdf_path)}-{kind}-{LAYOUT_VERSION}"
+    cached = fields_cache.get(key)
+    if cached is not None:
+        entry = json.loads(cached)
+        return entry["fields"], entry["confidence"]
+
+    try:
+        fields, checks = _extract_invoice(pdf_path) if kind == "invoice" else _extract_purchase(pdf_path)
+    except Exception as e:
+        print(f"Layout extraction failed for {pdf_path}: {e}")
+        return {}, 0.0
+    confidence = round(sum(1 for c in checks if c) / len(checks), 2)
+
+    try:
+        fields_cache.set(key, json.dumps({"fields": fields, "confidence": confidence}).encode("utf-8"))
+    except OSError as e:
+        print(f"Fields cache write failed for {pdf_path}: {e}")
+    return fields, confidence
+
+
+def is_confident(confidence: float) -> bool:
+    return confidence >= CONFIDENCE_THRESHOLD
@@ -0,0 +1,205 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+if __name__ == "__main__":
+    # Settings from .env, like the app (see configure_runtime in app.py); loaded before config.py reads them
+    from dotenv import load_dotenv
+    load_dotenv()
+
+from config import RESULTS_FSYNC_INTERVAL
+from pipeline import prepare_analysis, run_analysis, fully_automated_entry
+from results_log import ResultLog
+
+# ---------------------------
+# BATCH JSONL JOBS
+# ---------------------------
+# Offline alternative to bulk_runner.py for the pairs that need the AI:
+# 1. prepare: runs the local part of the analysis over the dataset and writes the remaining pairs, several
+#    per request (see get_fully_auto_results), as a request file in the OpenAI Batch API format:
+#      {"custom_id": "...", "method": "POST", "url": "/v1/chat/completions", "body": {...}}
+#    plus a sidecar file <requests>.pairs.jsonl that lists the pairs of every request and the locally settled pairs.
+# 2. run: sends every request of the file through the shared client (e.g. to fake_openai.py, or any
+#    compatible endpoint via OPENAI_BASE_URL) and writes the responses in the Batch API output format.
+#    A run that is started again only sends the requests without a successful response.
+#    The request file can also be submitted to the OpenAI Batch API instead, whose output file has the same format.
+# 3. collect: splits the responses into the results of their pairs and appends them to a result log,
+#    in the data_entry shape of the fully automated level. Pairs the responses left out (or whose request
+#    failed) are analyzed one by one instead (see get_fully_auto_result). Like bulk_runner.py, pairs already
+#    in the log are skipped, so collect can be run again, e.g. after more requests succeeded.
+MODEL = "gpt-4o-mini"
+
+
+def sidecar_path(requests_path: str) -> str:
+    return requests_path + ".pairs.jsonl"
+
+
+def prepare(requests_path: str, pairs: list, batch_size: int) -> dict:
+    """
+    Writes the request and sidecar files for (invoice file, invoice path, purchase file, purchase path) pairs.
+
+    Returns:
+        dict: Number of written requests, pairs sent to the AI and locally settled pairs.
+    """
+    from chatgpt import fully_auto_batch_messages
+    waiting = []
+    counts = {"requests": 0, "ai_pairs": 0, "local_pairs": 0}
+    with open(requests_path, "w", encoding="utf-8") as requests_file, \
+            open(sidecar_path(requests_path), "w", encoding="utf-8") as sidecar:
+
+        def write_request(batch):
+            custom_id = f"request-{counts['requests']:06d}"
+            messages = fully_auto_batch_messages([(pair_id, invoice_text, purchase_text, extracted)
+                                                  for pair_id, _pair, (invoice_text, purchase_text, extracted) in batch])
+            requests_file.write(json.dumps({"custom_id": custom_id, "method": "POST", "url": "/v1/chat/completions",
+                                            "body": {"model": MODEL, "messages": messages, "temperature": 0.0}},
+                                           ensure_ascii=False) + "\n")
+            sidecar.write(json.dumps({"custom_id": custom_id, "pairs": [
+                {"pair_id": pair_id, "invoice_file": pair[0], "invoice_path": pair[1],
+                 "purchase_file": pair[2], "purchase_path": pair[3], "extracted": ai_input[2]}
+                for pair_id, pair, ai_input in batch]}, ensure_ascii=False) + "\n")
+            counts["requests"] += 1
+            counts["ai_pairs"] += len(batch)
+
+        for i, pair in enumerate(pairs):
+            result, ai_input = prepare_analysis(pair[1], pair[3], {}, lambda stage: None)
+            if result is not None:
+                sidecar.write(json.dumps({"custom_id": None, "pairs": [
+                    {"pair_id": str(i), "invoice_file": pair[0], "purchase_file": pair[2], "result": result}]},
+                    ensure_ascii=False) + "\n")
+                counts["local_pairs"] += 1
+                continue
+            waiting.append((str(i), pair, ai_input))
+            if len(waiting) == batch_size:
+                write_request(waiting)
+                waiting = []
+        if waiting:
+            write_request(waiting)
+    return counts
+
+
+def read_jsonl(path: str) -> list:
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def run(requests_path: str, output_path: str, workers: int = 8) -> dict:
+    """
+    Sends all requests without a successful response in output_path and appends their responses.
+
+    Returns:
+        dict: Number of successful and failed requests of this run.
+    """
+    from llm_client import create_chat_completion
+    done = {line["custom_id"] for line in read_jsonl(output_path)
+            if (line.get("response") or {}).get("status_code") == 200}
+    todo = [line for line in read_jsonl(requests_path) if line["custom_id"] not in done]
+    counts = {"succeeded": 0, "failed": 0}
+    lock = threading.Lock()
+
+    with open(output_path, "a", encoding="utf-8") as output:
+        def send(line):
+            try:
+                response = create_chat_completion(**line["body"])
+                record = {"custom_id": line["custom_id"],
+                          "response": {"status_code": 200, "body": response.model_dump()}, "error": None}
+            except Exception as e:
+                record = {"custom_id": line["custom_id"], "response": None,
+                          "error": {"message": f"{type(e).__name__}: {e}"}}
+            with lock:
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                output.flush()
+                counts["succeeded" if record["error"] is None else "failed"] += 1
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(send, todo))
+    return counts
+
+
+def collect(requests_path: str, output_path: str, log: ResultLog, run_id: str) -> dict:
+    """
+    Demultiplexes the responses and appends one fully automated result entry per pair to the result log of run_id.
+    Pairs already in the log are skipped. Pairs without a result in the responses are analyzed one by one;
+    pairs whose analysis fails are not logged and are retried by the next collect.
+
+    Returns:
+        dict: Number of logged (of which analyzed one by one), already logged and failed pairs.
+    """
+    from chatgpt import get_fully_auto_result, parse_fully_auto_batch
+    contents = {}
+    for line in read_jsonl(output_path):
+        response = line.get("response") or {}
+        if response.get("status_code") == 200:
+            contents[line["custom_id"]] = response["body"]["choices"][0]["message"]["content"]
+
+    completed = {entry.get("invoice_file") for entry in log.read(run_id, "fully_automated")}
+    counts = {"logged": 0, "analyzed_one_by_one": 0, "already_logged": 0, "failed": 0}
+    for request in read_jsonl(sidecar_path(requests_path)):
+        pairs = [pair for pair in request["pairs"] if pair["invoice_file"] not in completed]
+        counts["already_logged"] += len(request["pairs"]) - len(pairs)
+        if not pairs:
+            continue
+        if request["custom_id"] is None:
+            results = {pair["pair_id"]: pair["result"] for pair in pairs}
+        else:
+            results = parse_fully_auto_batch(contents.get(request["custom_id"], ""), [
+                (pair["pair_id"], "", "", tuple(pair["extracted"]) if pair["extracted"] else None) for pair in pairs])
+        for pair in pairs:
+            result = results.get(pair["pair_id"])
+            if result is None:
+                try:
+                    result, _timings = run_analysis(get_fully_auto_result, pair["invoice_path"], pair["purchase_path"])
+                except Exception as e:
+                    print(f"{pair['invoice_file']}: {type(e).__name__}: {e}")
+                    counts["failed"] += 1
+                    continue
+                counts["analyzed_one_by_one"] += 1
+            entry = fully_automated_entry(result, pair["invoice_file"], pair["purchase_file"], None)
+            log.append(run_id, "fully_automated", entry)
+            completed.add(pair["invoice_file"])
+            counts["logged"] += 1
+    log.flush()
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prepares, runs and collects batched AI requests as JSONL files.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    prepare_parser = subparsers.add_parser("prepare", help="write the request file for the dataset pairs")
+    prepare_parser.add_argument("requests", help="request file to write")
+    prepare_parser.add_argument("--pool", choices=["all", "modified", "matching"], default="all")
+    prepare_parser.add_argument("--batch-size", type=int, default=8, help="pairs per request")
+    prepare_parser.add_argument("--limit", type=int, default=None, help="only the first N pairs")
+    run_parser = subparsers.add_parser("run", help="send the requests of a request file")
+    run_parser.add_argument("requests")
+    run_parser.add_argument("output", help="output file (appended to)")
+    run_parser.add_argument("--workers", type=int, default=8, help="concurrent requests")
+    collect_parser = subparsers.add_parser("collect", help="log the results of an output file")
+    collect_parser.add_argument("requests")
+    collect_parser.add_argument("output")
+    collect_parser.add_argument("--results", default="bulk_results", help="result folder (default: bulk_results)")
+    collect_parser.add_argument("--run-id", default="batch", help="user ID the results are saved under")
+    args = parser.parse_args(argv)
+
+    start = time.time()
+    if args.command == "prepare":
+        from bulk_runner import dataset_pairs
+        pools = ["modified", "matching"] if args.pool == "all" else [args.pool]
+        counts = prepare(args.requests, dataset_pairs(pools)[:args.limit], args.batch_size)
+    elif args.command == "run":
+        counts = run(args.requests, args.output, args.workers)
+    else:
+        counts = collect(args.requests, args.output, ResultLog(args.results, RESULTS_FSYNC_INTERVAL), args.run_id)
+    print(", ".join(f"{count} {name.replace('_', ' ')}" for name, count in counts.items())
+          + f" in {time.time() - start:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+import json
+import hashlib
+import threading
+
+from config import LLM_CACHE_URL, LLM_CACHE_MEMORY_ENTRIES, LLM_CACHE_TTL
+from kvstore import MemoryStore, open_store
+
+# ---------------------------
+# LLM RESPONSE CACHE
+# ---------------------------
+
+
+class LLMCache:
+    """
+    Two-tier cache of LLM responses keyed on model, messages and request parameters.
+    - The in-process LRU tier answers repeated requests within a worker without any I/O.
+    - The persistent tier (SQLite or Redis, see kvstore.py) is shared by all workers.
+    Hits and misses are counted per tier.
+    """
+
+    def __init__(self, persistent=None, memory_entries: int = 512, ttl: float = None):
+        self.memory = MemoryStore(memory_entries)
+        self.persistent = persistent
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "persistent_hits": 0, "misses": 0, "stores": 0}
+
+    @staticmethod
+    def make_key(params: dict) -> str:
+        payload = json.dumps(params, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def get(self, key: str):
+        """
+        Returns the cached response text for key or None.
+        """
+        value = self.memory.get(key)
+        if value is not None:
+            self._count("memory_hits")
+            return value.decode("utf-8")
+        if self.persistent is not None:
+            try:
+                value = self.persistent.get(key)
+            except Exception as e:
+                print(f"LLM cache read failed: {e}")
+                value = None
+            if value is not None:
+                self.memory.set(key, value, self.ttl)
+                self._count("persistent_hits")
+                return value.decode("utf-8")
+        self._count("misses")
+        return None
+
+    def set(self, key: str, content: str):
+        value = content.encode("utf-8")
+        self.memory.set(key, value, self.ttl)
+        if self.persistent is not None:
+            try:
+                self.persistent.set(key, value, self.ttl)
+            except Exception as e:
+                print(f"LLM cache write failed: {e}")
+        self._count("stores")
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["memory_hits"] + stats["persistent_hits"] + stats["misses"]
+        stats["hit_rate"] = round((lookups - stats["misses"]) / lookups, 3) if lookups else 0.0
+        return stats
+
+
+llm_cache = LLMCache(open_store(LLM_CACHE_URL), LLM_CACHE_MEMORY_ENTRIES, LLM_CACHE_TTL)
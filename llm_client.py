@@ -0,0 +1,148 @@
+import os
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import httpx
+import openai
+
+from config import (LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT, LLM_DEADLINE, LLM_MAX_RETRIES, LLM_BACKOFF_BASE,
+                    LLM_BACKOFF_MAX, LLM_POOL_SIZE, LLM_HEDGE, LLM_HEDGE_MIN_DELAY)
+
+# ---------------------------
+# SHARED CLIENT
+# ---------------------------
+# Errors worth another attempt: network problems, timeouts, rate limits and 5xx responses
+RETRYABLE_ERRORS = (openai.APIConnectionError, openai.APITimeoutError, openai.RateLimitError,
+                    openai.InternalServerError)
+
+_client = None
+_client_lock = threading.Lock()
+_hedge_executor = ThreadPoolExecutor(max_workers=LLM_POOL_SIZE, thread_name_prefix="llm")
+
+
+def get_client():
+    """
+    Returns the process-wide OpenAI client.
+    It keeps up to LLM_POOL_SIZE keep-alive connections and has explicit connect and read timeouts.
+    The SDK's own retries are disabled; create_chat_completion retries instead.
+    OPENAI_BASE_URL can point it at a local stand-in server (see fake_openai.py).
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            timeout = httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT)
+            http_client = httpx.Client(
+                timeout=timeout,
+                limits=httpx.Limits(max_connections=LLM_POOL_SIZE, max_keepalive_connections=LLM_POOL_SIZE,
+                                    keepalive_expiry=60)
+            )
+            _client = openai.OpenAI(
+                api_key=openai.api_key or os.getenv("OPENAI_API_KEY"),
+                base_url=os.getenv("OPENAI_BASE_URL") or None,
+                timeout=timeout,
+                max_retries=0,
+                http_client=http_client
+            )
+        return _client
+
+
+# ---------------------------
+# LATENCY TRACKING AND HEDGING
+# ---------------------------
+class LatencyTracker:
+    """
+    Keeps the latencies of recent successful requests and derives the hedging delay from them.
+    """
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float):
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            samples = sorted(self._samples)
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def hedge_delay(self):
+        """
+        Returns how long to wait before sending a backup request, or None while there is too little data.
+        """
+        p95 = self.percentile(0.95)
+        return None if p95 is None else max(LLM_HEDGE_MIN_DELAY, p95)
+
+
+latency = LatencyTracker()
+
+
+def _send(params: dict, timeout: float):
+    start = time.monotonic()
+    response = get_client().chat.completions.create(timeout=timeout, **params)
+    latency.add(time.monotonic() - start)
+    return response
+
+
+def _hedged_send(params: dict, timeout: float):
+    """
+    Sends the request and, if it is still running after the hedging delay, a second identical one.
+    Returns whichever response arrives first; raises only if both fail.
+    """
+    delay = latency.hedge_delay() if LLM_HEDGE else None
+    if delay is None or delay >= timeout:
+        return _send(params, timeout)
+
+    primary = _hedge_executor.submit(_send, params, timeout)
+    done, _ = wait([primary], timeout=delay)
+    if done:
+        return primary.result()
+    backup = _hedge_executor.submit(_send, params, max(timeout - delay, 0.1))
+    pending = {primary, backup}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = future.exception()
+    raise error
+
+
+def backoff_delay(attempt: int) -> float:
+    """
+    Exponential backoff with full jitter: a random delay between 0 and base * 2^attempt, capped.
+    """
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)))
+
+
+def create_chat_completion(**params):
+    """
+    Sends a chat completion request through the shared client.
+    - Retryable errors are retried up to LLM_MAX_RETRIES times with jittered exponential backoff.
+    - All attempts together must finish within LLM_DEADLINE seconds.
+    - Slow requests are hedged once enough latencies have been observed.
+
+    Returns:
+        The OpenAI chat completion response.
+    """
+    deadline = time.monotonic() + LLM_DEADLINE
+    attempt = 0
+    while True:
+        remaining = deadline - time.monotonic()
+        try:
+            return _hedged_send(params, min(LLM_READ_TIMEOUT, remaining))
+        except RETRYABLE_ERRORS as e:
+            delay = backoff_delay(attempt)
+            attempt += 1
+            if attempt > LLM_MAX_RETRIES or time.monotonic() + delay >= deadline:
+                raise
+            print(f"LLM request failed ({type(e).__name__}), retry {attempt} in {delay:.2f}s")
+            time.sleep(delay)
@@ -0,0 +1,231 @@
+import os
+import sys
+import time
+import hashlib
+import sqlite3
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from config import INVOICE_FOLDER, MODIFIED_INVOICE_FOLDER, PURCHASE_FOLDER, DATASET_MANIFEST
+from extraction import file_digest
+
+# ---------------------------
+# DATASET MANIFEST
+# ---------------------------
+# Persistent SQLite index of all dataset documents: name, kind, number, path, size, page count and
+# content hash. With a manifest (DATASET_MANIFEST), pairs are read from it and paths are resolved
+# through it, so the dataset folders are never listed by the web app and may be sharded:
+#   dataset/invoices/3f/a2/invoice_1234.pdf
+# The shard of a file is derived from the SHA-1 of its name (see shard_path).
+# Build or update the manifest with "python manifest.py build", shard flat folders with "python manifest.py shard".
+DOCUMENT_KINDS = {
+    "invoice": (INVOICE_FOLDER, "invoice_"),
+    "modified": (MODIFIED_INVOICE_FOLDER, "modified_invoice_"),
+    "purchase": (PURCHASE_FOLDER, "purchase_orders_")
+}
+SHARD_LEVELS = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    name TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    number TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    pages INTEGER,
+    sha256 TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS documents_kind_number ON documents (kind, number);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+"""
+
+UPSERT = """INSERT OR REPLACE INTO documents (name, kind, number, path, size, mtime_ns, pages, sha256)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)"""
+
+PAIRS = """SELECT d.number FROM documents d
+           JOIN documents p ON p.kind = 'purchase' AND p.number = d.number
+           WHERE d.kind = ? ORDER BY d.number"""
+
+
+def shard_path(folder: str, name: str) -> str:
+    """
+    Returns the sharded path of a document, e.g. folder/3f/a2/name.
+    """
+    digest = hashlib.sha1(name.encode("utf-8")).hexdigest()
+    shards = [digest[2 * level:2 * level + 2] for level in range(SHARD_LEVELS)]
+    return os.path.join(folder, *shards, name)
+
+
+def iter_documents(folder: str, prefix: str):
+    """
+    Yields (name, number, path) of all "<prefix>XXXX.pdf" files in folder, flat or sharded.
+    """
+    for root, dirs, files in os.walk(folder):
+        dirs.sort()
+        for name in files:
+            if name.startswith(prefix) and name.endswith(".pdf"):
+                yield name, name[len(prefix):-4], os.path.join(root, name)
+
+
+class Manifest:
+    """
+    Read and write access to a manifest file; connections are per thread.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._setup_lock = threading.Lock()
+        self._ready = False
+
+    def _conn(self):
+        """
+        Returns this thread's connection; the file and its schema are created on first use.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            with self._setup_lock:
+                folder = os.path.dirname(self.path)
+                if not self._ready and folder:
+                    os.makedirs(folder, exist_ok=True)
+                conn = sqlite3.connect(self.path, timeout=30)
+                conn.execute("PRAGMA journal_mode=WAL")
+                if not self._ready:
+                    conn.executescript(SCHEMA)
+                    self._ready = True
+            self._local.conn = conn
+        return conn
+
+    def generation(self) -> int:
+        """
+        Returns a counter that is incremented by every build, to detect changes of the manifest.
+        """
+        row = self._conn().execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+        return row[0] if row else 0
+
+    def path_of(self, name: str):
+        """
+        Returns the path of the document with the given file name, or None if it is not in the manifest.
+        """
+        row = self._conn().execute("SELECT path FROM documents WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def document(self, name: str):
+        row = self._conn().execute("SELECT name, kind, number, path, size, pages, sha256 FROM documents "
+                                   "WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("name", "kind", "number", "path", "size", "pages", "sha256"), row))
+
+    def pairs(self, kind: str) -> tuple:
+        """
+        Returns the sorted numbers that have a document of kind ("invoice" or "modified") and a purchase order.
+        """
+        return tuple(row[0] for row in self._conn().execute(PAIRS, (kind,)))
+
+    def counts(self) -> dict:
+        return dict(self._conn().execute("SELECT kind, COUNT(*) FROM documents GROUP BY kind"))
+
+
+dataset_manifest = Manifest(DATASET_MANIFEST) if DATASET_MANIFEST else None
+
+
+# ---------------------------
+# BUILD
+# ---------------------------
+def describe(path: str):
+    """
+    Returns (content hash, page count) of a PDF; the page count is None if the PDF cannot be opened.
+    """
+    import pdfplumber  # imported on first use, it is slow to import
+    try:
+        with pdfplumber.open(path) as pdf:
+            pages = len(pdf.pages)
+    except Exception as e:
+        print(f"Could not read the pages of {path}: {e}")
+        pages = None
+    return file_digest(path), pages
+
+
+def build_manifest(manifest: Manifest, kinds: dict = None, workers=None, chunksize: int = 64) -> dict:
+    """
+    Brings the manifest in line with the dataset folders: new and changed files (by size and mtime)
+    are hashed and counted across a process pool, moved files (e.g. by shard_folder) get their new path
+    and removed files are dropped.
+
+    Returns:
+        dict: Number of added or updated, moved and removed documents.
+    """
+    kinds = kinds or DOCUMENT_KINDS
+    conn = manifest._conn()
+    known = {name: (path, size, mtime_ns) for name, path, size, mtime_ns in conn.execute(
+        "SELECT name, path, size, mtime_ns FROM documents")}
+    seen = set()
+    changed = []
+    moved = []
+    for kind, (folder, prefix) in kinds.items():
+        for name, number, path in iter_documents(folder, prefix):
+            st = os.stat(path)
+            seen.add(name)
+            stored = known.get(name)
+            if stored is None or stored[1:] != (st.st_size, st.st_mtime_ns):
+                changed.append((name, kind, number, path, st.st_size, st.st_mtime_ns))
+            elif stored[0] != path:
+                moved.append((path, name))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        described = pool.map(describe, [entry[3] for entry in changed], chunksize=chunksize)
+        rows = [entry + (pages, digest) for entry, (digest, pages) in zip(changed, described)]
+    removed = [(name,) for name in known if name not in seen]
+    with conn:
+        conn.executemany(UPSERT, rows)
+        conn.executemany("UPDATE documents SET path = ? WHERE name = ?", moved)
+        conn.executemany("DELETE FROM documents WHERE name = ?", removed)
+        conn.execute("INSERT INTO meta (key, value) VALUES ('generation', 1) "
+                     "ON CONFLICT (key) DO UPDATE SET value = value + 1")
+    return {"updated": len(rows), "moved": len(moved), "removed": len(removed)}
+
+
+def shard_folder(folder: str, prefix: str) -> int:
+    """
+    Moves the flat "<prefix>XXXX.pdf" files of folder into their shards. Returns the number of moved files.
+    """
+    moved = 0
+    with os.scandir(folder) as entries:
+        names = [entry.name for entry in entries
+                 if entry.is_file() and entry.name.startswith(prefix) and entry.name.endswith(".pdf")]
+    for name in names:
+        target = shard_path(folder, name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(os.path.join(folder, name), target)
+        moved += 1
+    return moved
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Builds the dataset manifest or shards the dataset folders.")
+    parser.add_argument("command", choices=["build", "shard", "stats"],
+                        help="build: add new and changed documents to the manifest; "
+                             "shard: move flat folders into shards, then build; stats: show document counts")
+    parser.add_argument("--manifest", default=DATASET_MANIFEST or os.path.join("cache", "manifest.sqlite3"),
+                        help="manifest file")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    manifest = Manifest(args.manifest)
+    if args.command == "shard":
+        for folder, prefix in DOCUMENT_KINDS.values():
+            print(f"Moved {shard_folder(folder, prefix)} files of {folder} into shards")
+    if args.command in ("build", "shard"):
+        start = time.time()
+        result = build_manifest(manifest, workers=args.workers)
+        print(f"Updated {result['updated']}, moved {result['moved']} and removed {result['removed']} documents "
+              f"in {args.manifest} in {time.time() - start:.1f}s")
+    print(manifest.counts())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,264 @@
+import os
+import sys
+import math
+import time
+import sqlite3
+import argparse
+import threading
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from config import MATCHING_INDEX_PATH, MATCHING_MAX_POSTINGS
+from extraction import file_digest
+from layout_extractor import extract_fields
+from manifest import DOCUMENT_KINDS, dataset_manifest, iter_documents
+from rules_engine import normalize_text
+
+# ---------------------------
+# INVOICE TO PURCHASE ORDER MATCHING
+# ---------------------------
+# Inverted index from keys of the extracted purchase order fields to the purchase orders containing them.
+# A new invoice is matched by looking up its own keys, so only purchase orders sharing at least one
+# key are scored, instead of comparing the invoice with every purchase order.
+# Keys and their weights (scaled by how rare the key is, see MatchingIndex.match):
+# - "order:<id>"      the order ID
+# - "digits:<sorted>" the digits of the order ID, so transposed digits (10265 vs. 10625) still match
+# - "date:<date>"     the order date
+# - "name:<name>"     the customer / contact name, and "token:<word>" each word of it, for typos
+# - "items:<ids>"     the sorted product IDs, and "product:<id>" each product ID
+# Keys found in more than max_postings purchase orders (e.g. popular products) are skipped at query time,
+# which bounds the work per invoice.
+KEY_WEIGHTS = {"order": 5.0, "digits": 2.0, "date": 1.0, "name": 3.0, "token": 1.0, "items": 3.0, "product": 0.5}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS purchase_orders (
+    name TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    order_id TEXT,
+    customer_name TEXT
+);
+CREATE TABLE IF NOT EXISTS postings (
+    key TEXT NOT NULL,
+    name TEXT NOT NULL,
+    PRIMARY KEY (key, name)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_name ON postings (name);
+"""
+
+
+def index_keys(fields: dict, name_field: str) -> set:
+    """
+    Returns the index keys of extracted invoice (name_field "contact_name") or purchase order
+    (name_field "customer_name") fields.
+    """
+    keys = set()
+    order_id = normalize_text(fields.get("order_id"))
+    if order_id:
+        keys.add(f"order:{order_id}")
+        keys.add(f"digits:{''.join(sorted(order_id))}")
+    order_date = normalize_text(fields.get("order_date"))
+    if order_date:
+        keys.add(f"date:{order_date}")
+    name = normalize_text(fields.get(name_field))
+    if name:
+        keys.add(f"name:{name}")
+        keys.update(f"token:{token}" for token in name.split() if len(token) >= 3)
+    product_ids = sorted({normalize_text(item.get("product_id")) for item in fields.get("items") or []
+                          if isinstance(item, dict) and item.get("product_id")})
+    if product_ids:
+        keys.add(f"items:{','.join(product_ids)}")
+        keys.update(f"product:{product_id}" for product_id in product_ids)
+    return keys
+
+
+class MatchingIndex:
+    """
+    SQLite-backed inverted index of purchase orders; connections are per thread.
+    """
+
+    def __init__(self, path: str, max_postings: int = 1000):
+        self.path = path
+        self.max_postings = max_postings
+        self._local = threading.local()
+        self._setup_lock = threading.Lock()
+        self._ready = False
+
+    def _conn(self):
+        """
+        Returns this thread's connection; the file and its schema are created on first use.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            with self._setup_lock:
+                folder = os.path.dirname(self.path)
+                if not self._ready and folder:
+                    os.makedirs(folder, exist_ok=True)
+                conn = sqlite3.connect(self.path, timeout=30)
+                conn.execute("PRAGMA journal_mode=WAL")
+                if not self._ready:
+                    conn.executescript(SCHEMA)
+                    self._ready = True
+            self._local.conn = conn
+        return conn
+
+    def indexed(self) -> dict:
+        """
+        Returns {name: sha256} of all indexed purchase orders.
+        """
+        return dict(self._conn().execute("SELECT name, sha256 FROM purchase_orders"))
+
+    def add_purchase_orders(self, documents: list):
+        """
+        Adds or replaces purchase orders, given as (name, path, sha256, extracted fields) tuples, in one transaction.
+        """
+        conn = self._conn()
+        with conn:
+            for name, path, sha256, fields in documents:
+                conn.execute("DELETE FROM postings WHERE name = ?", (name,))
+                conn.execute("INSERT OR REPLACE INTO purchase_orders (name, path, sha256, order_id, customer_name) "
+                             "VALUES (?, ?, ?, ?, ?)",
+                             (name, path, sha256, fields.get("order_id"), fields.get("customer_name")))
+                conn.executemany("INSERT OR IGNORE INTO postings (key, name) VALUES (?, ?)",
+                                 [(key, name) for key in index_keys(fields, "customer_name")])
+
+    def remove_purchase_orders(self, names: list):
+        conn = self._conn()
+        with conn:
+            conn.executemany("DELETE FROM postings WHERE name = ?", [(name,) for name in names])
+            conn.executemany("DELETE FROM purchase_orders WHERE name = ?", [(name,) for name in names])
+
+    def match(self, invoice_fields: dict, limit: int = 5) -> list:
+        """
+        Ranks the purchase orders sharing keys with the extracted invoice fields.
+        Each shared key adds its weight times log(1 + N / postings), so rare keys count more.
+        The coverage of a match is the share of the invoice's key weights it matched, between 0 and 1;
+        unlike the score it does not depend on the size of the index.
+
+        Returns:
+            list: Up to limit dicts with "name", "path", "order_id", "customer_name", "score", "coverage"
+                  and "keys" (the shared keys), best match first.
+        """
+        conn = self._conn()
+        total = conn.execute("SELECT COUNT(*) FROM purchase_orders").fetchone()[0]
+        scores = defaultdict(float)
+        shared = defaultdict(list)
+        keys = index_keys(invoice_fields, "contact_name")
+        total_weight = sum(KEY_WEIGHTS[key.split(":", 1)[0]] for key in keys)
+        for key in sorted(keys):
+            names = [row[0] for row in conn.execute("SELECT name FROM postings WHERE key = ? LIMIT ?",
+                                                    (key, self.max_postings + 1))]
+            if not names or len(names) > self.max_postings:
+                continue
+            score = KEY_WEIGHTS[key.split(":", 1)[0]] * math.log(1 + total / len(names))
+            for name in names:
+                scores[name] += score
+                shared[name].append(key)
+
+        ranked = sorted(scores.items(), key=lambda entry: (-entry[1], entry[0]))[:limit]
+        matches = []
+        for name, score in ranked:
+            path, order_id, customer_name = conn.execute(
+                "SELECT path, order_id, customer_name FROM purchase_orders WHERE name = ?", (name,)).fetchone()
+            matches.append({"name": name, "path": path, "order_id": order_id, "customer_name": customer_name,
+                            "score": round(score, 3),
+                            "coverage": round(sum(KEY_WEIGHTS[key.split(":", 1)[0]] for key in shared[name])
+                                              / total_weight, 3),
+                            "keys": shared[name]})
+        return matches
+
+    def match_pdf(self, invoice_path: str, limit: int = 5) -> list:
+        """
+        Extracts the fields of an invoice PDF and ranks the matching purchase orders (see match).
+        """
+        fields, _confidence = extract_fields(invoice_path, "invoice")
+        return self.match(fields, limit)
+
+
+matching_index = MatchingIndex(MATCHING_INDEX_PATH, MATCHING_MAX_POSTINGS)
+
+
+# ---------------------------
+# BUILD
+# ---------------------------
+def purchase_order_paths() -> dict:
+    """
+    Returns {name: path} of all dataset purchase orders, from the dataset manifest if there is one.
+    """
+    if dataset_manifest is not None:
+        conn = dataset_manifest._conn()
+        return dict(conn.execute("SELECT name, path FROM documents WHERE kind = 'purchase'"))
+    folder, prefix = DOCUMENT_KINDS["purchase"]
+    return {name: path for name, _number, path in iter_documents(folder, prefix)}
+
+
+def _extract_purchase(path: str):
+    return file_digest(path), extract_fields(path, "purchase")[0]
+
+
+def build_index(index: MatchingIndex, paths: dict, workers=None, chunksize: int = 32) -> dict:
+    """
+    Indexes new and changed purchase orders (by content hash) across a process pool
+    and drops the ones that no longer exist.
+
+    Returns:
+        dict: Number of indexed and removed purchase orders.
+    """
+    indexed = index.indexed()
+    candidates = [(name, path) for name, path in paths.items()
+                  if indexed.get(name) != file_digest(path)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        extracted = pool.map(_extract_purchase, [path for _name, path in candidates], chunksize=chunksize)
+        documents = [(name, path, digest, fields) for (name, path), (digest, fields) in zip(candidates, extracted)]
+    for start in range(0, len(documents), 1000):
+        index.add_purchase_orders(documents[start:start + 1000])
+    removed = [name for name in indexed if name not in paths]
+    index.remove_purchase_orders(removed)
+    return {"indexed": len(documents), "removed": len(removed)}
+
+
+def evaluate(index: MatchingIndex, kind: str = "modified") -> dict:
+    """
+    Matches every dataset invoice of kind ("invoice" or "modified") and counts how often the purchase order
+    with the same number is ranked first.
+    """
+    folder, prefix = DOCUMENT_KINDS[kind]
+    correct = total = 0
+    for _name, number, path in iter_documents(folder, prefix):
+        matches = index.match_pdf(path, limit=1)
+        total += 1
+        correct += bool(matches) and matches[0]["name"] == f"purchase_orders_{number}.pdf"
+    return {"invoices": total, "top1_correct": correct}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Builds the purchase order matching index or matches invoices.")
+    parser.add_argument("command", choices=["build", "match", "evaluate"],
+                        help="build: index all purchase orders; match: rank purchase orders for the given invoices; "
+                             "evaluate: check the top match of all dataset invoices")
+    parser.add_argument("invoices", nargs="*", help="invoice PDFs to match")
+    parser.add_argument("--index", default=MATCHING_INDEX_PATH, help="index file")
+    parser.add_argument("--limit", type=int, default=5, help="number of candidates to show")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    index = MatchingIndex(args.index, MATCHING_MAX_POSTINGS)
+    if args.command == "build":
+        start = time.time()
+        result = build_index(index, purchase_order_paths(), workers=args.workers)
+        print(f"Indexed {result['indexed']} and removed {result['removed']} purchase orders "
+              f"in {args.index} in {time.time() - start:.1f}s")
+    elif args.command == "match":
+        for invoice in args.invoices:
+            print(invoice)
+            for match in index.match_pdf(invoice, args.limit):
+                print(f"  {match['score']:8.3f}  {match['coverage']:.2f}  {match['name']}  ({', '.join(match['keys'])})")
+    else:
+        for kind in ("invoice", "modified"):
+            result = evaluate(index, kind)
+            print(f"{kind}: {result['top1_correct']} of {result['invoices']} invoices matched correctly")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
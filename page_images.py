@@ -0,0 +1,137 @@
+import io
+import sys
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from config import (INVOICE_FOLDER, MODIFIED_INVOICE_FOLDER, PURCHASE_FOLDER, PAGE_IMAGE_CACHE_FOLDER,
+                    PAGE_IMAGE_CACHE_MAX_BYTES, PAGE_IMAGE_FORMAT, PAGE_IMAGE_RESOLUTION, THUMBNAIL_WIDTH)
+from extraction import DiskCache, file_digest
+from corpus import collect_pdfs
+
+# ---------------------------
+# PAGE IMAGES
+# ---------------------------
+# Renders PDF pages to compressed images and thumbnails with pdfplumber, so the review pages
+# can show plain images instead of making every browser parse and render the PDFs.
+# Bump whenever the rendering changes so old cache entries are ignored
+RENDER_VERSION = "render-1"
+
+MIMETYPES = {"webp": "image/webp", "png": "image/png"}
+
+page_image_cache = DiskCache(PAGE_IMAGE_CACHE_FOLDER, PAGE_IMAGE_CACHE_MAX_BYTES)
+
+
+def _key(digest: str, name: str) -> str:
+    settings = f"{RENDER_VERSION}:{PAGE_IMAGE_FORMAT}:{PAGE_IMAGE_RESOLUTION}:{THUMBNAIL_WIDTH}"
+    return hashlib.sha256(f"{digest}:{settings}:{name}".encode("ascii")).hexdigest()
+
+
+def _encode(image) -> bytes:
+    """
+    Encodes a page image losslessly; the documents are mostly flat text, which compresses very well.
+    """
+    buffer = io.BytesIO()
+    if PAGE_IMAGE_FORMAT == "webp":
+        image.save(buffer, "WEBP", lossless=True, method=4)
+    else:
+        image.convert("P", palette=1, colors=64).save(buffer, "PNG", optimize=True)
+    return buffer.getvalue()
+
+
+def render_pdf(pdf_path: str) -> list:
+    """
+    Renders every page of a PDF.
+
+    Returns:
+        list: One (page image bytes, thumbnail bytes) tuple per page.
+    """
+    import pdfplumber  # imported on first use, it is slow to import
+    pages = []
+    with pdfplumber.open(pdf_path) as pdf:
+        for page in pdf.pages:
+            image = page.to_image(resolution=PAGE_IMAGE_RESOLUTION).original
+            thumbnail = image.copy()
+            thumbnail.thumbnail((THUMBNAIL_WIDTH, THUMBNAIL_WIDTH * 4))
+            pages.append((_encode(image), _encode(thumbnail)))
+    return pages
+
+
+def store_rendered(digest: str, pages: list):
+    for number, (image, thumbnail) in enumerate(pages, start=1):
+        page_image_cache.set(_key(digest, f"page-{number}"), image)
+        page_image_cache.set(_key(digest, f"thumb-{number}"), thumbnail)
+    page_image_cache.set(_key(digest, "meta"), json.dumps({"pages": len(pages)}).encode("utf-8"))
+
+
+def page_count(pdf_path: str) -> int:
+    """
+    Returns the number of pages of a PDF, rendering and caching its pages first if necessary.
+    """
+    digest = file_digest(pdf_path)
+    meta = page_image_cache.get(_key(digest, "meta"))
+    if meta is None:
+        pages = render_pdf(pdf_path)
+        store_rendered(digest, pages)
+        return len(pages)
+    return json.loads(meta)["pages"]
+
+
+def get_page_image(pdf_path: str, number: int, thumbnail: bool = False):
+    """
+    Returns the encoded image (or thumbnail) of a 1-based page, or None if the page does not exist.
+    """
+    digest = file_digest(pdf_path)
+    key = _key(digest, f"{'thumb' if thumbnail else 'page'}-{number}")
+    data = page_image_cache.get(key)
+    if data is None and 1 <= number <= page_count(pdf_path):
+        data = page_image_cache.get(key)
+        if data is None:
+            # The meta entry outlived the images in the cache
+            pages = render_pdf(pdf_path)
+            store_rendered(digest, pages)
+            data = pages[number - 1][1 if thumbnail else 0]
+    return data
+
+
+def mimetype() -> str:
+    return MIMETYPES.get(PAGE_IMAGE_FORMAT, "image/png")
+
+
+# ---------------------------
+# PRE-RENDER
+# ---------------------------
+def _render_one(pdf_path: str):
+    return file_digest(pdf_path), render_pdf(pdf_path)
+
+
+def prerender(folders, workers=None, chunksize: int = 8) -> int:
+    """
+    Renders every not yet cached PDF in folders across a process pool.
+    Returns the number of rendered documents.
+    """
+    pdfs = collect_pdfs(folders)
+    missing = [path for digest, path in pdfs.items() if page_image_cache.get(_key(digest, "meta")) is None]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for digest, pages in pool.map(_render_one, missing, chunksize=chunksize):
+            store_rendered(digest, pages)
+    return len(missing)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-render the pages of all dataset PDFs into the page image cache.")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: CPU count)")
+    parser.add_argument("folders", nargs="*", default=[INVOICE_FOLDER, MODIFIED_INVOICE_FOLDER, PURCHASE_FOLDER],
+                        help="folders to scan (default: the dataset folders)")
+    args = parser.parse_args(argv)
+
+    start = time.time()
+    count = prerender(args.folders, workers=args.workers)
+    print(f"Rendered {count} documents into {PAGE_IMAGE_CACHE_FOLDER} in {time.time() - start:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
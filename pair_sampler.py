@@ -0,0 +1,75 @@
+import math
+import random
+from functools import lru_cache
+
+from dataset_index import dataset_index
+
+# ---------------------------
+# PAIR SAMPLER
+# ---------------------------
+# Draws each participant's pairs without replacement in O(1), keeping only a few integers per participant.
+# Every participant walks both pools ("modified" and "matching", see dataset_index.py) in their own
+# pseudo-random order: position i of a pool of n numbers maps to number (a * i + b) mod n, with a and b
+# derived from the participant's seed and a coprime to n. Positions below the pool's cursor are used.
+# A number occurring in both pools counts as used once it was drawn from either of them; the inverse
+# mapping checks that in O(1).
+# The state is {"seed": int, "cursors": {"modified": int, "matching": int}}.
+# If the number of pairs in a pool changes, the pool's order changes too, so pairs may repeat.
+POOLS = ("modified", "matching")
+
+
+def new_state() -> dict:
+    return {"seed": random.getrandbits(32), "cursors": {pool: 0 for pool in POOLS}}
+
+
+@lru_cache(maxsize=4096)
+def permutation(seed: int, pool: str, n: int) -> tuple:
+    """
+    Returns (a, b, inverse of a mod n) of the participant's order of a pool of n numbers.
+    """
+    rng = random.Random(f"{seed}:{pool}:{n}")
+    a = rng.randrange(1, n) if n > 1 else 1
+    while math.gcd(a, n) != 1:
+        a = rng.randrange(1, n)
+    return a, rng.randrange(n), pow(a, -1, n) if n > 1 else 0
+
+
+def is_used(state: dict, number: str, skip_pool: str = None) -> bool:
+    """
+    Returns whether number was already drawn from any pool (other than skip_pool).
+    """
+    for pool in POOLS:
+        if pool == skip_pool:
+            continue
+        numbers, positions = dataset_index.pool(pool)
+        index = positions.get(number)
+        if index is None:
+            continue
+        a, b, a_inverse = permutation(state["seed"], pool, len(numbers))
+        if (index - b) * a_inverse % len(numbers) < state["cursors"][pool]:
+            return True
+    return False
+
+
+def peek(state: dict, pool: str):
+    """
+    Returns (number, position) of the participant's next unused pair in pool without drawing it,
+    or None if the pool is exhausted.
+    """
+    numbers, _ = dataset_index.pool(pool)
+    n = len(numbers)
+    if not n:
+        return None
+    a, b, _ = permutation(state["seed"], pool, n)
+    for position in range(state["cursors"][pool], n):
+        number = numbers[(a * position + b) % n]
+        if not is_used(state, number, skip_pool=pool):
+            return number, position
+    return None
+
+
+def take(state: dict, pool: str, position: int):
+    """
+    Marks the pair at position of pool, and all skipped positions before it, as used.
+    """
+    state["cursors"][pool] = max(state["cursors"][pool], position + 1)
@@ -0,0 +1,163 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import LOCAL_ANALYSIS, EXTRACTION_WORKERS
+from extraction import get_pdf_text
+from layout_extractor import extract_fields, is_confident
+from rules_engine import analyze_pair
+
+# ---------------------------
+# SHARED EXECUTOR
+# ---------------------------
+# One bounded pool per worker process, shared by all requests.
+# Cache and corpus hits are plain file reads, so threads overlap them well;
+# misses still parse with pdfplumber, which at least overlaps its file I/O.
+executor = ThreadPoolExecutor(max_workers=EXTRACTION_WORKERS, thread_name_prefix="extract")
+
+
+def _timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, round((time.perf_counter() - start) * 1000, 1)
+
+
+def extract_pair(invoice_path: str, purchase_path: str, timings: dict = None):
+    """
+    Extracts the invoice and purchase order texts in parallel.
+    Per-document durations (ms) are stored in timings if given.
+    """
+    invoice_future = executor.submit(_timed, get_pdf_text, invoice_path)
+    purchase_future = executor.submit(_timed, get_pdf_text, purchase_path)
+    invoice_text, invoice_ms = invoice_future.result()
+    purchase_text, purchase_ms = purchase_future.result()
+    if timings is not None:
+        timings["extract_invoice_ms"] = invoice_ms
+        timings["extract_purchase_ms"] = purchase_ms
+    return invoice_text, purchase_text
+
+
+def extract_fields_pair(invoice_path: str, purchase_path: str):
+    """
+    Extracts the invoice and purchase order fields from the PDF layout in parallel.
+
+    Returns:
+        tuple: ((invoice fields, confidence), (purchase fields, confidence))
+    """
+    invoice_future = executor.submit(extract_fields, invoice_path, "invoice")
+    purchase_future = executor.submit(extract_fields, purchase_path, "purchase")
+    return invoice_future.result(), purchase_future.result()
+
+
+def run_analysis(analyze, invoice_path: str, purchase_path: str, progress=None):
+    """
+    Runs one of the chatgpt.py analysis functions on a document pair.
+    - If the layout extractor is confident about both documents, the rules engine computes
+      the result locally. Only ambiguous pairs are sent to the AI, which then receives the
+      extracted fields and does not have to read the PDF texts.
+    - Otherwise both texts are extracted concurrently and analyze(invoice_text, purchase_text)
+      is called as soon as both are ready.
+    If given, progress(stage) is called with "extracting", "checking" and "calling_ai" as the
+    analysis moves on (see jobs.py).
+
+    Returns:
+        tuple: (analysis result, dict of stage timings in milliseconds)
+    """
+    if progress is None:
+        progress = lambda stage: None
+    timings = {}
+    start = time.perf_counter()
+    result, ai_input = prepare_analysis(invoice_path, purchase_path, timings, progress)
+    if result is None:
+        invoice_text, purchase_text, extracted = ai_input
+        progress("calling_ai")
+        if extracted:
+            result, timings["ai_ms"] = _timed(analyze, "", "", extracted=extracted)
+        else:
+            result, timings["ai_ms"] = _timed(analyze, invoice_text, purchase_text)
+    timings["total_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return result, timings
+
+
+def prepare_analysis(invoice_path: str, purchase_path: str, timings: dict, progress):
+    """
+    Does everything of run_analysis up to the AI call.
+
+    Returns:
+        tuple: (result, None) if the rules engine settled the pair, otherwise (None, ai_input) with
+               ai_input = (invoice text, purchase text, extracted) as the AI function expects them;
+               extracted is the (invoice fields, purchase fields) tuple if the layout extraction was confident.
+    """
+    start = time.perf_counter()
+    progress("extracting")
+    (invoice_fields, invoice_conf), (purchase_fields, purchase_conf) = extract_fields_pair(invoice_path, purchase_path)
+    timings["layout_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    timings["layout_confidence"] = min(invoice_conf, purchase_conf)
+
+    if is_confident(invoice_conf) and is_confident(purchase_conf):
+        if LOCAL_ANALYSIS:
+            progress("checking")
+            result, timings["rules_ms"] = _timed(analyze_pair, invoice_fields, purchase_fields)
+            if not result.pop("ambiguous"):
+                return result, None
+        return None, ("", "", (invoice_fields, purchase_fields))
+
+    extract_start = time.perf_counter()
+    invoice_text, purchase_text = extract_pair(invoice_path, purchase_path, timings)
+    timings["extract_ms"] = round((time.perf_counter() - extract_start) * 1000, 1)
+    return None, (invoice_text, purchase_text, None)
+
+
+def run_analyses_batched(analyze_batch, pairs: list, batch_size: int = 8) -> list:
+    """
+    run_analysis for many pairs: the pairs the rules engine cannot settle are sent to the AI
+    batch_size at a time with analyze_batch (e.g. get_fully_auto_results in chatgpt.py), which shares
+    one system prompt and one round trip among all pairs of a batch.
+
+    Parameters:
+        analyze_batch (callable): Takes (pair_id, invoice_text, purchase_text, extracted) tuples and
+                                  returns one result per tuple.
+        pairs (list): (invoice_path, purchase_path) tuples.
+
+    Returns:
+        list: One (analysis result, dict of stage timings) tuple per pair, in the order of pairs.
+    """
+    outcomes = [None] * len(pairs)
+    waiting = []
+    for i, (invoice_path, purchase_path) in enumerate(pairs):
+        timings = {}
+        start = time.perf_counter()
+        result, ai_input = prepare_analysis(invoice_path, purchase_path, timings, lambda stage: None)
+        if result is None:
+            waiting.append((i, ai_input, timings, start))
+        else:
+            timings["total_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            outcomes[i] = (result, timings)
+
+    for offset in range(0, len(waiting), batch_size):
+        batch = waiting[offset:offset + batch_size]
+        results, ai_ms = _timed(analyze_batch, [(str(i),) + ai_input for i, ai_input, _timings, _start in batch])
+        for (i, _ai_input, timings, start), result in zip(batch, results):
+            timings["ai_ms"] = ai_ms
+            timings["ai_batch_size"] = len(batch)
+            timings["total_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            outcomes[i] = (result, timings)
+    return outcomes
+
+
+def fully_automated_entry(ai_result: dict, invoice_file: str, purchase_file: str, duration: float) -> dict:
+    """
+    Builds the result entry the fully automated level saves for a pair (see save_result in app.py).
+    """
+    data_entry = {
+        "invoice_file": invoice_file,
+        "purchase_file": purchase_file,
+        "duration_seconds": duration,
+        "invoice_extracted": ai_result.get("invoice_extracted", {}),
+        "purchase_extracted": ai_result.get("purchase_extracted", {}),
+        "errors": ai_result.get("errors", []),
+        "booking": ai_result.get("booking", "decline")
+    }
+    corrected_invoice = ai_result.get("invoice_corrected", {})
+    if corrected_invoice:
+        data_entry["invoice_corrected"] = corrected_invoice
+    return data_entry
@@ -0,0 +1,219 @@
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import sqlite3
+import argparse
+import threading
+
+from config import RESULTS_FOLDER, RESULTS_DB_PATH
+from results_log import ResultLog
+
+# ---------------------------
+# RESULTS DATABASE
+# ---------------------------
+# Optional copy of all results in one SQLite file, for queries across participants.
+# The result logs (see results_log.py) stay the source of truth; the database can be
+# rebuilt from them at any time with "python results_db.py --import".
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    user_id TEXT NOT NULL,
+    level TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    invoice_file TEXT,
+    purchase_file TEXT,
+    duration_seconds REAL,
+    decision TEXT,
+    booking TEXT,
+    error_count INTEGER,
+    saved REAL NOT NULL,
+    entry TEXT NOT NULL,
+    PRIMARY KEY (user_id, level, seq)
+);
+CREATE INDEX IF NOT EXISTS results_level ON results (level, booking, duration_seconds);
+CREATE INDEX IF NOT EXISTS results_invoice ON results (invoice_file);
+CREATE INDEX IF NOT EXISTS results_booking ON results (booking);
+CREATE INDEX IF NOT EXISTS results_duration ON results (duration_seconds);
+"""
+
+INSERT = """INSERT OR REPLACE INTO results (user_id, level, seq, invoice_file, purchase_file, duration_seconds,
+                                           decision, booking, error_count, saved, entry)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+
+
+def to_row(user_id, level: str, seq: int, entry: dict, saved: float = None) -> tuple:
+    """
+    Flattens a result entry into a row of the results table; the full entry is kept as JSON.
+    """
+    duration = entry.get("duration_seconds")
+    return (str(user_id), level, seq, entry.get("invoice_file"), entry.get("purchase_file"),
+            float(duration) if isinstance(duration, (int, float)) else None,
+            entry.get("decision"), entry.get("booking"),
+            len(entry.get("errors") or []) + len(entry.get("errors_found") or []),
+            saved if saved is not None else time.time(), json.dumps(entry, ensure_ascii=False))
+
+
+class ResultsDB:
+    """
+    SQLite results store in WAL mode.
+    Rows are written by a background thread that commits up to batch_size rows per transaction,
+    so saving a result never waits for the database.
+    """
+
+    def __init__(self, path: str, batch_size: int = 100, flush_interval: float = 0.5):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._local = threading.local()
+        self._writer = None
+        self._lock = threading.Lock()
+        self._setup_lock = threading.Lock()
+        self._ready = False
+
+    def _conn(self):
+        """
+        Returns this thread's connection; the file and its schema are created on first use.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            with self._setup_lock:
+                folder = os.path.dirname(self.path)
+                if not self._ready and folder:
+                    os.makedirs(folder, exist_ok=True)
+                conn = sqlite3.connect(self.path, timeout=30)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                if not self._ready:
+                    conn.executescript(SCHEMA)
+                    self._ready = True
+            self._local.conn = conn
+        return conn
+
+    def add(self, user_id, level: str, seq: int, entry: dict):
+        """
+        Queues one result entry for insertion.
+        seq is the entry's position in the participant's result log, which makes re-imports idempotent.
+        """
+        self._queue.put(to_row(user_id, level, seq, entry))
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="results-db", daemon=True)
+                self._writer.start()
+                atexit.register(self.flush)
+
+    def _write_loop(self):
+        while True:
+            rows = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(rows) < self.batch_size:
+                try:
+                    rows.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            self.insert(rows)
+
+    def flush(self):
+        """
+        Writes all queued rows now (also called at exit).
+        """
+        rows = []
+        while True:
+            try:
+                rows.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if rows:
+            self.insert(rows)
+
+    def insert(self, rows: list):
+        try:
+            conn = self._conn()
+            with conn:
+                conn.executemany(INSERT, rows)
+        except sqlite3.Error as e:
+            print(f"Could not write {len(rows)} results to {self.path}: {e}")
+
+    def aggregates(self, level: str = None) -> list:
+        """
+        Returns per-level aggregates: number of results and participants, duration statistics,
+        booking and escalation rates and the mean number of errors.
+        """
+        query = """SELECT level,
+                          COUNT(*),
+                          COUNT(DISTINCT user_id),
+                          AVG(duration_seconds),
+                          MIN(duration_seconds),
+                          MAX(duration_seconds),
+                          AVG(booking = 'book'),
+                          AVG(decision = 'escalate'),
+                          AVG(error_count)
+                   FROM results"""
+        params = ()
+        if level:
+            query += " WHERE level = ?"
+            params = (level,)
+        query += " GROUP BY level ORDER BY level"
+        aggregates = []
+        for row in self._conn().execute(query, params):
+            aggregates.append({
+                "level": row[0],
+                "results": row[1],
+                "participants": row[2],
+                "mean_duration_seconds": round(row[3], 2) if row[3] is not None else None,
+                "min_duration_seconds": row[4],
+                "max_duration_seconds": row[5],
+                "booking_rate": round(row[6], 3) if row[6] is not None else None,
+                "escalation_rate": round(row[7], 3) if row[7] is not None else None,
+                "mean_errors": round(row[8], 2) if row[8] is not None else None
+            })
+        return aggregates
+
+
+results_db = ResultsDB(RESULTS_DB_PATH) if RESULTS_DB_PATH else None
+
+
+# ---------------------------
+# IMPORT FROM THE RESULT LOGS
+# ---------------------------
+def import_results(db: ResultsDB, results_folder: str) -> int:
+    """
+    Loads every saved result from the result logs into the database.
+    Returns the number of imported entries.
+    """
+    log = ResultLog(results_folder)
+    rows = []
+    imported = 0
+    for user_id, level in log.iter_logs():
+        for seq, entry in enumerate(log.read(user_id, level), start=1):
+            rows.append(to_row(user_id, level, seq, entry))
+            if len(rows) >= 1000:
+                db.insert(rows)
+                imported += len(rows)
+                rows = []
+    if rows:
+        db.insert(rows)
+        imported += len(rows)
+    return imported
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Builds or queries the results database.")
+    parser.add_argument("--db", default=RESULTS_DB_PATH or os.path.join(RESULTS_FOLDER, "results.sqlite3"),
+                        help="database file")
+    parser.add_argument("--import", dest="import_folder", nargs="?", const=RESULTS_FOLDER,
+                        help="import all result logs from this folder (default: the results folder)")
+    parser.add_argument("--level", help="only show aggregates of this level")
+    args = parser.parse_args(argv)
+
+    db = ResultsDB(args.db)
+    if args.import_folder:
+        print(f"Imported {import_results(db, args.import_folder)} results into {args.db}")
+    print(json.dumps(db.aggregates(args.level), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
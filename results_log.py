@@ -0,0 +1,226 @@
+import os
+import sys
+import json
+import time
+import atexit
+import argparse
+import threading
+
+from config import RESULTS_FOLDER, RESULTS_FSYNC_INTERVAL
+
+try:
+    import fcntl
+except ImportError:  # Windows: writes are only serialized within one process
+    fcntl = None
+
+# ---------------------------
+# RESULT LOG
+# ---------------------------
+# Each participant's results of a level are appended as one JSON line to
+# results/<user_id>/<level>.jsonl. A small sidecar file <level>.count keeps the number of
+# entries together with the log size it belongs to, so counting never reads the log.
+# Results saved before the log existed (<level>.json arrays) are still read and counted.
+
+
+class ResultLog:
+    """
+    Append-only, per-participant result files.
+    - Appends hold an exclusive advisory lock on the log, so several workers can write at once.
+    - The log is fsynced by a background thread at most every fsync_interval seconds instead
+      of after every entry (0 fsyncs after every entry).
+    """
+
+    def __init__(self, folder: str, fsync_interval: float = 1.0):
+        self.folder = folder
+        self.fsync_interval = fsync_interval
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._flusher = None
+
+    def _paths(self, user_id, level: str):
+        user_folder = os.path.join(self.folder, str(user_id))
+        base = os.path.join(user_folder, level)
+        return user_folder, base + ".jsonl", base + ".count", base + ".json"
+
+    @staticmethod
+    def _read_count(count_path: str, log_size: int):
+        """
+        Returns the entry count from the sidecar, or None if it is missing or belongs to another log size.
+        """
+        try:
+            with open(count_path, "r", encoding="ascii") as f:
+                count, size = (int(value) for value in f.read().split())
+        except (OSError, ValueError):
+            return None
+        return count if size == log_size else None
+
+    @staticmethod
+    def _count_lines(log_path: str) -> int:
+        try:
+            with open(log_path, "rb") as f:
+                return sum(1 for line in f if line.strip())
+        except FileNotFoundError:
+            return 0
+
+    def append(self, user_id, level: str, entry: dict) -> int:
+        """
+        Appends one result entry to the participant's log of the given level.
+
+        Returns:
+            int: The 1-based position of the entry in read(user_id, level).
+        """
+        user_folder, log_path, count_path, legacy_path = self._paths(user_id, level)
+        os.makedirs(user_folder, exist_ok=True)
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock, open(log_path, "ab") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                size = os.fstat(f.fileno()).st_size
+                count = self._read_count(count_path, size)
+                if count is None:
+                    count = self._count_lines(log_path)
+                f.write(line)
+                f.flush()
+                with open(count_path, "w", encoding="ascii") as count_file:
+                    count_file.write(f"{count + 1} {size + len(line)}")
+                if self.fsync_interval <= 0:
+                    os.fsync(f.fileno())
+                else:
+                    self._dirty.add(log_path)
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+        if self.fsync_interval > 0:
+            self._start_flusher()
+        if os.path.exists(legacy_path):
+            count += len(self._read_legacy(legacy_path))
+        return count + 1
+
+    def count(self, user_id, level: str) -> int:
+        """
+        Returns the number of saved results of the participant for the given level.
+        """
+        _, log_path, count_path, legacy_path = self._paths(user_id, level)
+        try:
+            size = os.path.getsize(log_path)
+        except OSError:
+            size = None
+        count = 0
+        if size is not None:
+            count = self._read_count(count_path, size)
+            if count is None:
+                count = self._count_lines(log_path)
+        if os.path.exists(legacy_path):
+            count += len(self._read_legacy(legacy_path))
+        return count
+
+    @staticmethod
+    def _read_legacy(legacy_path: str) -> list:
+        try:
+            with open(legacy_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Could not read {legacy_path}: {e}")
+            return []
+
+    def read(self, user_id, level: str) -> list:
+        """
+        Returns all saved results of the participant for the given level as a list,
+        in the same format as the former <level>.json files.
+        """
+        _, log_path, _, legacy_path = self._paths(user_id, level)
+        entries = self._read_legacy(legacy_path) if os.path.exists(legacy_path) else []
+        try:
+            with open(log_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entries.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        # Only a torn last line after a crash can be incomplete
+                        print(f"Skipping incomplete line in {log_path}")
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def iter_logs(self):
+        """
+        Yields (user_id, level) for every participant and level with saved results.
+        """
+        if not os.path.isdir(self.folder):
+            return
+        for user_id in sorted(os.listdir(self.folder)):
+            user_folder = os.path.join(self.folder, user_id)
+            if not os.path.isdir(user_folder):
+                continue
+            levels = {os.path.splitext(name)[0] for name in os.listdir(user_folder)
+                      if name.endswith((".jsonl", ".json"))}
+            for level in sorted(levels):
+                yield user_id, level
+
+    # ---------------------------
+    # BATCHED FSYNC
+    # ---------------------------
+    def _start_flusher(self):
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, name="results-fsync", daemon=True)
+            self._flusher.start()
+        atexit.register(self.flush)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.fsync_interval)
+            self.flush()
+
+    def flush(self):
+        """
+        Fsyncs every log written since the last flush.
+        """
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        for log_path in dirty:
+            try:
+                fd = os.open(log_path, os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+            except OSError as e:
+                print(f"Could not fsync {log_path}: {e}")
+
+
+results_log = ResultLog(RESULTS_FOLDER, RESULTS_FSYNC_INTERVAL)
+
+
+# ---------------------------
+# EXPORT IN THE FORMER LAYOUT
+# ---------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Writes the saved results as <user_id>/<level>.json arrays, as the app used to store them."
+    )
+    parser.add_argument("output", help="output folder (must differ from the results folder)")
+    parser.add_argument("--results", default=RESULTS_FOLDER, help="results folder to read")
+    args = parser.parse_args(argv)
+
+    if os.path.abspath(args.output) == os.path.abspath(args.results):
+        parser.error("the output folder must differ from the results folder")
+    log = ResultLog(args.results)
+    files = 0
+    for user_id, level in log.iter_logs():
+        user_folder = os.path.join(args.output, user_id)
+        os.makedirs(user_folder, exist_ok=True)
+        with open(os.path.join(user_folder, level + ".json"), "w", encoding="utf-8") as f:
+            json.dump(log.read(user_id, level), f, indent=2, ensure_ascii=False)
+        files += 1
+    print(f"Wrote {files} result files to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
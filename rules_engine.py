@@ -0,0 +1,240 @@
+import copy
+from decimal import Decimal, InvalidOperation
+
+import Levenshtein
+
+# ---------------------------
+# CONFIGURATION
+# ---------------------------
+# Names within this edit distance count as typos (minor errors)
+MAX_TYPO_DISTANCE = 2
+# Invoice and purchase order items whose names are at least this similar are treated as the same product
+SAME_PRODUCT_RATIO = 0.8
+# Prices are compared in cents, which also hides float artifacts such as "364.7999999999999"
+CENT = Decimal("0.01")
+# Price differences up to this amount count as rounding errors (minor errors)
+ROUNDING_TOLERANCE = Decimal("0.1")
+# More errors than this are always escalated and declined
+MAX_MINOR_ERRORS = 2
+
+
+# ---------------------------
+# VALUE HELPERS
+# ---------------------------
+def to_decimal(value):
+    """
+    Returns value as a Decimal, or None if it is empty or not a number.
+    "9", "9.0" and 9.0 all give the same Decimal, so trailing zeros never cause errors.
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    text = str(value).strip().replace(",", "")
+    if not text:
+        return None
+    try:
+        return Decimal(text)
+    except InvalidOperation:
+        return None
+
+
+def format_decimal(value: Decimal) -> str:
+    """
+    Formats a Decimal without trailing zeros, e.g. Decimal("440.00") -> "440".
+    """
+    return format(value.normalize(), "f")
+
+
+def normalize_text(value) -> str:
+    return " ".join(str(value or "").split()).casefold()
+
+
+def is_transposition(a: str, b: str) -> bool:
+    """
+    Returns True if b is a permutation of the characters of a (e.g. "10265" vs. "10625").
+    """
+    return len(a) == len(b) and a != b and sorted(a) == sorted(b)
+
+
+# ---------------------------
+# ENGINE
+# ---------------------------
+class _Comparison:
+    """
+    Collects the errors of one invoice/purchase order comparison together with their severity.
+    """
+
+    def __init__(self):
+        self.errors = []
+        self.major = 0
+        self.product_missing = False
+        self.ambiguous = []
+
+    def add(self, error_type: str, description: str, correction, major: bool):
+        self.errors.append({
+            "error_type": error_type,
+            "description": description,
+            "correction": str(correction)
+        })
+        if major:
+            self.major += 1
+        if error_type == "Product is missing":
+            self.product_missing = True
+
+    def compare_identifier(self, error_type: str, invoice_value, purchase_value):
+        inv, po = str(invoice_value or "").strip(), str(purchase_value or "").strip()
+        if inv == po:
+            return
+        if not inv:
+            self.add(error_type, f"{error_type} is missing", po, major=True)
+        else:
+            self.add(error_type, f"Invoice: {inv}, PO: {po}", po, major=not is_transposition(inv, po))
+
+    def compare_name(self, error_type: str, invoice_value, purchase_value):
+        inv, po = normalize_text(invoice_value), normalize_text(purchase_value)
+        if inv == po:
+            return
+        purchase_value = str(purchase_value or "").strip()
+        if not inv:
+            self.add(error_type, f"{error_type} is missing", purchase_value, major=True)
+            return
+        if sorted(inv.split()) == sorted(po.split()) or inv in po or po in inv:
+            # Swapped or truncated names: a human or the LLM should judge these
+            self.ambiguous.append(f"{error_type}: {invoice_value!r} vs. {purchase_value!r}")
+        typo = Levenshtein.distance(inv, po) <= MAX_TYPO_DISTANCE
+        self.add(error_type, f"Invoice: {str(invoice_value).strip()}, PO: {purchase_value}", purchase_value,
+                 major=not typo)
+
+    def compare_number(self, error_type: str, invoice_value, purchase_value, money: bool = False):
+        inv, po = to_decimal(invoice_value), to_decimal(purchase_value)
+        if po is None:
+            self.ambiguous.append(f"{error_type}: purchase order value {purchase_value!r} is not a number")
+            return
+        tolerance = Decimal("0")
+        if money:
+            po = po.quantize(CENT)
+            inv = inv.quantize(CENT) if inv is not None else None
+            tolerance = ROUNDING_TOLERANCE
+        if inv == po:
+            return
+        if inv is None:
+            self.add(error_type, f"{error_type} is missing", format_decimal(po), major=True)
+            return
+        minor = abs(inv - po) <= tolerance or is_transposition(format_decimal(inv), format_decimal(po))
+        self.add(error_type, f"Invoice: {format_decimal(inv)}, PO: {format_decimal(po)}", format_decimal(po),
+                 major=not minor)
+
+
+def _match_items(comparison: _Comparison, invoice_items: list, purchase_items: list):
+    """
+    Pairs invoice items with purchase order items: a hash join on product_id,
+    then a name match for the remaining items (wrong product IDs).
+    Returns the matched pairs and the purchase order items that are missing on the invoice.
+    """
+    purchase_by_id = {}
+    for item in purchase_items:
+        pid = str(item.get("product_id", "")).strip()
+        if pid in purchase_by_id:
+            comparison.ambiguous.append(f"Duplicate product ID {pid} in purchase order")
+        purchase_by_id[pid] = item
+
+    pairs, unmatched = [], []
+    for item in invoice_items:
+        pid = str(item.get("product_id", "")).strip()
+        po_item = purchase_by_id.pop(pid, None)
+        if po_item is not None:
+            pairs.append((item, po_item))
+        else:
+            unmatched.append(item)
+
+    for item in unmatched:
+        name = normalize_text(item.get("product_name"))
+        best_id, best_ratio = None, 0.0
+        for pid, po_item in purchase_by_id.items():
+            ratio = Levenshtein.ratio(name, normalize_text(po_item.get("product_name")))
+            if ratio > best_ratio:
+                best_id, best_ratio = pid, ratio
+        if best_id is not None and best_ratio >= SAME_PRODUCT_RATIO:
+            po_item = purchase_by_id.pop(best_id)
+            comparison.compare_identifier("Product ID", item.get("product_id"), po_item.get("product_id"))
+            pairs.append((item, po_item))
+        else:
+            comparison.ambiguous.append(f"Invoice product {item.get('product_name')!r} is not in the purchase order")
+            comparison.add("Product ID", f"Product {item.get('product_id')} is not in the purchase order",
+                           "remove", major=True)
+    return pairs, list(purchase_by_id.values())
+
+
+def expected_total(purchase_items: list):
+    """
+    Returns the total price of the purchase order items, or None if a quantity or price is not a number.
+    """
+    total = Decimal("0")
+    for item in purchase_items:
+        quantity, unit_price = to_decimal(item.get("quantity")), to_decimal(item.get("unit_price"))
+        if quantity is None or unit_price is None:
+            return None
+        total += quantity * unit_price
+    return total
+
+
+def analyze_pair(invoice_extracted: dict, purchase_extracted: dict) -> dict:
+    """
+    Compares extracted invoice and purchase order fields with the rules of the chatgpt.py prompts
+    and applies the supervisory (auto/escalate) and booking (book/decline) policies.
+
+    Parameters:
+        invoice_extracted (dict): Invoice fields (order_id, order_date, contact_name, items, total_price).
+        purchase_extracted (dict): Purchase order fields (order_id, order_date, customer_name, items).
+
+    Returns:
+        dict: The same structure the AI functions return ("invoice_extracted", "purchase_extracted",
+              "errors", "invoice_corrected", "decision", "booking") plus "ambiguous", a list of reasons
+              why the result should be checked by the LLM (empty if the result is certain).
+    """
+    comparison = _Comparison()
+    if not invoice_extracted or not purchase_extracted:
+        comparison.ambiguous.append("Missing extracted fields")
+
+    comparison.compare_identifier("Order ID", invoice_extracted.get("order_id"), purchase_extracted.get("order_id"))
+    comparison.compare_identifier("Date", invoice_extracted.get("order_date"), purchase_extracted.get("order_date"))
+    comparison.compare_name("Contact Name", invoice_extracted.get("contact_name"),
+                            purchase_extracted.get("customer_name"))
+
+    purchase_items = purchase_extracted.get("items") or []
+    pairs, missing = _match_items(comparison, invoice_extracted.get("items") or [], purchase_items)
+    for inv_item, po_item in pairs:
+        comparison.compare_name("Product Name", inv_item.get("product_name"), po_item.get("product_name"))
+        comparison.compare_number("Quantity", inv_item.get("quantity"), po_item.get("quantity"))
+        comparison.compare_number("Unit Price", inv_item.get("unit_price"), po_item.get("unit_price"), money=True)
+    for po_item in missing:
+        comparison.add("Product is missing", f"{po_item.get('product_name')} is missing",
+                       f"{po_item.get('product_id')} {po_item.get('product_name')}", major=True)
+
+    total = expected_total(purchase_items)
+    if total is None:
+        comparison.ambiguous.append("Purchase order total cannot be calculated")
+    else:
+        comparison.compare_number("Total Price", invoice_extracted.get("total_price"), total, money=True)
+
+    errors = comparison.errors
+    serious = comparison.major > 0 or len(errors) > MAX_MINOR_ERRORS
+    invoice_corrected = {}
+    if errors:
+        invoice_corrected = copy.deepcopy(invoice_extracted)
+        invoice_corrected.update({
+            "order_id": purchase_extracted.get("order_id", ""),
+            "order_date": purchase_extracted.get("order_date", ""),
+            "contact_name": purchase_extracted.get("customer_name", ""),
+            "items": copy.deepcopy(purchase_items),
+            "total_price": format_decimal(total) if total is not None else invoice_extracted.get("total_price", "")
+        })
+
+    return {
+        "invoice_extracted": invoice_extracted,
+        "purchase_extracted": purchase_extracted,
+        "errors": errors,
+        "invoice_corrected": invoice_corrected,
+        "decision": "escalate" if serious else "auto",
+        "booking": "decline" if serious or comparison.product_missing else "book",
+        "ambiguous": comparison.ambiguous
+    }
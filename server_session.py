@@ -0,0 +1,86 @@
+import marshal
+import secrets
+
+from flask.sessions import SecureCookieSession, SessionInterface
+from itsdangerous import Signer, BadSignature
+
+# ---------------------------
+# SERVER-SIDE SESSIONS
+# ---------------------------
+# Keeps the session data in a store (see kvstore.py) instead of the cookie.
+# The cookie only carries a signed random session id, so the extracted invoice data
+# no longer travels with every request or runs into browser cookie size limits.
+
+
+class ServerSession(SecureCookieSession):
+    """
+    Session dict that also knows its id and whether it has just been created.
+    Like Flask's cookie session, only changes to the top-level keys mark it as modified.
+    """
+
+    def __init__(self, initial=None, sid: str = None, new: bool = False):
+        super().__init__(initial)
+        self.sid = sid
+        self.new = new
+
+
+class ServerSessionInterface(SessionInterface):
+    """
+    Flask session interface storing the session data under "session:<id>" in a key-value store.
+    - Data is serialized with marshal, which is compact and fast for the plain dicts, lists,
+      strings and numbers kept in the session.
+    - The session id in the cookie is signed with the app's secret key.
+    - Sessions expire ttl seconds after they were last written.
+    """
+
+    def __init__(self, store, ttl: float = 86400):
+        self.store = store
+        self.ttl = ttl
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt="server-session")
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode("ascii")
+            except BadSignature:
+                sid = None
+            if sid:
+                try:
+                    value = self.store.get("session:" + sid)
+                except Exception as e:
+                    print(f"Session read failed: {e}")
+                    value = None
+                if value is not None:
+                    return ServerSession(marshal.loads(value), sid=sid)
+        return ServerSession(sid=secrets.token_urlsafe(24), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        if session.accessed:
+            response.vary.add("Cookie")
+
+        # An emptied session (e.g. after logout) is removed together with its cookie
+        if not session:
+            if session.modified:
+                self.store.delete("session:" + session.sid)
+                response.delete_cookie(name, domain=domain, path=path, secure=secure, samesite=samesite,
+                                       httponly=httponly)
+                response.vary.add("Cookie")
+            return
+
+        if session.modified or session.new:
+            self.store.set("session:" + session.sid, marshal.dumps(dict(session)), self.ttl)
+        if session.new or self.should_set_cookie(app, session):
+            response.set_cookie(name, self._signer(app).sign(session.sid).decode("ascii"),
+                                expires=self.get_expiration_time(app, session), httponly=httponly,
+                                domain=domain, path=path, secure=secure, samesite=samesite)
+            response.vary.add("Cookie")
@@ -0,0 +1,57 @@
+// Drives a *_process route that runs its analysis as a background job (see jobs.py).
+// The route is posted to once to start the job; the job status is then polled until it has
+// finished, and the route is posted to again to store the result and get the next page.
+// Failed status requests (e.g. while the server restarts) are retried with a growing delay.
+const JOB_STAGE_LABELS = {
+  queued: "Waiting for a free worker...",
+  extracting: "Reading the documents...",
+  checking: "Checking the invoice...",
+  calling_ai: "Waiting for the AI...",
+  done: "Done.",
+  failed: "The verification failed. Please reload the page."
+};
+
+function processInBackground(processUrl, statusElementId, pollInterval = 500, maxRetryDelay = 10000) {
+  const statusElement = statusElementId ? document.getElementById(statusElementId) : null;
+
+  function showStage(stage) {
+    if (statusElement && JOB_STAGE_LABELS[stage]) {
+      statusElement.textContent = JOB_STAGE_LABELS[stage];
+    }
+  }
+
+  function post() {
+    return fetch(processUrl, { method: "POST" })
+      .then(response => response.json())
+      .then(data => {
+        if (data.redirect_url) {
+          window.location.href = data.redirect_url;
+        } else if (data.status_url) {
+          showStage(data.stage);
+          if (data.status !== "failed") {
+            setTimeout(() => poll(data.status_url), pollInterval);
+          }
+        }
+      });
+  }
+
+  function poll(statusUrl, failures = 0) {
+    fetch(statusUrl)
+      .then(response => response.json())
+      .then(data => {
+        showStage(data.stage);
+        // Finished jobs are collected by posting again; an unknown (e.g. expired or lost) job is started again
+        if (data.status === "done" || data.status === "failed" || data.error === "Unknown job") {
+          return post();
+        }
+        setTimeout(() => poll(statusUrl), pollInterval);
+      })
+      .catch(error => {
+        const delay = Math.min(pollInterval * 2 ** (failures + 1), maxRetryDelay);
+        console.error(`Error while polling the job, retrying in ${delay} ms:`, error);
+        setTimeout(() => poll(statusUrl, failures + 1), delay);
+      });
+  }
+
+  post().catch(error => console.error("Error during processing:", error));
+}
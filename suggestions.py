@@ -0,0 +1,72 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from config import SUGGESTION_AI_REFINE, SUGGESTION_MEMO_ENTRIES
+from chatgpt import get_ai_suggestions, get_remaining_error_types, get_template_suggestions
+
+# ---------------------------
+# LIVE SUGGESTIONS
+# ---------------------------
+
+
+class SuggestionService:
+    """
+    Answers the assistive level's live suggestion requests without waiting for the AI.
+    - Suggestions are memoized on the frozen set of remaining error types.
+    - Until an AI answer is memoized, the template suggestions are returned immediately.
+    - If refine is enabled, the AI text is requested in the background. Identical in-flight
+      refinements are coalesced, and a refinement is skipped if every session that asked for
+      it has moved on to a different set of errors in the meantime.
+    """
+
+    def __init__(self, refine: bool = False, max_entries: int = 1024, max_sessions: int = 4096):
+        self.refine = refine
+        self.max_entries = max_entries
+        self.max_sessions = max_sessions
+        self._memo = OrderedDict()
+        self._inflight = set()
+        self._latest = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="suggest")
+
+    def suggest(self, session_key: str, errors: list, corrections: list) -> str:
+        """
+        Returns markdown bullet points for the errors not yet fixed by a valid correction.
+        """
+        error_types = get_remaining_error_types(errors, corrections)
+        if not error_types:
+            return ""
+        key = frozenset(error_types)
+        with self._lock:
+            refined = self._memo.get(key)
+            if refined is not None:
+                self._memo.move_to_end(key)
+                return refined
+            self._latest[session_key] = key
+            self._latest.move_to_end(session_key)
+            while len(self._latest) > self.max_sessions:
+                self._latest.popitem(last=False)
+            if self.refine and key not in self._inflight:
+                self._inflight.add(key)
+                self._executor.submit(self._refine, key)
+        return get_template_suggestions(errors, corrections)
+
+    def _refine(self, key: frozenset):
+        try:
+            with self._lock:
+                if key not in self._latest.values():
+                    return
+            text = get_ai_suggestions({}, {}, [{"type": t} for t in sorted(key)], [])
+            if not text or text.startswith("AI Error"):
+                return
+            with self._lock:
+                self._memo[key] = text
+                while len(self._memo) > self.max_entries:
+                    self._memo.popitem(last=False)
+        finally:
+            with self._lock:
+                self._inflight.discard(key)
+
+
+suggestion_service = SuggestionService(refine=SUGGESTION_AI_REFINE, max_entries=SUGGESTION_MEMO_ENTRIES)
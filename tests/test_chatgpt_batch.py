@@ -0,0 +1,78 @@
+import json
+
+import chatgpt
+from chatgpt import fully_auto_batch_messages, parse_fully_auto_batch
+
+INVOICE = {"order_id": "10265", "contact_name": "Maria Anders"}
+PURCHASE = {"order_id": "10265", "customer_name": "Maria Anders"}
+
+PAIRS = [
+    ("0", "", "", (INVOICE, PURCHASE)),
+    ("1", "invoice text", "purchase text", None),
+    ("2", "", "", (INVOICE, PURCHASE))
+]
+
+
+def response(*results) -> str:
+    return json.dumps({"results": list(results)})
+
+
+def test_messages_send_the_system_prompt_once_for_all_pairs():
+    system, user = fully_auto_batch_messages(PAIRS)
+    assert system["role"] == "system" and system["content"].startswith(chatgpt.FULLY_AUTO_SYSTEM_PROMPT)
+    entries = json.loads(user["content"])["pairs"]
+    assert [entry["pair_id"] for entry in entries] == ["0", "1", "2"]
+    assert entries[0] == {"pair_id": "0", "invoice_extracted": INVOICE, "purchase_extracted": PURCHASE}
+    assert entries[1] == {"pair_id": "1", "invoice_pdf_text": "invoice text", "purchase_pdf_text": "purchase text"}
+
+
+def test_results_are_demultiplexed_by_pair_id():
+    results = parse_fully_auto_batch(response(
+        {"pair_id": "2", "booking": "decline"},
+        {"pair_id": 1, "booking": "book", "invoice_extracted": {"order_id": "x"}},
+        {"pair_id": "0", "booking": "book", "invoice_extracted": {"order_id": "echoed"}}
+    ), PAIRS)
+    assert set(results) == {"0", "1", "2"}
+    assert results["2"]["booking"] == "decline"
+    assert "pair_id" not in results["2"]
+    # Pre-extracted fields replace the echoed ones, AI extractions of PDF texts are kept
+    assert results["0"]["invoice_extracted"] == INVOICE
+    assert results["0"]["purchase_extracted"] == PURCHASE
+    assert results["1"]["invoice_extracted"] == {"order_id": "x"}
+
+
+def test_missing_and_extra_pair_ids():
+    results = parse_fully_auto_batch(response(
+        {"pair_id": "0", "booking": "book"},
+        {"pair_id": "7", "booking": "book"},
+        {"booking": "book"},
+        "not a result"
+    ), PAIRS)
+    assert set(results) == {"0"}
+
+
+def test_unusable_responses_give_no_results():
+    for raw_content in ["", "not json", "[]", json.dumps({"results": "none"}), json.dumps({"booking": "book"})]:
+        assert parse_fully_auto_batch(raw_content, PAIRS) == {}
+
+
+def test_missing_pairs_are_analyzed_one_by_one(monkeypatch):
+    requests = []
+    single = []
+
+    def chat_completion(model, messages, validate, **params):
+        content = response({"pair_id": "0", "booking": "book"}, {"pair_id": "2", "booking": "decline"})
+        requests.append(validate(content))
+        return content
+
+    def get_fully_auto_result(invoice_pdf_text, purchase_pdf_text, extracted=None):
+        single.append((invoice_pdf_text, purchase_pdf_text, extracted))
+        return {"booking": "single"}
+
+    monkeypatch.setattr(chatgpt, "chat_completion", chat_completion)
+    monkeypatch.setattr(chatgpt, "get_fully_auto_result", get_fully_auto_result)
+    results = chatgpt.get_fully_auto_results(PAIRS)
+    assert [result["booking"] for result in results] == ["book", "single", "decline"]
+    assert single == [("invoice text", "purchase text", None)]
+    # The incomplete response is not valid, so it is not cached
+    assert requests == [False]
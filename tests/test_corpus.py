@@ -0,0 +1,113 @@
+import hashlib
+import os
+
+import pytest
+
+import extraction
+from corpus import HEADER, TextCorpus, write_corpus
+from extraction import DiskCache, get_corpus, get_pdf_text
+
+
+def digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def open_fds() -> int:
+    return len(os.listdir("/proc/self/fd"))
+
+
+needs_proc = pytest.mark.skipif(not os.path.isdir("/proc/self/fd"), reason="counts open files through /proc")
+
+
+@pytest.fixture
+def corpus_path(tmp_path, monkeypatch):
+    """
+    Points get_corpus at a corpus file in tmp_path and starts without an opened corpus.
+    """
+    path = str(tmp_path / "corpus.bin")
+    monkeypatch.setattr(extraction, "CORPUS_PATH", path)
+    monkeypatch.setattr(extraction, "_corpus", None)
+    monkeypatch.setattr(extraction, "_corpus_mtime", None)
+    monkeypatch.setattr(extraction, "_rejected_corpus_mtime", None)
+    yield path
+    if extraction._corpus is not None:
+        extraction._corpus.close()
+
+
+@pytest.fixture
+def pdf(tmp_path, monkeypatch):
+    """
+    A fake PDF whose text comes from a stub parser and an empty text cache.
+    """
+    path = tmp_path / "document.pdf"
+    path.write_bytes(b"%PDF-1.4 document")
+    monkeypatch.setattr(extraction, "text_cache", DiskCache(str(tmp_path / "text"), 1024 * 1024, suffix=".txt"))
+    monkeypatch.setattr(extraction, "pdf_to_text_plumber", lambda pdf_path: "parsed text")
+    return str(path)
+
+
+def test_lookup(tmp_path):
+    path = str(tmp_path / "corpus.bin")
+    write_corpus(path, {digest(f"text {i}"): f"text {i} ä" for i in range(20)})
+    corpus = TextCorpus(path)
+    try:
+        assert corpus.count == 20
+        assert corpus.extractor_version == extraction.EXTRACTOR_VERSION
+        assert corpus.get(digest("text 7")) == "text 7 ä"
+        assert corpus.get(digest("missing")) is None
+    finally:
+        corpus.close()
+
+
+@needs_proc
+@pytest.mark.parametrize("content", [
+    b"",
+    b"IACORP0",
+    b"NOTACORP" + b"\0" * (HEADER.size - 8),
+])
+def test_short_or_foreign_files_are_rejected_and_closed(tmp_path, content):
+    path = tmp_path / "corpus.bin"
+    path.write_bytes(content)
+    fds = open_fds()
+    with pytest.raises(ValueError):
+        TextCorpus(str(path))
+    assert open_fds() == fds
+
+
+@needs_proc
+def test_truncated_index_is_rejected(tmp_path):
+    path = tmp_path / "corpus.bin"
+    write_corpus(str(path), {digest(f"text {i}"): f"text {i}" for i in range(20)})
+    path.write_bytes(path.read_bytes()[:-10])
+    fds = open_fds()
+    with pytest.raises(ValueError, match="truncated"):
+        TextCorpus(str(path))
+    assert open_fds() == fds
+
+
+def test_truncated_corpus_falls_back_to_parsing(corpus_path, pdf):
+    with open(corpus_path, "wb") as f:
+        f.write(b"IACORP0")
+    assert get_corpus() is None
+    assert extraction._rejected_corpus_mtime == os.stat(corpus_path).st_mtime_ns
+    assert get_pdf_text(pdf) == "parsed text"
+    assert get_pdf_text(pdf) == "parsed text"
+
+
+def test_rebuilt_corpus_replaces_and_closes_the_old_one(corpus_path, pdf):
+    pdf_digest = extraction.file_digest(pdf)
+    write_corpus(corpus_path, {pdf_digest: "first build"})
+    first = get_corpus()
+    assert get_pdf_text(pdf) == "first build"
+    assert get_corpus() is first
+
+    write_corpus(corpus_path, {pdf_digest: "second build"})
+    stat = os.stat(corpus_path)
+    os.utime(corpus_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    second = get_corpus()
+    assert second is not first
+    assert first._mm.closed
+    assert get_pdf_text(pdf) == "second build"
+    # A reader still holding the old corpus gets a ValueError, which get_pdf_text treats as a miss
+    with pytest.raises(ValueError):
+        first.get(pdf_digest)
@@ -0,0 +1,77 @@
+import json
+import threading
+import time
+
+from jobs import JobQueue
+from kvstore import MemoryStore
+
+
+def wait_until_finished(queue: JobQueue, job_id: str, timeout: float = 5) -> dict:
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        job = queue.get(job_id)
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+
+def test_every_save_refreshes_updated():
+    queue = JobQueue(MemoryStore(), workers=1)
+    release = threading.Event()
+    stages = []
+
+    def work(progress):
+        progress("checking")
+        stages.append(queue.get(job["id"]))
+        release.wait(5)
+        return 42
+
+    job = queue.submit(work)
+    assert job["updated"] >= job["created"]
+    while not stages:
+        time.sleep(0.01)
+    assert stages[0]["stage"] == "checking" and stages[0]["updated"] >= job["updated"]
+    release.set()
+    finished = wait_until_finished(queue, job["id"])
+    assert finished["result"] == 42 and finished["updated"] >= finished["finished"]
+
+
+def test_stale_job_is_lost():
+    store = MemoryStore()
+    queue = JobQueue(store, stale_after=60)
+    record = {"id": "a", "owner": "1", "status": "running", "stage": "calling_ai", "created": time.time() - 120,
+              "updated": time.time() - 90, "finished": None, "result": None, "error": None}
+    store.set("job:a", json.dumps(record).encode("utf-8"), 1800)
+    assert queue.get("a", "1") is None
+    assert store.get("job:a") is None
+
+
+def test_finished_job_is_never_lost():
+    store = MemoryStore()
+    queue = JobQueue(store, stale_after=60)
+    record = {"id": "a", "owner": "1", "status": "done", "stage": "done", "created": time.time() - 120,
+              "updated": time.time() - 90, "finished": time.time() - 90, "result": 1, "error": None}
+    store.set("job:a", json.dumps(record).encode("utf-8"), 1800)
+    assert queue.get("a", "1")["result"] == 1
+
+
+def test_heartbeat_keeps_a_long_stage_alive():
+    queue = JobQueue(MemoryStore(), workers=1, stale_after=0.2)
+    release = threading.Event()
+    job = queue.submit(lambda progress: release.wait(5))
+    time.sleep(0.6)
+    assert queue.get(job["id"]) is not None
+    release.set()
+    assert wait_until_finished(queue, job["id"])["status"] == "done"
+
+
+def test_queued_job_waiting_for_a_worker_stays_alive():
+    queue = JobQueue(MemoryStore(), workers=1, stale_after=0.2)
+    release = threading.Event()
+    queue.submit(lambda progress: release.wait(5))
+    waiting = queue.submit(lambda progress: "second")
+    time.sleep(0.6)
+    assert queue.get(waiting["id"])["status"] == "queued"
+    release.set()
+    assert wait_until_finished(queue, waiting["id"])["result"] == "second"
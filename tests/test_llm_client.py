@@ -0,0 +1,135 @@
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+import openai
+import pytest
+
+import llm_client
+from fake_openai import FakeOpenAIHandler, parse_options
+
+class Server(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # Slow responses the client stopped waiting for (deadline, hedging) fail with broken pipes
+        pass
+
+
+MESSAGES = [{"role": "system", "content": "Return JSON."}, {"role": "user", "content": "{}"}]
+
+
+@pytest.fixture
+def fake_server(monkeypatch):
+    """
+    Starts the fake API on an ephemeral port with the given fake_openai.py options and points a fresh
+    shared client at it. Retries, deadline and hedging are fast and off unless a test changes them.
+    Returns the handler class, whose requests attribute counts the received requests.
+    """
+    servers = []
+
+    def start(*argv):
+        handler = type("Handler", (FakeOpenAIHandler,),
+                       {"options": parse_options(["--latency", "0", "--jitter", "0", "--quiet", *argv]),
+                        "requests": 0})
+        server = Server(("127.0.0.1", 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        monkeypatch.setenv("OPENAI_BASE_URL", f"http://127.0.0.1:{server.server_address[1]}/v1")
+        monkeypatch.setenv("OPENAI_API_KEY", "fake")
+        return handler
+
+    monkeypatch.setattr(llm_client, "_client", None)
+    monkeypatch.setattr(llm_client, "latency", llm_client.LatencyTracker())
+    monkeypatch.setattr(llm_client, "LLM_READ_TIMEOUT", 10.0)
+    monkeypatch.setattr(llm_client, "LLM_DEADLINE", 10.0)
+    monkeypatch.setattr(llm_client, "LLM_MAX_RETRIES", 3)
+    monkeypatch.setattr(llm_client, "LLM_BACKOFF_BASE", 0.01)
+    monkeypatch.setattr(llm_client, "LLM_HEDGE", False)
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+    if llm_client._client is not None:
+        llm_client._client.close()
+
+
+def create():
+    return llm_client.create_chat_completion(model="fake", messages=MESSAGES, temperature=0.0)
+
+
+def test_success(fake_server):
+    handler = fake_server()
+    response = create()
+    assert response.choices[0].message.content.startswith("{")
+    assert handler.requests == 1
+
+
+def test_server_errors_are_retried(fake_server):
+    handler = fake_server("--fail-first", "2")
+    assert create().choices[0].message.content
+    assert handler.requests == 3
+
+
+def test_retries_are_limited(fake_server):
+    handler = fake_server("--fail-first", "10")
+    with pytest.raises(openai.InternalServerError):
+        create()
+    assert handler.requests == 1 + llm_client.LLM_MAX_RETRIES
+
+
+@pytest.mark.parametrize("status, error", [(400, openai.BadRequestError), (401, openai.AuthenticationError),
+                                           (404, openai.NotFoundError)])
+def test_client_errors_are_not_retried(fake_server, status, error):
+    handler = fake_server("--fail-first", "10", "--error-status", str(status))
+    with pytest.raises(error):
+        create()
+    assert handler.requests == 1
+
+
+def test_rate_limits_are_retried(fake_server):
+    handler = fake_server("--fail-first", "1", "--error-status", "429")
+    assert create().choices[0].message.content
+    assert handler.requests == 2
+
+
+def test_deadline_caps_a_slow_request(fake_server, monkeypatch):
+    fake_server("--slow-first", "100", "--slow-latency", "3")
+    monkeypatch.setattr(llm_client, "LLM_DEADLINE", 0.5)
+    start = time.monotonic()
+    with pytest.raises(openai.APITimeoutError):
+        create()
+    assert time.monotonic() - start < 1.5
+
+
+def test_deadline_caps_the_retries(fake_server, monkeypatch):
+    handler = fake_server("--fail-first", "1000", "--latency", "0.05")
+    monkeypatch.setattr(llm_client, "LLM_MAX_RETRIES", 1000)
+    monkeypatch.setattr(llm_client, "LLM_BACKOFF_BASE", 0.05)
+    monkeypatch.setattr(llm_client, "LLM_BACKOFF_MAX", 0.1)
+    monkeypatch.setattr(llm_client, "LLM_DEADLINE", 1.0)
+    start = time.monotonic()
+    # The last attempt only gets the rest of the deadline, so it may also time out
+    with pytest.raises((openai.InternalServerError, openai.APITimeoutError)):
+        create()
+    assert time.monotonic() - start < 1.5
+    assert 1 < handler.requests < 1000
+
+
+def test_hedged_request_beats_a_slow_primary(fake_server, monkeypatch):
+    handler = fake_server("--slow-first", "1", "--slow-latency", "3")
+    monkeypatch.setattr(llm_client, "LLM_HEDGE", True)
+    monkeypatch.setattr(llm_client, "LLM_HEDGE_MIN_DELAY", 0.2)
+    tracker = llm_client.LatencyTracker(min_samples=1)
+    tracker.add(0.01)
+    monkeypatch.setattr(llm_client, "latency", tracker)
+    start = time.monotonic()
+    assert create().choices[0].message.content
+    assert time.monotonic() - start < 1.5
+    assert handler.requests == 2
+
+
+def test_no_hedging_without_latency_data(fake_server, monkeypatch):
+    handler = fake_server("--slow-first", "1", "--slow-latency", "0.5")
+    monkeypatch.setattr(llm_client, "LLM_HEDGE", True)
+    monkeypatch.setattr(llm_client, "LLM_HEDGE_MIN_DELAY", 0.1)
+    assert create().choices[0].message.content
+    assert handler.requests == 1
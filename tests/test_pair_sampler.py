@@ -0,0 +1,97 @@
+import random
+
+import pytest
+
+import pair_sampler
+
+
+def make_pool(numbers) -> tuple:
+    numbers = tuple(numbers)
+    return numbers, {number: index for index, number in enumerate(numbers)}
+
+
+@pytest.fixture
+def pools(monkeypatch):
+    """
+    Replaces the dataset pools; returns a function setting them from lists of numbers.
+    """
+    current = {}
+
+    def use(modified, matching):
+        current["modified"] = make_pool(modified)
+        current["matching"] = make_pool(matching)
+
+    monkeypatch.setattr(pair_sampler.dataset_index, "pool", lambda name: current[name])
+    return use
+
+
+def draw_all(state: dict, pool: str) -> list:
+    drawn = []
+    while True:
+        draw = pair_sampler.peek(state, pool)
+        if draw is None:
+            return drawn
+        number, position = draw
+        pair_sampler.take(state, pool, position)
+        drawn.append(number)
+
+
+@pytest.mark.parametrize("n", [1, 2, 3, 10, 97, 100, 830])
+def test_permutation_is_a_bijection(n):
+    for seed in range(20):
+        a, b, a_inverse = pair_sampler.permutation(seed, "modified", n)
+        assert sorted((a * i + b) % n for i in range(n)) == list(range(n))
+        assert all((((a * i + b) % n) - b) * a_inverse % n == i for i in range(n))
+
+
+def test_permutation_depends_only_on_seed_pool_and_size():
+    assert pair_sampler.permutation(7, "modified", 100) == pair_sampler.permutation(7, "modified", 100)
+    orders = {pair_sampler.permutation(seed, pool, 100) for seed in range(10) for pool in pair_sampler.POOLS}
+    assert len(orders) > 1
+
+
+def test_a_pool_is_drawn_completely_without_repeats(pools):
+    numbers = [str(10000 + i) for i in range(50)]
+    pools(numbers, [])
+    state = pair_sampler.new_state()
+    drawn = draw_all(state, "modified")
+    assert sorted(drawn) == numbers
+    assert pair_sampler.peek(state, "modified") is None
+    assert pair_sampler.peek(state, "matching") is None
+
+
+def test_participants_get_different_orders(pools):
+    numbers = [str(10000 + i) for i in range(50)]
+    pools(numbers, [])
+    orders = {tuple(draw_all({"seed": seed, "cursors": {"modified": 0, "matching": 0}}, "modified"))
+              for seed in range(5)}
+    assert len(orders) > 1
+
+
+def test_numbers_in_both_pools_are_drawn_once(pools):
+    pools([str(n) for n in range(0, 30)], [str(n) for n in range(20, 50)])
+    state = pair_sampler.new_state()
+    rng = random.Random(1)
+    drawn = []
+    while True:
+        pool = rng.choice(pair_sampler.POOLS)
+        draw = pair_sampler.peek(state, pool)
+        if draw is None:
+            other = "matching" if pool == "modified" else "modified"
+            pool, draw = other, pair_sampler.peek(state, other)
+            if draw is None:
+                break
+        number, position = draw
+        assert not pair_sampler.is_used(state, number)
+        pair_sampler.take(state, pool, position)
+        assert pair_sampler.is_used(state, number)
+        drawn.append(number)
+    assert sorted(drawn, key=int) == [str(n) for n in range(50)]
+
+
+def test_peek_does_not_draw(pools):
+    pools(["1", "2", "3"], [])
+    state = pair_sampler.new_state()
+    first = pair_sampler.peek(state, "modified")
+    assert pair_sampler.peek(state, "modified") == first
+    assert not pair_sampler.is_used(state, first[0])
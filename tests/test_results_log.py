@@ -0,0 +1,101 @@
+import json
+import os
+import threading
+import multiprocessing
+
+import pytest
+
+import results_log
+from results_log import ResultLog
+
+
+def test_append_returns_positions_and_read_keeps_order(tmp_path):
+    log = ResultLog(str(tmp_path), fsync_interval=0)
+    assert log.read("u1", "manual") == []
+    assert log.count("u1", "manual") == 0
+    assert [log.append("u1", "manual", {"n": n}) for n in range(3)] == [1, 2, 3]
+    assert log.read("u1", "manual") == [{"n": 0}, {"n": 1}, {"n": 2}]
+    assert log.count("u1", "manual") == 3
+    assert log.count("u1", "assistive") == 0
+    assert log.count("u2", "manual") == 0
+
+
+def test_count_uses_sidecar_and_recounts_when_it_is_stale(tmp_path):
+    log = ResultLog(str(tmp_path), fsync_interval=0)
+    log.append("u1", "manual", {"n": 1})
+    log.append("u1", "manual", {"n": 2})
+    log_path = tmp_path / "u1" / "manual.jsonl"
+    count_path = tmp_path / "u1" / "manual.count"
+    assert count_path.read_text() == f"2 {log_path.stat().st_size}"
+
+    # A line appended without updating the sidecar (e.g. by an older version) is still counted
+    with open(log_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"n": 3}) + "\n")
+    assert log.count("u1", "manual") == 3
+    assert log.append("u1", "manual", {"n": 4}) == 4
+
+    count_path.write_text("garbage")
+    assert log.count("u1", "manual") == 4
+    os.remove(count_path)
+    assert log.count("u1", "manual") == 4
+
+
+def test_legacy_json_is_read_before_the_log(tmp_path):
+    user_folder = tmp_path / "u1"
+    user_folder.mkdir()
+    (user_folder / "manual.json").write_text(json.dumps([{"n": "old1"}, {"n": "old2"}]), encoding="utf-8")
+    log = ResultLog(str(tmp_path), fsync_interval=0)
+    assert log.count("u1", "manual") == 2
+    assert log.read("u1", "manual") == [{"n": "old1"}, {"n": "old2"}]
+    assert log.append("u1", "manual", {"n": "new"}) == 3
+    assert log.count("u1", "manual") == 3
+    assert log.read("u1", "manual") == [{"n": "old1"}, {"n": "old2"}, {"n": "new"}]
+    assert list(log.iter_logs()) == [("u1", "manual")]
+
+
+def test_unreadable_legacy_file_and_torn_last_line_are_skipped(tmp_path):
+    user_folder = tmp_path / "u1"
+    user_folder.mkdir()
+    (user_folder / "manual.json").write_text("[{", encoding="utf-8")
+    (user_folder / "manual.jsonl").write_text('{"n": 1}\n{"n": 2', encoding="utf-8")
+    log = ResultLog(str(tmp_path), fsync_interval=0)
+    assert log.read("u1", "manual") == [{"n": 1}]
+
+
+def test_concurrent_appends_keep_every_entry(tmp_path):
+    log = ResultLog(str(tmp_path), fsync_interval=0.05)
+
+    def append_many(thread: int):
+        for n in range(50):
+            log.append("u1", "manual", {"thread": thread, "n": n, "text": "x" * 500})
+
+    threads = [threading.Thread(target=append_many, args=(thread,)) for thread in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    log.flush()
+    entries = log.read("u1", "manual")
+    assert len(entries) == 200
+    assert log.count("u1", "manual") == 200
+    assert sorted((entry["thread"], entry["n"]) for entry in entries) == [(t, n) for t in range(4) for n in range(50)]
+
+
+def _append_from_process(folder: str, process: int):
+    log = ResultLog(folder, fsync_interval=0)
+    for n in range(50):
+        log.append("u1", "manual", {"process": process, "n": n, "text": "x" * 5000})
+
+
+@pytest.mark.skipif(results_log.fcntl is None, reason="appends are only locked across processes with fcntl")
+def test_appends_from_several_processes_keep_every_entry(tmp_path):
+    processes = [multiprocessing.Process(target=_append_from_process, args=(str(tmp_path), process))
+                 for process in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    log = ResultLog(str(tmp_path), fsync_interval=0)
+    entries = log.read("u1", "manual")
+    assert len(entries) == 200
+    assert log.count("u1", "manual") == 200
@@ -0,0 +1,158 @@
+import copy
+
+import pytest
+
+import pipeline
+from rules_engine import analyze_pair, expected_total, to_decimal
+
+PURCHASE = {
+    "order_id": "10265",
+    "order_date": "2016-07-25",
+    "customer_name": "Maria Anders",
+    "items": [
+        {"product_id": "17", "product_name": "Alice Mutton", "quantity": "30", "unit_price": "31.2"},
+        {"product_id": "70", "product_name": "Outback Lager", "quantity": "20", "unit_price": "12"}
+    ]
+}
+
+INVOICE = {
+    "order_id": "10265",
+    "order_date": "2016-07-25",
+    "contact_name": "Maria Anders",
+    "items": [
+        {"product_id": "17", "product_name": "Alice Mutton", "quantity": "30.0", "unit_price": "31.20"},
+        {"product_id": "70", "product_name": "Outback Lager", "quantity": "20", "unit_price": "12.00"}
+    ],
+    "total_price": "1176.00"
+}
+
+
+def invoice(**changes) -> dict:
+    result = copy.deepcopy(INVOICE)
+    result.update(changes)
+    return result
+
+
+def error_types(result: dict) -> list:
+    return [error["error_type"] for error in result["errors"]]
+
+
+# ---------------------------
+# DECIMAL TOTALS
+# ---------------------------
+def test_matching_pair_is_booked_without_errors():
+    result = analyze_pair(invoice(), PURCHASE)
+    assert result["errors"] == []
+    assert result["invoice_corrected"] == {}
+    assert (result["decision"], result["booking"]) == ("auto", "book")
+    assert result["ambiguous"] == []
+
+
+def test_expected_total_is_exact():
+    assert expected_total(PURCHASE["items"]) == to_decimal("1176")
+
+
+@pytest.mark.parametrize("total_price", ["1176", "1,176.00", 1176.0, 1176.0000000001])
+def test_equal_totals_in_other_notations_are_no_error(total_price):
+    assert analyze_pair(invoice(total_price=total_price), PURCHASE)["errors"] == []
+
+
+def test_rounding_difference_is_a_minor_error():
+    result = analyze_pair(invoice(total_price="1176.05"), PURCHASE)
+    assert error_types(result) == ["Total Price"]
+    assert result["errors"][0]["correction"] == "1176"
+    assert (result["decision"], result["booking"]) == ("auto", "book")
+
+
+def test_wrong_total_is_escalated_and_corrected():
+    result = analyze_pair(invoice(total_price="1186"), PURCHASE)
+    assert error_types(result) == ["Total Price"]
+    assert (result["decision"], result["booking"]) == ("escalate", "decline")
+    assert result["invoice_corrected"]["total_price"] == "1176"
+
+
+def test_transposed_order_id_is_a_minor_error():
+    result = analyze_pair(invoice(order_id="10625"), PURCHASE)
+    assert error_types(result) == ["Order ID"]
+    assert result["decision"] == "auto"
+
+
+# ---------------------------
+# NAME TOLERANCE
+# ---------------------------
+def test_name_typo_is_a_minor_error():
+    result = analyze_pair(invoice(contact_name="Maria Andres"), PURCHASE)
+    assert error_types(result) == ["Contact Name"]
+    assert result["errors"][0]["correction"] == "Maria Anders"
+    assert (result["decision"], result["booking"]) == ("auto", "book")
+    assert result["ambiguous"] == []
+
+
+def test_name_differing_only_in_case_and_spaces_is_no_error():
+    assert analyze_pair(invoice(contact_name="  maria   ANDERS "), PURCHASE)["errors"] == []
+
+
+def test_different_name_is_escalated():
+    result = analyze_pair(invoice(contact_name="Hanna Moos"), PURCHASE)
+    assert error_types(result) == ["Contact Name"]
+    assert (result["decision"], result["booking"]) == ("escalate", "decline")
+
+
+# ---------------------------
+# AMBIGUOUS PAIRS
+# ---------------------------
+@pytest.mark.parametrize("invoice_fields, purchase_fields", [
+    (invoice(contact_name="Anders Maria"), PURCHASE),
+    (invoice(contact_name="Maria"), PURCHASE),
+    ({}, PURCHASE),
+    (invoice(), dict(PURCHASE, items=[dict(PURCHASE["items"][0], unit_price="n/a"), PURCHASE["items"][1]]))
+])
+def test_uncertain_pairs_are_ambiguous(invoice_fields, purchase_fields):
+    assert analyze_pair(invoice_fields, purchase_fields)["ambiguous"]
+
+
+@pytest.fixture
+def confident_fields(monkeypatch):
+    """
+    Makes the layout extraction return the given fields with full confidence.
+    """
+    def use(invoice_fields, purchase_fields):
+        monkeypatch.setattr(pipeline, "extract_fields_pair",
+                            lambda invoice_path, purchase_path: ((invoice_fields, 1.0), (purchase_fields, 1.0)))
+    monkeypatch.setattr(pipeline, "LOCAL_ANALYSIS", True)
+    return use
+
+
+def test_certain_pair_is_settled_without_the_ai(confident_fields):
+    confident_fields(invoice(total_price="1186"), PURCHASE)
+
+    def analyze(*args, **kwargs):
+        raise AssertionError("the AI must not be called")
+
+    result, timings = pipeline.run_analysis(analyze, "invoice.pdf", "purchase.pdf")
+    assert error_types(result) == ["Total Price"]
+    assert "ambiguous" not in result
+    assert "ai_ms" not in timings
+
+
+def test_ambiguous_pair_falls_back_to_the_ai(confident_fields):
+    invoice_fields = invoice(contact_name="Anders Maria")
+    confident_fields(invoice_fields, PURCHASE)
+    calls = []
+
+    def analyze(invoice_text, purchase_text, extracted=None):
+        calls.append((invoice_text, purchase_text, extracted))
+        return {"errors": [], "booking": "book"}
+
+    result, timings = pipeline.run_analysis(analyze, "invoice.pdf", "purchase.pdf")
+    assert result == {"errors": [], "booking": "book"}
+    assert calls == [("", "", (invoice_fields, PURCHASE))]
+    assert "ai_ms" in timings
+
+
+def test_local_analysis_can_be_disabled(confident_fields, monkeypatch):
+    confident_fields(invoice(), PURCHASE)
+    monkeypatch.setattr(pipeline, "LOCAL_ANALYSIS", False)
+    result, ai_input = pipeline.prepare_analysis("invoice.pdf", "purchase.pdf", {}, lambda stage: None)
+    assert result is None
+    assert ai_input == ("", "", (invoice(), PURCHASE))